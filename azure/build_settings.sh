@@ -4,4 +4,4 @@ APP_SERVICE_NAME='iu-python-flask-memoryvault'
 az webapp config appsettings set \
     --resource-group $RESOURCE_GROUP_NAME \
     --name $APP_SERVICE_NAME \
-    --settings SCM_DO_BUILD_DURING_DEPLOYMENT=true
\ No newline at end of file
+    --settings SCM_DO_BUILD_DURING_DEPLOYMENT=true STORAGE_BACKEND=azure
\ No newline at end of file
@@ -0,0 +1,96 @@
+"""
+Measures how long a cold import of the app packages takes, as paid by every worker,
+CLI invocation and test process before handling anything.
+Fails if the median import time exceeds the budget or if a dependency that should be
+loaded lazily is imported at startup. -X importtime itself slows imports down,
+so the budget is only comparable between runs on the same machine.
+
+Run from the repository root:
+    python -m benchmarks.importtime [--runs 5] [--max-ms 1100]
+"""
+import sys
+import argparse
+import statistics
+import subprocess
+
+# -- Modules imported by app processes at startup --
+STARTUP_IMPORT = "import src.memoryvault.app, src.memoryvault.models, src.memoryvault.services, " \
+                 "src.memoryvault.routes, src.memoryvault.commands"
+# -- Heavy dependencies only imported on first use --
+LAZY_MODULES = ["PIL", "azure", "requests", "alembic", "flask_migrate"]
+
+
+def _run_importtime(code: str) -> list:
+    """
+    Runs code in a fresh interpreter with -X importtime.
+
+    Returns:
+        list: tuples of module name, cumulative time in us and whether it is a top-level import
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            capture_output=True, text=True, check=True)
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # -- Nested imports are indented below the module importing them --
+        imports.append((name.strip(), int(cumulative), not name.startswith("  ")))
+
+    return imports
+
+
+def _measure_import(interpreter_modules: set) -> tuple:
+    """
+    Imports the app packages in a fresh interpreter, leaving out the modules
+    the interpreter imports on its own at startup (e.g. site).
+
+    Returns:
+        tuple: total import time in ms and mapping of module name to its cumulative time in ms
+    """
+    total_us = 0
+    modules = {}
+    for name, cumulative, top_level in _run_importtime(STARTUP_IMPORT):
+        if name in interpreter_modules:
+            continue
+        if top_level:
+            total_us += cumulative
+        modules[name] = cumulative / 1000
+
+    return total_us / 1000, modules
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Number of measured imports.")
+    parser.add_argument("--max-ms", type=float, default=1100,
+                        help="Budget for the median import time in ms.")
+    parser.add_argument("--top", type=int, default=10,
+                        help="Number of slowest top-level packages printed.")
+    args = parser.parse_args()
+
+    interpreter_modules = {name for name, _, _ in _run_importtime("pass")}
+    measurements = [_measure_import(interpreter_modules) for _ in range(args.runs)]
+    median_ms = statistics.median(total_ms for total_ms, _ in measurements)
+    modules = measurements[-1][1]
+
+    print(f"Import time: median {median_ms:.0f} ms over {args.runs} runs "
+          f"(budget {args.max_ms:.0f} ms)")
+    packages = {name: ms for name, ms in modules.items() if "." not in name}
+    for name, ms in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{name:30s}{ms:8.1f} ms")
+
+    failures = []
+    if median_ms > args.max_ms:
+        failures.append(f"Median import time {median_ms:.0f} ms exceeds {args.max_ms:.0f} ms")
+    failures.extend(f"{name} is imported at startup but should be loaded on first use"
+                    for name in LAZY_MODULES if name in modules)
+    for failure in failures:
+        print(failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark comparing read and write throughput of the image storage backends.
+
+Run from the repository root:
+    python -m benchmarks.storage_backends [--images 200] [--size 200000]
+
+The azure backend is only benchmarked if AZURE_STORAGE_CONNECTION_STRING is set,
+e.g. to a local Azurite emulator (see README).
+"""
+import os
+import time
+import argparse
+import tempfile
+from flask import Flask
+
+from src.memoryvault.config import Config
+from src.memoryvault.services.storage_util import ImageStorage, blob_client_registry
+
+
+def _benchmark_backend(backend, images: dict) -> dict:
+    """
+    Writes and reads all images once and measures the throughput.
+
+    Returns:
+        dict: containing write and read throughput in MB/s and images/s
+    """
+    total_bytes = sum(len(image_data) for image_data in images.values())
+
+    started = time.perf_counter()
+    for image_uri, image_data in images.items():
+        backend.write(image_uri, image_data, "image/jpeg")
+    write_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for image_uri in images:
+        image_path = backend.get_local_path(image_uri)
+        if image_path:
+            # -- Local files are sent by the WSGI server, only the open is paid in Python --
+            with open(image_path, "rb"):
+                pass
+        else:
+            backend.read(image_uri)
+    read_seconds = time.perf_counter() - started
+
+    return {
+        "write_mb_s": total_bytes / write_seconds / 1e6,
+        "write_images_s": len(images) / write_seconds,
+        "read_mb_s": total_bytes / read_seconds / 1e6,
+        "read_images_s": len(images) / read_seconds
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=200, help="Number of images written and read.")
+    parser.add_argument("--size", type=int, default=200_000, help="Size of every image in bytes.")
+    args = parser.parse_args()
+
+    images = {}
+    for _ in range(args.images):
+        image_data = os.urandom(args.size)
+        images[f"benchmark/{image_data[:8].hex()}.jpg"] = image_data
+
+    backend_names = ["memory", "local"]
+    if Config.AZURE_STORAGE_CONNECTION_STRING:
+        backend_names.append("azure")
+
+    with tempfile.TemporaryDirectory() as upload_folder:
+        print(f"{'backend':<8} {'write MB/s':>11} {'write img/s':>12} {'read MB/s':>10} {'read img/s':>11}")
+        for backend_name in backend_names:
+            app = Flask(__name__)
+            app.config.from_object(Config)
+            app.config.update(STORAGE_BACKEND=backend_name,
+                              UPLOAD_FOLDER=upload_folder if backend_name == "local" else "images")
+            blob_client_registry.init_app(app)
+            storage = ImageStorage()
+            storage.init_app(app)
+
+            if backend_name == "azure":
+                container_client = blob_client_registry.get_container_client("images")
+                if not container_client.exists():
+                    container_client.create_container()
+
+            result = _benchmark_backend(storage.get_backend(), images)
+            print(f"{backend_name:<8} {result['write_mb_s']:>11.1f} {result['write_images_s']:>12.1f} "
+                  f"{result['read_mb_s']:>10.1f} {result['read_images_s']:>11.1f}")
+
+            if backend_name == "azure":
+                for image_uri in images:
+                    storage.get_backend().delete(image_uri)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,9 @@ Loads app configuration, creates Flask app, and configures routes and models.
 """
 import os
 import logging
+import tempfile
 from dotenv import load_dotenv
-from flask import Flask
+from flask import Flask, Request, current_app
 from flask_bcrypt import Bcrypt
 
 load_dotenv()
@@ -25,17 +26,35 @@ else:
 bcrypt_app = Bcrypt()
 
 
+class UploadRequest(Request):
+    """
+    Request class keeping uploaded files in memory only up to UPLOAD_SPOOL_THRESHOLD bytes.
+    Larger files are spooled to the IMAGE_STAGING_FOLDER.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type,
+                         filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=current_app.config["UPLOAD_SPOOL_THRESHOLD"],
+                                             mode="rb+",
+                                             dir=current_app.config["IMAGE_STAGING_FOLDER"])
+
+
 def create_app(config_class=CONFIG_CLASS):
     app = Flask(__name__)
+    app.request_class = UploadRequest
     bcrypt_app.init_app(app)
     app.config.from_object(config_class)
 
-    from . import models, routes
+    from . import models, routes, services, commands
 
     models.init_app(app)
+    services.init_app(app)
     routes.init_app(app)
+    commands.init_app(app)
 
-    with app.app_context():
-        models.db.create_all()
+    # -- Otherwise the schema is only managed by "flask db upgrade" --
+    if app.config["DATABASE_CREATE_ALL"]:
+        with app.app_context():
+            models.db.create_all()
 
     return app
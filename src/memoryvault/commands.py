@@ -0,0 +1,150 @@
+"""
+Module containing Flask CLI commands for maintaining MemoryVault.
+Commands are run with: flask --app app.py <command>
+"""
+import signal
+import threading
+import click
+from flask import Flask, current_app
+from flask.cli import ScriptInfo, with_appcontext
+
+from .models import db, init_migrations, Memory
+from .services import MemoryManagement, PeriodStatistics, blob_replicator, chunked_uploads, \
+    job_queue, server_sessions
+
+
+class MigrationGroup(click.Group):
+    """
+    Stands in for the "flask db" commands of Flask-Migrate, which are only loaded
+    once a migration command is run. App processes never import Alembic.
+    """
+
+    def make_context(self, info_name, args, parent=None, **extra):
+        init_migrations(parent.ensure_object(ScriptInfo).load_app())
+        from flask_migrate.cli import db as migration_group
+
+        # -- Flask-Migrate's group parses the arguments and runs the command --
+        return migration_group.make_context(info_name, args, parent=parent, **extra)
+
+
+@click.command("migrate-image-storage")
+@click.option("--delete-old", is_flag=True, default=False,
+              help="Remove images stored under their legacy filename after migrating.")
+@with_appcontext
+def migrate_image_storage(delete_old: bool) -> None:
+    """
+    Moves images to content-addressed keys and rewrites the image uris in the database.
+    """
+    number_images = MemoryManagement.migrate_image_storage(delete_old=delete_old)
+    click.echo(f"Migrated {number_images} images to content-addressed storage.")
+
+
+@click.command("replicate-images")
+@click.option("--background", is_flag=True, default=False,
+              help="Queue a job for the workers instead of replicating right away.")
+@with_appcontext
+def replicate_images(background: bool) -> None:
+    """
+    Uploads all images still waiting in the write-behind staging folder to blob storage.
+    """
+    if background:
+        job = job_queue.enqueue("replicate_images", {})
+        click.echo(f"Queued replication job {job.id}.")
+        return
+
+    if not blob_replicator.enabled():
+        click.echo("Write-behind replication is not enabled.")
+        return
+
+    replicated, failed = blob_replicator.replicate_all()
+    click.echo(f"Replicated {replicated} images, {failed} failed.")
+
+
+@click.command("cleanup-uploads")
+@with_appcontext
+def cleanup_uploads() -> None:
+    """
+    Removes chunked uploads that expired before the memory was created.
+    """
+    removed = chunked_uploads.collect_expired()
+    click.echo(f"Removed {removed} expired uploads.")
+
+
+@click.command("cleanup-sessions")
+@with_appcontext
+def cleanup_sessions() -> None:
+    """
+    Removes expired server side sessions.
+    """
+    if not server_sessions.enabled():
+        click.echo("Server side sessions are not enabled.")
+        return
+
+    removed = server_sessions.collect_expired()
+    click.echo(f"Removed {removed} expired sessions.")
+
+
+@click.command("run-worker")
+@click.option("--once", is_flag=True, default=False,
+              help="Run all due jobs and exit instead of waiting for new ones.")
+@with_appcontext
+def run_worker(once: bool) -> None:
+    """
+    Runs background jobs until the worker is stopped with SIGINT or SIGTERM.
+    """
+    if once:
+        number_jobs = 0
+        while job_queue.run_once():
+            number_jobs += 1
+        click.echo(f"Ran {number_jobs} jobs.")
+        return
+
+    stop_event = threading.Event()
+    for signal_number in [signal.SIGINT, signal.SIGTERM]:
+        signal.signal(signal_number, lambda *_: stop_event.set())
+
+    click.echo(f"Worker started, polling every {current_app.config['JOB_POLL_INTERVAL']} s.")
+    job_queue.run_worker(stop_event)
+
+
+@click.command("regenerate-images")
+@with_appcontext
+def regenerate_images() -> None:
+    """
+    Queues jobs recreating the renditions of all memory images with the current settings.
+    """
+    memory_ids = [memory_id for (memory_id,) in
+                  Memory.query.with_entities(Memory.id).filter(Memory.image_uri.isnot(None))]
+    for memory_id in memory_ids:
+        job_queue.enqueue("generate_derivatives", {"memory_id": memory_id}, commit=False)
+    db.session.commit()
+    click.echo(f"Queued {len(memory_ids)} image jobs.")
+
+
+@click.command("rebuild-period-stats")
+@click.option("--vault-id", type=int, default=None,
+              help="Only rebuild the statistics of this vault.")
+@with_appcontext
+def rebuild_period_stats(vault_id: int) -> None:
+    """
+    Recomputes the statistics of all collection periods from the stored memories.
+    """
+    number_vaults = PeriodStatistics.rebuild(vault_id=vault_id)
+    click.echo(f"Rebuilt period statistics of {number_vaults} vaults.")
+
+
+def init_app(app: Flask) -> None:
+    """
+    Registers all CLI commands to the app.
+
+    Returns:
+        None
+    """
+    app.cli.add_command(migrate_image_storage)
+    app.cli.add_command(replicate_images)
+    app.cli.add_command(cleanup_uploads)
+    app.cli.add_command(cleanup_sessions)
+    app.cli.add_command(run_worker)
+    app.cli.add_command(regenerate_images)
+    app.cli.add_command(rebuild_period_stats)
+    app.cli.add_command(MigrationGroup("db", help="Perform database migrations."))
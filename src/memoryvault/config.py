@@ -30,9 +30,154 @@ class Config:
         "max_overflow": 10,
     }
 
+    # Missing tables are created at every start. Existing tables and their indexes are
+    # only changed by the migrations: flask --app app.py db upgrade
+    DATABASE_CREATE_ALL = os.getenv("DATABASE_CREATE_ALL", "true").lower() == "true"
+
     SECRET_KEY = os.getenv("SESSION_SECRET")
+    # Where session data is kept: "cookie" stores all of it in the signed session cookie,
+    # "filesystem" (SESSION_FOLDER) and "database" store it on the server, shared by all workers,
+    # and the cookie only carries an opaque session id
+    SESSION_BACKEND = os.getenv("SESSION_BACKEND", "cookie")
+    SESSION_FOLDER = os.getenv("SESSION_FOLDER", "./data/sessions")
+    # Server side sessions expire PERMANENT_SESSION_LIFETIME after their last use.
+    # Seconds after which the expiry of an unchanged session is extended
+    SESSION_TOUCH_INTERVAL = 60 * 5
+    SESSION_GC_INTERVAL = 60 * 10
+
+    # Storage backend for images: "local" (folder UPLOAD_FOLDER), "azure" (container UPLOAD_FOLDER)
+    # or "memory"
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+    AZURE_STORAGE_CONNECTION_STRING = os.getenv(
+        "AZURE_STORAGE_CONNECTION_STRING")
+    # Kept-alive HTTP connections per process to the storage account
+    AZURE_STORAGE_POOL_SIZE = 10
+    # Blobs up to this size are uploaded in a single request, larger ones in blocks
+    AZURE_STORAGE_MAX_SINGLE_PUT_SIZE = 4 * 1024 * 1024
+    AZURE_STORAGE_MAX_BLOCK_SIZE = 4 * 1024 * 1024
+    # Parallel block transfers per upload or download
+    AZURE_STORAGE_MAX_CONCURRENCY = 2
+    # Exponential backoff in seconds: initial_backoff + increment_base ** retry
+    AZURE_STORAGE_RETRY_TOTAL = 3
+    AZURE_STORAGE_RETRY_BACKOFF = 1
+    AZURE_STORAGE_RETRY_INCREMENT = 2
+    AZURE_STORAGE_CONNECTION_TIMEOUT = 5
+    AZURE_STORAGE_READ_TIMEOUT = 30
+
+    # Write-behind: uploads are staged locally and replicated to blob storage in the background.
+    # The staging folder has to be persistent, it holds all images not yet replicated.
+    BLOB_WRITE_BEHIND = os.getenv("BLOB_WRITE_BEHIND", "false").lower() == "true"
+    BLOB_STAGING_FOLDER = os.getenv("BLOB_STAGING_FOLDER", "./data/staging")
+    # Seconds between reconciliations of the staging folder
+    BLOB_REPLICATION_INTERVAL = 30
+    # Retry backoff in seconds, doubled after each failed attempt
+    BLOB_REPLICATION_BACKOFF = 5
+    BLOB_REPLICATION_MAX_BACKOFF = 600
+
+    # Requests with a larger body are rejected with 413
+    MAX_CONTENT_LENGTH = 32 * 1024 * 1024
+    # Limits of batch uploads, every single image is still limited by MAX_CONTENT_LENGTH
+    MEMORY_BATCH_MAX_ITEMS = 50
+    MEMORY_BATCH_MAX_CONTENT_LENGTH = 256 * 1024 * 1024
+    # Upload returns 202 right away and the image is processed by a background job
+    UPLOAD_ASYNC = os.getenv("UPLOAD_ASYNC", "false").lower() == "true"
+    # Background jobs are run by "flask --app app.py run-worker" or by worker threads of the app.
+    # The staging folder has to be shared with the workers.
+    JOB_STAGING_FOLDER = os.getenv("JOB_STAGING_FOLDER", "./data/jobs")
+    JOB_EMBEDDED_WORKERS = int(os.getenv("JOB_EMBEDDED_WORKERS", "0"))
+    # Seconds an idle worker waits before looking for new jobs
+    JOB_POLL_INTERVAL = 2
+    # Seconds a claimed job is hidden from other workers before it is considered abandoned
+    JOB_VISIBILITY_TIMEOUT = 5 * 60
+    JOB_MAX_ATTEMPTS = 5
+    # Retry backoff in seconds, doubled after each failed attempt
+    JOB_RETRY_BACKOFF = 10
+    JOB_RETRY_MAX_BACKOFF = 60 * 60
+
+    # Resumable chunked uploads, partial uploads are kept in the folder until they expire
+    CHUNKED_UPLOAD_FOLDER = os.getenv("CHUNKED_UPLOAD_FOLDER", "./data/uploads")
+    CHUNKED_UPLOAD_MAX_SIZE = 32 * 1024 * 1024
+    CHUNKED_UPLOAD_CHUNK_SIZE = 1024 * 1024
+    # Seconds without a received chunk after which an upload is removed
+    CHUNKED_UPLOAD_EXPIRY = 60 * 60 * 24
+    CHUNKED_UPLOAD_GC_INTERVAL = 60 * 10
+    # Uploaded files larger than this many bytes are spooled to disk instead of memory
+    UPLOAD_SPOOL_THRESHOLD = 512 * 1024
+    # Folder for spooled and staged uploads, None uses the system temp folder
+    IMAGE_STAGING_FOLDER = None
+    IMAGE_ALLOWED_FORMATS = ("JPEG", "PNG", "WEBP", "GIF", "BMP", "TIFF")
+    IMAGE_MAX_PIXELS = 60_000_000
 
     IMAGE_MAX_SIZE = (1024, 1024)
+    # Renditions generated per uploaded image, the largest one is used as default
+    IMAGE_RENDITIONS = {
+        "thumb": (160, 160),
+        "medium": (640, 640),
+        "full": IMAGE_MAX_SIZE
+    }
+    # Formats every rendition is stored in, clients receive the smallest one they accept.
+    # Formats the installed Pillow build cannot write are skipped.
+    IMAGE_ENCODERS = {
+        "image/jpeg": {"format": "JPEG", "quality": 85, "optimize": True, "progressive": True},
+        "image/webp": {"format": "WEBP", "quality": 80, "method": 4},
+        "image/avif": {"format": "AVIF", "quality": 60}
+    }
+    IMAGE_EXTENSIONS = {
+        "image/jpeg": "jpg",
+        "image/webp": "webp",
+        "image/avif": "avif"
+    }
+
+    # Worker processes for decoding and resizing uploads, 0 processes images in-process
+    IMAGE_PROCESSING_WORKERS = int(os.getenv("IMAGE_PROCESSING_WORKERS", "2"))
+    # Uploads allowed to wait for a free worker before new ones are rejected
+    IMAGE_PROCESSING_QUEUE_SIZE = 8
+    # Seconds to wait for a queue slot and for the processing result
+    IMAGE_PROCESSING_TIMEOUT = 30
+    # Seconds between log lines with the queue depth and latencies of image processing,
+    # logged at INFO level while images are processed. 0 disables them
+    IMAGE_PROCESSING_METRICS_INTERVAL = 60 * 5
+    # Seconds browsers may reuse a served image before revalidating it
+    IMAGE_CACHE_MAX_AGE = 60 * 60 * 24
+    # Internal location of a reverse proxy (e.g. nginx) serving UPLOAD_FOLDER.
+    # If set, locally stored images are sent via X-Accel-Redirect instead of by the app.
+    IMAGE_ACCEL_REDIRECT_PREFIX = os.getenv("IMAGE_ACCEL_REDIRECT_PREFIX")
+    # Clients fetch images directly from blob storage using read-only SAS URLs
+    IMAGE_SIGNED_URLS = os.getenv("IMAGE_SIGNED_URLS", "false").lower() == "true"
+    # Lifetime of signed URLs in seconds, capped by the remaining lifetime of the session
+    IMAGE_SIGNED_URL_TTL = 60 * 60
+    # Cached signed URLs are regenerated once less than this many seconds are left
+    IMAGE_SIGNED_URL_REFRESH = 5 * 60
+
+    # Server side cache for image bytes in front of the storage
+    IMAGE_MEMORY_CACHE_BYTES = 64 * 1024 * 1024
+    IMAGE_CACHE_MAX_ITEM_BYTES = 4 * 1024 * 1024
+    # Optional disk tier, None disables it
+    IMAGE_DISK_CACHE_FOLDER = os.getenv("IMAGE_DISK_CACHE_FOLDER")
+    IMAGE_DISK_CACHE_BYTES = 1024 * 1024 * 1024
+    # Seconds images missing in the storage are not looked up again
+    IMAGE_NEGATIVE_CACHE_TTL = 60
+    # Seconds between log lines with the hit, miss and eviction counters of the cache,
+    # logged at INFO level while images are requested. 0 disables them
+    IMAGE_CACHE_METRICS_INTERVAL = 60 * 5
+
+    # Upcoming slides loaded in the background and hinted to the browser, 0 disables prefetching.
+    # Also the maximum number of prefetches in flight per session.
+    SLIDESHOW_PREFETCH_COUNT = 3
+    SLIDESHOW_PREFETCH_WORKERS = 2
+    # Running slideshows, shared by all worker processes through the folder
+    SLIDESHOW_STATE_FOLDER = os.getenv("SLIDESHOW_STATE_FOLDER", "./data/slideshows")
+    # Seconds without navigation after which a slideshow is removed
+    SLIDESHOW_STATE_EXPIRY = 60 * 60 * 6
+    SLIDESHOW_STATE_GC_INTERVAL = 60 * 10
+    # Slides fetched at once by the slideshow page when navigating,
+    # also the batch size memories of a slideshow are loaded from the database with
+    SLIDESHOW_WINDOW_SIZE = 10
+    # Seconds after the last navigation and number of slideshows and slides per slideshow
+    # memories are cached per process
+    SLIDESHOW_MEMORY_CACHE_TTL = 60 * 10
+    SLIDESHOW_MEMORY_CACHE_SIZE = 64
+    SLIDESHOW_MEMORY_CACHE_SLIDES = 1000
 
 
 class ProductionConfig(Config):
@@ -40,10 +185,11 @@ class ProductionConfig(Config):
     Production configuration class.
     Stores environement variables for when deployed on AWS Services.
     """
-    USE_BLOB_STORAGE = True
-    AZURE_STORAGE_CONNECTION_STRING = os.getenv(
-        "AZURE_STORAGE_CONNECTION_STRING")
     UPLOAD_FOLDER = "images"
+    # Workers start without inspecting the schema, migrations are run on deployment
+    DATABASE_CREATE_ALL = os.getenv("DATABASE_CREATE_ALL", "false").lower() == "true"
+    # Sessions are shared by all app instances through the database
+    SESSION_BACKEND = os.getenv("SESSION_BACKEND", "database")
 
 
 class DevelopmentConfig(Config):
@@ -53,5 +199,5 @@ class DevelopmentConfig(Config):
     """
     DEBUG = True
 
-    USE_BLOB_STORAGE = False
-    UPLOAD_FOLDER = "./data/images"
+    # Set STORAGE_BACKEND=azure to test against a local Azurite emulator
+    UPLOAD_FOLDER = "images" if Config.STORAGE_BACKEND == "azure" else "./data/images"
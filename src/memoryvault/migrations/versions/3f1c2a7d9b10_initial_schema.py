@@ -0,0 +1,244 @@
+# pylint: disable=no-member,invalid-name,missing-function-docstring
+"""initial schema and indexes of the hot paths
+
+Brings databases created by create_all before migrations existed and empty
+databases to the same schema, so every existing table and index is only
+created if it is missing. Statistics of collection periods are backfilled
+from the memories stored before they were maintained.
+
+Revision ID: 3f1c2a7d9b10
+Revises:
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+import calendar
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a7d9b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# -- Indexes of the hot paths: table, index name and columns --
+INDEXES = [
+    # Counting and listing memories of a vault in a period
+    ("memory", "ix_memory_vault_id_date", ["vault_id", "date"]),
+    # Loading the images of memories
+    ("memory_image", "ix_memory_image_memory_id", ["memory_id"]),
+    # Loading the members of a family
+    ("user", "ix_user_family_id", ["family_id"]),
+    # Claiming due jobs
+    ("job", "ix_job_status_priority_run_at", ["status", "priority", "run_at"]),
+]
+
+# -- Months of the collection period durations, stored by name in vault.period_duration --
+PERIOD_MONTHS = {'MONTHLY': 1, 'QUARTERLY': 3, 'HALF_YEARLY': 6, 'YEARLY': 12}
+
+
+def _create_tables(existing_tables):
+    if "family" not in existing_tables:
+        op.create_table(
+            'family',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('family_name', sa.String(length=30), nullable=False),
+            sa.Column('invite_code', sa.String(length=100), nullable=False),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(),
+                      nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('invite_code')
+        )
+    if "job" not in existing_tables:
+        op.create_table(
+            'job',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('kind', sa.String(length=50), nullable=False),
+            sa.Column('payload', sa.JSON(), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=False),
+            sa.Column('priority', sa.Integer(), nullable=False),
+            sa.Column('attempts', sa.Integer(), nullable=False),
+            sa.Column('max_attempts', sa.Integer(), nullable=False),
+            sa.Column('run_at', sa.DateTime(), nullable=False),
+            sa.Column('locked_until', sa.DateTime(), nullable=True),
+            sa.Column('last_error', sa.Text(), nullable=True),
+            sa.Column('result', sa.JSON(), nullable=True),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(),
+                      nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+    if "user" not in existing_tables:
+        op.create_table(
+            'user',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('username', sa.String(length=20), nullable=False),
+            sa.Column('firstname', sa.String(length=20), nullable=False),
+            sa.Column('password_hash', sa.String(length=100), nullable=False),
+            sa.Column('lastname', sa.String(length=20), nullable=True),
+            sa.Column('birthday', sa.DateTime(timezone=True), nullable=True),
+            sa.Column('is_admin', sa.Boolean(), nullable=False),
+            sa.Column('registered_at', sa.DateTime(timezone=True), server_default=sa.func.now(),
+                      nullable=True),
+            sa.Column('family_id', sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(['family_id'], ['family.id'], ),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('username')
+        )
+    if "vault" not in existing_tables:
+        # -- Unique constraints on user_id and family_id also index the vault lookups --
+        op.create_table(
+            'vault',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('period_duration',
+                      sa.Enum('MONTHLY', 'QUARTERLY', 'HALF_YEARLY', 'YEARLY',
+                              name='collection_period_enum', native_enum=False),
+                      nullable=False),
+            sa.Column('period_initial_start', sa.Date(), nullable=False),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(),
+                      nullable=True),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('family_id', sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(['family_id'], ['family.id'], ),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('family_id'),
+            sa.UniqueConstraint('user_id')
+        )
+    if "memory" not in existing_tables:
+        op.create_table(
+            'memory',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('description', sa.String(length=1000), nullable=False),
+            sa.Column('date', sa.DateTime(timezone=True), nullable=True),
+            sa.Column('latitude', sa.Numeric(), nullable=True),
+            sa.Column('longitude', sa.Numeric(), nullable=True),
+            sa.Column('image_uri', sa.String(length=100), nullable=True),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(),
+                      nullable=True),
+            sa.Column('vault_id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+            sa.ForeignKeyConstraint(['vault_id'], ['vault.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+    if "vault_period_stats" not in existing_tables:
+        op.create_table(
+            'vault_period_stats',
+            sa.Column('vault_id', sa.Integer(), nullable=False),
+            sa.Column('period_index', sa.Integer(), autoincrement=False, nullable=False),
+            sa.Column('user_id', sa.Integer(), autoincrement=False, nullable=False),
+            sa.Column('memory_count', sa.Integer(), nullable=False),
+            sa.Column('image_count', sa.Integer(), nullable=False),
+            sa.Column('size_bytes', sa.BigInteger(), nullable=False),
+            sa.ForeignKeyConstraint(['vault_id'], ['vault.id'], ),
+            sa.PrimaryKeyConstraint('vault_id', 'period_index', 'user_id')
+        )
+    if "memory_image" not in existing_tables:
+        op.create_table(
+            'memory_image',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('rendition', sa.String(length=20), nullable=False),
+            sa.Column('mimetype', sa.String(length=30), server_default='image/jpeg',
+                      nullable=False),
+            sa.Column('size_bytes', sa.Integer(), nullable=True),
+            sa.Column('width', sa.Integer(), nullable=False),
+            sa.Column('height', sa.Integer(), nullable=False),
+            sa.Column('image_uri', sa.String(length=100), nullable=False),
+            sa.Column('memory_id', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['memory_id'], ['memory.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+
+def _add_months(day, months):
+    year, month = divmod(day.month - 1 + months, 12)
+    year += day.year
+    month += 1
+    return day.replace(year=year, month=month,
+                       day=min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def _get_period_index(initial_start, duration_months, day):
+    months = (day.year - initial_start.year) * 12 + day.month - initial_start.month
+    index = months // duration_months
+    # -- Period starting later in the same month has not begun yet --
+    if _add_months(initial_start, index * duration_months) > day:
+        index -= 1
+    return index
+
+
+def _backfill_period_stats():
+    # -- Same aggregate as "flask rebuild-period-stats", written against the tables of this
+    #    revision. Skipped once the app maintains the statistics --
+    connection = op.get_bind()
+    stats_table = sa.table('vault_period_stats', sa.column('vault_id'),
+                           sa.column('period_index'), sa.column('user_id'),
+                           sa.column('memory_count'), sa.column('image_count'),
+                           sa.column('size_bytes'))
+    if connection.execute(sa.select(stats_table.c.vault_id).limit(1)).first() is not None:
+        return
+
+    vault_table = sa.table('vault', sa.column('id'), sa.column('period_duration'),
+                           sa.column('period_initial_start', sa.Date()))
+    memory_table = sa.table('memory', sa.column('id'), sa.column('vault_id'),
+                            sa.column('user_id'), sa.column('date', sa.DateTime(timezone=True)))
+    image_table = sa.table('memory_image', sa.column('memory_id'), sa.column('size_bytes'))
+
+    images = sa.select(image_table.c.memory_id,
+                       sa.func.coalesce(sa.func.sum(image_table.c.size_bytes), 0)
+                       .label('size_bytes')) \
+        .group_by(image_table.c.memory_id).subquery()
+    memories = sa.select(vault_table.c.id, vault_table.c.period_initial_start,
+                         vault_table.c.period_duration, memory_table.c.date,
+                         memory_table.c.user_id, images.c.memory_id, images.c.size_bytes) \
+        .join(memory_table, memory_table.c.vault_id == vault_table.c.id) \
+        .outerjoin(images, images.c.memory_id == memory_table.c.id) \
+        .where(memory_table.c.date.isnot(None))
+
+    counts = {}
+    for row in connection.execute(memories):
+        day = row.date.date() if isinstance(row.date, datetime) else row.date
+        period_index = _get_period_index(row.period_initial_start,
+                                         PERIOD_MONTHS[row.period_duration], day)
+        count = counts.setdefault((row.id, period_index, row.user_id or 0), [0, 0, 0])
+        count[0] += 1
+        count[1] += 1 if row.memory_id is not None else 0
+        count[2] += row.size_bytes or 0
+
+    if counts:
+        op.bulk_insert(stats_table, [
+            {"vault_id": vault_id, "period_index": period_index, "user_id": user_id,
+             "memory_count": memory_count, "image_count": image_count, "size_bytes": size_bytes}
+            for (vault_id, period_index, user_id), (memory_count, image_count, size_bytes)
+            in counts.items()])
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    existing_tables = set(inspector.get_table_names())
+    _create_tables(existing_tables)
+
+    # -- Uploader of memories was added after memory tables were created by create_all --
+    if "memory" in existing_tables \
+            and "user_id" not in {column["name"] for column in inspector.get_columns("memory")}:
+        with op.batch_alter_table('memory', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('user_id', sa.Integer(), nullable=True))
+            batch_op.create_foreign_key('memory_user_id_fkey', 'user', ['user_id'], ['id'])
+
+    inspector = sa.inspect(op.get_bind())
+    for table, name, columns in INDEXES:
+        if name not in {index["name"] for index in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns, unique=False)
+
+    _backfill_period_stats()
+
+
+def downgrade():
+    for table, name, _ in INDEXES:
+        op.drop_index(name, table_name=table)
+    for table in ['memory_image', 'vault_period_stats', 'memory', 'vault', 'user', 'job',
+                  'family']:
+        op.drop_table(table)
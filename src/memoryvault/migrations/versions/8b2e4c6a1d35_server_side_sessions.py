@@ -0,0 +1,43 @@
+# pylint: disable=no-member,invalid-name,missing-function-docstring
+"""server side sessions
+
+Adds the table of server side sessions. Databases started with DATABASE_CREATE_ALL
+may already contain it, so it is only created if it is missing.
+
+Revision ID: 8b2e4c6a1d35
+Revises: 3f1c2a7d9b10
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2e4c6a1d35'
+down_revision = '3f1c2a7d9b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if "web_session" not in inspector.get_table_names():
+        op.create_table(
+            'web_session',
+            sa.Column('id', sa.String(length=64), nullable=False),
+            sa.Column('data', sa.Text(), nullable=False),
+            sa.Column('expires_at', sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint('id')
+        )
+        inspector = sa.inspect(op.get_bind())
+
+    # -- Expired sessions are collected by their expiry --
+    if "ix_web_session_expires_at" not in \
+            {index["name"] for index in inspector.get_indexes("web_session")}:
+        op.create_index('ix_web_session_expires_at', 'web_session', ['expires_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_web_session_expires_at', table_name='web_session')
+    op.drop_table('web_session')
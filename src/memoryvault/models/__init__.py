@@ -2,16 +2,24 @@
 Model package initializer.
 Loads all db model classes and enables easier imports.
 """
+import os
 from flask import Flask
 
 from .base import db
 from .family import Family
+from .job import Job
 from .memory import Memory
+from .memory_image import MemoryImage
 from .user import User
 from .vault import Vault, CollectionPeriodDurationEnum
+from .vault_period_stats import VaultPeriodStats
+from .web_session import WebSession
 
-__all__ = ["db", "Family", "Memory", "User",
-           "Vault", "CollectionPeriodDurationEnum"]
+__all__ = ["db", "Family", "Job", "Memory", "MemoryImage", "User",
+           "Vault", "CollectionPeriodDurationEnum", "VaultPeriodStats", "WebSession"]
+
+# -- Alembic environment and revisions, shipped with the package --
+MIGRATIONS_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), "migrations")
 
 
 def init_app(app: Flask) -> None:
@@ -22,3 +30,17 @@ def init_app(app: Flask) -> None:
         None
     """
     db.init_app(app)
+
+
+def init_migrations(app: Flask) -> None:
+    """
+    Registers the schema migrations with Flask-Migrate.
+    Imports Alembic, so it is only called when migrations are run.
+
+    Returns:
+        None
+    """
+    from flask_migrate import Migrate
+
+    if "migrate" not in app.extensions:
+        Migrate(app, db, directory=MIGRATIONS_FOLDER)
@@ -0,0 +1,52 @@
+"""
+DB module for representing a background job in MemoryVault.
+"""
+from sqlalchemy.sql import func
+
+from .base import db
+
+
+class Job(db.Model):
+    """
+    Definition of job table in DB.
+    A job is a unit of work (e.g. processing an uploaded image) executed by a worker
+    outside of the request cycle. Workers claim jobs with SELECT ... FOR UPDATE SKIP LOCKED,
+    running jobs whose locked_until passed are claimed again.
+    """
+    __table_args__ = (
+        db.Index("ix_job_status_priority_run_at", "status", "priority", "run_at"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    # queued, running, done or failed
+    status = db.Column(db.String(20), nullable=False, default="queued")
+    # Jobs with higher priority are claimed first
+    priority = db.Column(db.Integer, nullable=False, default=0)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    # Naive UTC timestamps
+    run_at = db.Column(db.DateTime, nullable=False)
+    locked_until = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    result = db.Column(db.JSON, nullable=True)
+    created_at = db.Column(db.DateTime(timezone=True),
+                           server_default=func.now())
+
+    def to_json(self) -> dict:
+        """
+        Returns a dictionary representation of the Job instance,
+        including id, kind, status, attempts, last error and result.
+
+        Returns:
+            dict: A dictionary containing job details.
+        """
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "attempts": self.attempts,
+            "last_error": self.last_error,
+            "result": self.result
+        }
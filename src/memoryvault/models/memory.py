@@ -12,6 +12,11 @@ class Memory(db.Model):
     A memory is a collection consisting of text, image,
     date and coordinates that describes a particular memory.
     """
+    __table_args__ = (
+        # -- Counting and listing memories of a vault in a period is an index range scan --
+        db.Index("ix_memory_vault_id_date", "vault_id", "date"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     description = db.Column(db.String(1000), nullable=False)
     date = db.Column(db.DateTime(timezone=True))
@@ -22,11 +27,16 @@ class Memory(db.Model):
                            server_default=func.now())
 
     vault_id = db.Column(db.Integer, db.ForeignKey("vault.id"), nullable=False)
+    # Uploading user, empty for memories uploaded before uploaders were recorded
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=True)
+
+    images = db.relationship("MemoryImage", backref="memory", uselist=True)
 
     def to_json(self) -> dict:
         """
         Returns a dictionary representation of the Memory instance,
-        including memory id, description, date, coordinates and image_uri.
+        including memory id, description, date, coordinates, image_uri, vault id, uploader,
+        creation timestamp and the stored image renditions.
 
         Returns:
             dict: A dictionary containing memory details.
@@ -37,5 +47,29 @@ class Memory(db.Model):
             "date": self.date,
             "latitude": self.latitude,
             "longitude": self.longitude,
-            "image_uri": self.image_uri
+            "image_uri": self.image_uri,
+            "vault_id": self.vault_id,
+            "user_id": self.user_id,
+            "created_at": self.created_at,
+            "images": self._get_renditions()
         }
+
+    def _get_renditions(self) -> dict:
+        """
+        Groups the stored images of the memory by rendition.
+
+        Returns:
+            dict: mapping rendition name to its width, height and the stored
+                  formats as mapping of mimetype to image details.
+        """
+        renditions = {}
+        for image in self.images:
+            rendition = renditions.setdefault(image.rendition, {
+                "rendition": image.rendition,
+                "width": image.width,
+                "height": image.height,
+                "formats": {}
+            })
+            rendition["formats"][image.mimetype] = image.to_json()
+
+        return renditions
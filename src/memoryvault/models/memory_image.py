@@ -0,0 +1,40 @@
+"""
+DB module for representing a stored image rendition of a Memory in MemoryVault.
+"""
+from .base import db
+
+
+class MemoryImage(db.Model):
+    """
+    Definition of memory_image table in DB.
+    A memory image is one stored rendition (e.g. thumbnail or full size) in one
+    format of the image that was uploaded together with a memory.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    rendition = db.Column(db.String(20), nullable=False)
+    mimetype = db.Column(db.String(30), nullable=False,
+                         default="image/jpeg", server_default="image/jpeg")
+    size_bytes = db.Column(db.Integer, nullable=True)
+    width = db.Column(db.Integer, nullable=False)
+    height = db.Column(db.Integer, nullable=False)
+    image_uri = db.Column(db.String(100), nullable=False)
+
+    memory_id = db.Column(db.Integer, db.ForeignKey(
+        "memory.id"), nullable=False, index=True)
+
+    def to_json(self) -> dict:
+        """
+        Returns a dictionary representation of the MemoryImage instance,
+        including rendition name, mimetype, dimensions, size and image_uri.
+
+        Returns:
+            dict: A dictionary containing the rendition details.
+        """
+        return {
+            "rendition": self.rendition,
+            "mimetype": self.mimetype,
+            "size_bytes": self.size_bytes,
+            "width": self.width,
+            "height": self.height,
+            "image_uri": self.image_uri
+        }
@@ -25,7 +25,7 @@ class User(db.Model):
         timezone=True), server_default=func.now())
 
     family_id = db.Column(
-        db.Integer, db.ForeignKey("family.id"), nullable=True)
+        db.Integer, db.ForeignKey("family.id"), nullable=True, index=True)
     vault = db.relationship("Vault", backref='owner', uselist=False)
 
     def json_package(self) -> dict:
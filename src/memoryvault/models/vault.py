@@ -2,11 +2,12 @@
 DB module for representing a vault in MemoryVault.
 """
 import enum
-from datetime import date
+from datetime import date, timedelta
 from sqlalchemy import Enum
 from sqlalchemy.sql import func
 
 from .base import db
+from .memory import Memory
 
 
 class CollectionPeriodDurationEnum(enum.Enum):
@@ -41,6 +42,7 @@ class Vault(db.Model):
     def get_number_of_memories_in_timespan(self, timespan_begin: date, timespan_end: date) -> int:
         """
         Returns the number of all memories uploaded in a specified timespan to the vault instance.
+        Memories are counted by the database, both days of the timespan are included.
 
         Parameters:
             timespan_begin: date
@@ -51,12 +53,13 @@ class Vault(db.Model):
         Returns:
             int: number of memories uploaded during the timespan
         """
-        number_memories = 0
-        for memory in self.memories:
-            if timespan_begin < memory.date.date() and memory.date.date() <= timespan_end:
-                number_memories += 1
-
-        return number_memories
+        # -- Half-open range on the timestamp covers the whole last day in the database
+        #    timezone and keeps the (vault_id, date) index usable --
+        return db.session.query(func.count(Memory.id)) \
+            .filter(Memory.vault_id == self.id,
+                    Memory.date >= timespan_begin,
+                    Memory.date < timespan_end + timedelta(days=1)) \
+            .scalar()
 
     def json_package(self) -> dict:
         """
@@ -0,0 +1,41 @@
+"""
+DB module for representing the statistics of a collection period in MemoryVault.
+"""
+from .base import db
+
+
+class VaultPeriodStats(db.Model):
+    """
+    Definition of vault_period_stats table in DB.
+    Aggregates the memories one user uploaded to one collection period of a vault.
+    Rows are updated in the same transaction as the memories they count,
+    the totals of a period are the sums over all of its uploaders.
+    """
+    vault_id = db.Column(db.Integer, db.ForeignKey("vault.id"), primary_key=True)
+    # 0-based index of the collection period, see services.period_util.PeriodCalendar
+    period_index = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    # 0 for memories uploaded before their uploader was recorded
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False, default=0)
+
+    memory_count = db.Column(db.Integer, nullable=False, default=0)
+    # Number of memories with an image
+    image_count = db.Column(db.Integer, nullable=False, default=0)
+    # Stored bytes of all renditions and formats of the images
+    size_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def to_json(self) -> dict:
+        """
+        Returns a dictionary representation of the VaultPeriodStats instance,
+        including vault id, period index, uploader and the aggregated counts.
+
+        Returns:
+            dict: A dictionary containing the period statistics.
+        """
+        return {
+            "vault_id": self.vault_id,
+            "period_index": self.period_index,
+            "user_id": self.user_id,
+            "memory_count": self.memory_count,
+            "image_count": self.image_count,
+            "size_bytes": self.size_bytes
+        }
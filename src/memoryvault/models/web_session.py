@@ -0,0 +1,22 @@
+"""
+DB module for representing a server side session in MemoryVault.
+"""
+from .base import db
+
+
+class WebSession(db.Model):
+    """
+    Definition of web_session table in DB.
+    Holds the data of a session whose cookie only carries its opaque id,
+    see services.session_util. Sessions whose expires_at passed are garbage collected.
+    """
+    __table_args__ = (
+        db.Index("ix_web_session_expires_at", "expires_at"),
+    )
+
+    # Random URL safe token, also the value of the session cookie
+    id = db.Column(db.String(64), primary_key=True)
+    # Session dict serialized like Flask's cookie sessions
+    data = db.Column(db.Text, nullable=False)
+    # Naive UTC timestamp
+    expires_at = db.Column(db.DateTime, nullable=False)
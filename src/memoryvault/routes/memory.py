@@ -2,11 +2,17 @@
 Module containing HTTP routes for memory upload.
 Defines blueprint and logic for handeling requests to /memory url.
 """
+import io
+import json
 import logging
+import hashlib
 import traceback
 from datetime import datetime
-from flask import Blueprint, render_template, request, session, redirect, url_for, flash
-from ..services import MemoryManagement
+from flask import Blueprint, render_template, request, session, redirect, url_for, flash, \
+    abort, send_file, current_app, jsonify
+from werkzeug.exceptions import HTTPException, RequestEntityTooLarge
+from ..services import MemoryManagement, ImageProcessingException, chunked_uploads, \
+    UploadException, UploadNotFoundException, UploadOffsetException, job_queue, select_image
 
 memory_bp = Blueprint('memory', __name__, url_prefix='/memory')
 
@@ -20,7 +26,8 @@ def upload():
     - login if user is not authenticated
     - settings if neither private nor family vault is configured
     Answers GET requests with HTML render of upload page.
-    Answers POST requests by creating memory.
+    Answers POST requests by creating memory. With UPLOAD_ASYNC the image is processed
+    by a background job and 202 is returned, the page polls the job for completion.
 
     Returns:
         Reponse: A redirect or rendered template for memory upload.
@@ -58,11 +65,8 @@ def upload():
                                            user=session["user_info"],
                                            vault=session.get("vault_info", None))
 
-                vault_id = session.get("vault_info")["vault_id"]
-                collection_period_start = datetime.strptime(session.get(
-                    "vault_info")["curr_period_start"], "%A, %b %d, %Y").date()
-                collection_period_end = datetime.strptime(session.get(
-                    "vault_info")["curr_period_end"], "%A, %b %d, %Y").date()
+                vault_id, collection_period_start, collection_period_end = \
+                    _get_upload_vault(request.form["vault"])
             elif request.form["vault"] == "family_vault":
                 if not session.get("family_vault_info", False):
                     flash(
@@ -74,11 +78,8 @@ def upload():
                                            user=session["user_info"],
                                            vault=session.get("vault_info", None))
 
-                vault_id = session.get("family_vault_info")["vault_id"]
-                collection_period_start = datetime.strptime(session.get(
-                    "family_vault_info")["curr_period_start"], "%A, %b %d, %Y").date()
-                collection_period_end = datetime.strptime(session.get(
-                    "family_vault_info")["curr_period_end"], "%A, %b %d, %Y").date()
+                vault_id, collection_period_start, collection_period_end = \
+                    _get_upload_vault(request.form["vault"])
             else:
                 flash("Memory could not be uploaded.\
                     You have to chose a vault to upload.",
@@ -105,22 +106,424 @@ def upload():
             latitude = request.form.get("latitude", None)
             longitude = request.form.get("longitude", None)
 
+            # -- Image was sent beforehand as resumable chunked upload --
+            upload_id = request.form.get("upload_id")
+            image_file = request.files.get("image")
+            if upload_id:
+                image_file = chunked_uploads.open_completed(upload_id, session["user_id"])
+
             # -- Create memory --
-            MemoryManagement.upload_memory(description=request.form["description"],
-                                           date=request.form["date"],
-                                           latitude=latitude if latitude != '' else None,
-                                           longitude=longitude if longitude != '' else None,
-                                           image_file=request.files.get(
-                                               "image"),
-                                           vault_id=vault_id)
+            job_id = None
+            try:
+                if current_app.config["UPLOAD_ASYNC"] and image_file:
+                    # -- Image is processed by a background job, the page polls for completion --
+                    job_id = MemoryManagement.upload_memory_async(
+                        description=request.form["description"],
+                        date=request.form["date"],
+                        latitude=latitude if latitude != '' else None,
+                        longitude=longitude if longitude != '' else None,
+                        image_file=image_file,
+                        vault_id=vault_id,
+                        user_id=session["user_id"])
+                else:
+                    MemoryManagement.upload_memory(description=request.form["description"],
+                                                   date=request.form["date"],
+                                                   latitude=latitude if latitude != '' else None,
+                                                   longitude=longitude if longitude != '' else None,
+                                                   image_file=image_file,
+                                                   vault_id=vault_id,
+                                                   user_id=session["user_id"])
+            finally:
+                if upload_id:
+                    image_file.close()
+            if upload_id:
+                chunked_uploads.delete(upload_id)
+
+            if job_id is not None:
+                return render_template('memory_upload.html',
+                                       title="Homepage",
+                                       user=session["user_info"],
+                                       vault=session["vault_info"],
+                                       job_url=url_for("memory.job_status", job_id=job_id)), 202
 
             return render_template('memory_upload.html',
                                    title="Homepage",
                                    user=session["user_info"],
                                    vault=session["vault_info"])
+    except RequestEntityTooLarge:
+        flash("Memory could not be uploaded. The uploaded image is too large.", "warning")
+        return render_template('memory_upload.html',
+                               title="Homepage",
+                               user=session["user_info"],
+                               vault=session.get("vault_info", None))
+    except (ImageProcessingException, UploadException) as e:
+        flash(f"Memory could not be uploaded. {e.get_message()}", "warning")
+        return render_template('memory_upload.html',
+                               title="Homepage",
+                               user=session["user_info"],
+                               vault=session.get("vault_info", None))
     except Exception as e:
         logging.error("Something went wrong %s", traceback.format_exc())
         message = "Please contact an admin to get furhter insights into this error."
         if session.get("user_info", {}).get("is_admin", False):
             message = traceback.format_exc()
         return render_template("base.html", user=session["user_info"], error=message)
+
+
+def _get_upload_vault(vault_choice: str) -> tuple:
+    """
+    Returns the vault memories are uploaded to and its current collection period.
+
+    Parameters:
+        vault_choice: str
+            "own_vault" or "family_vault" as chosen in the upload form
+
+    Returns:
+        tuple: vault id, start and end date of the current collection period
+        None: if the chosen vault is not configured
+    """
+    vault_key = {"own_vault": "vault_info", "family_vault": "family_vault_info"}.get(vault_choice)
+    if vault_key is None or not session.get(vault_key, False):
+        return None
+
+    vault_info = session[vault_key]
+    return (vault_info["vault_id"],
+            datetime.strptime(vault_info["curr_period_start"], "%A, %b %d, %Y").date(),
+            datetime.strptime(vault_info["curr_period_end"], "%A, %b %d, %Y").date())
+
+
+def _parse_batch_memory(item: dict, period_start, period_end) -> dict:
+    """
+    Validates a memory of a batch upload against the collection period of the vault.
+
+    Parameters:
+        item: dict
+            Memory as sent by the client with keys "description", "date",
+            optional "latitude", "longitude" and "image" (name of the file part)
+        period_start: date
+        period_end: date
+
+    Returns:
+        dict: memory as expected by MemoryManagement.upload_memories
+    """
+    if not isinstance(item, dict):
+        raise ValueError("Memory has to be an object.")
+
+    description = item.get("description")
+    if not isinstance(description, str) or not description.strip():
+        raise ValueError("Description is missing.")
+    if len(description) > 1000:
+        raise ValueError("Description is too long.")
+
+    try:
+        memory_date = datetime.strptime(item.get("date") or "", "%Y-%m-%d").date()
+    except ValueError as e:
+        raise ValueError("Date has to be in format YYYY-MM-DD.") from e
+    if period_start > memory_date or period_end < memory_date:
+        raise ValueError("Date is not part of the current Collection Period.")
+
+    coordinates = {}
+    for coordinate in ["latitude", "longitude"]:
+        value = item.get(coordinate)
+        try:
+            coordinates[coordinate] = float(value) if value not in (None, "") else None
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"{coordinate.capitalize()} is not a number.") from e
+
+    image_file = None
+    if item.get("image"):
+        image_file = request.files.get(item["image"])
+        if image_file is None:
+            raise ValueError(f"Image {item['image']} is missing in the request.")
+        image_file.stream.seek(0, io.SEEK_END)
+        image_size = image_file.stream.tell()
+        image_file.stream.seek(0)
+        if image_size > current_app.config["MAX_CONTENT_LENGTH"]:
+            raise ValueError("The uploaded image is too large.")
+
+    return {"description": description,
+            "date": memory_date,
+            "image_file": image_file,
+            **coordinates}
+
+
+@memory_bp.route('/batch', methods=["POST"])
+def upload_batch():
+    """
+    Handles POST requests to url + /memory/batch.
+
+    Creates many memories with a single multipart request. The form field "vault" selects
+    the vault ("own_vault" or "family_vault"), the form field "memories" holds a JSON list of
+    memories with "description", "date", optional "latitude", "longitude" and "image",
+    the name of the file part containing the image.
+    All valid memories are created within one transaction.
+
+    Answers with:
+    - 200 and a result per memory, in the order of the request
+    - 400 if the request is malformed or the vault is not configured
+    - 401 if user is not authenticated
+    - 413 if the request is too large
+
+    Returns:
+        Response: JSON report of the upload.
+    """
+    # -- Check if user is already logged in --
+    if not session.get("user_id", False):
+        return jsonify({"error": "Please login first"}), 401
+
+    # -- Batches may carry many images, each one is checked against MAX_CONTENT_LENGTH --
+    request.max_content_length = current_app.config["MEMORY_BATCH_MAX_CONTENT_LENGTH"]
+
+    try:
+        upload_vault = _get_upload_vault(request.form.get("vault"))
+        if upload_vault is None:
+            return jsonify({"error": "The chosen vault is not configured."}), 400
+        vault_id, collection_period_start, collection_period_end = upload_vault
+
+        try:
+            items = json.loads(request.form.get("memories") or "")
+        except ValueError:
+            return jsonify({"error": "Memories have to be a JSON list."}), 400
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "Memories have to be a JSON list."}), 400
+        if len(items) > current_app.config["MEMORY_BATCH_MAX_ITEMS"]:
+            return jsonify({"error": "Too many memories in one upload."}), 400
+
+        # -- Validate all memories before processing any image --
+        results = [None] * len(items)
+        memories = []
+        memory_indices = []
+        for index, item in enumerate(items):
+            try:
+                memories.append(_parse_batch_memory(item,
+                                                    collection_period_start,
+                                                    collection_period_end))
+                memory_indices.append(index)
+            except ValueError as e:
+                results[index] = {"status": "failed", "error": str(e)}
+
+        if memories:
+            for index, result in zip(memory_indices,
+                                     MemoryManagement.upload_memories(
+                                         memories, vault_id, user_id=session["user_id"])):
+                results[index] = result
+
+        number_created = sum(result["status"] == "created" for result in results)
+        logging.info(f"User {session.get('user_id', None)} uploaded "
+                     f"{number_created} memories in a batch.")
+        return jsonify({
+            "created": number_created,
+            "failed": len(results) - number_created,
+            "results": [{"index": index, **result} for index, result in enumerate(results)]
+        })
+    except RequestEntityTooLarge:
+        return jsonify({"error": "The upload is too large."}), 413
+    except Exception:
+        logging.error("Something went wrong %s", traceback.format_exc())
+        return jsonify({"error": "Memories could not be uploaded."}), 500
+
+
+@memory_bp.route('/uploads', methods=["POST"])
+def create_upload():
+    """
+    Handles POST requests to url + /memory/uploads.
+
+    Starts a resumable chunked upload of an image. The JSON body holds the total "size"
+    of the image in bytes. Chunks are sent with PUT to the returned Location, the memory
+    is created by posting the upload form with the "upload_id" instead of an image.
+
+    Answers with:
+    - 201 and the status of the new upload
+    - 400 if the size is missing or too large
+    - 401 if user is not authenticated
+
+    Returns:
+        Response: JSON status of the upload.
+    """
+    # -- Check if user is already logged in --
+    if not session.get("user_id", False):
+        return jsonify({"error": "Please login first"}), 401
+
+    try:
+        size = (request.get_json(silent=True) or {}).get("size")
+        upload_status = chunked_uploads.create(session["user_id"], size)
+    except UploadException as e:
+        return jsonify({"error": e.get_message()}), 400
+
+    response = jsonify(upload_status)
+    response.status_code = 201
+    response.headers["Location"] = url_for("memory.upload_chunk",
+                                           upload_id=upload_status["upload_id"])
+    return response
+
+
+@memory_bp.route('/uploads/<upload_id>', methods=["GET", "PUT"])
+def upload_chunk(upload_id: str):
+    """
+    Handles GET and PUT requests to url + /memory/uploads/<upload_id>.
+
+    GET returns the current offset, so clients resume an interrupted upload there.
+    PUT appends the request body at the offset given in the Upload-Offset header,
+    which has to match the current offset of the upload.
+
+    Answers with:
+    - 200 and the status of the upload
+    - 400 if the chunk is invalid
+    - 401 if user is not authenticated
+    - 404 if the upload does not exist, expired or belongs to another user
+    - 409 and the current offset if the chunk does not continue the upload
+    - 413 if the chunk is too large
+
+    Returns:
+        Response: JSON status of the upload.
+    """
+    # -- Check if user is already logged in --
+    if not session.get("user_id", False):
+        return jsonify({"error": "Please login first"}), 401
+
+    try:
+        if request.method == "GET":
+            return jsonify(chunked_uploads.get(upload_id, session["user_id"]))
+
+        offset = request.headers.get("Upload-Offset", type=int)
+        if offset is None:
+            return jsonify({"error": "Upload-Offset header is missing."}), 400
+
+        return jsonify(chunked_uploads.append(upload_id, session["user_id"],
+                                              offset, request.stream))
+    except UploadNotFoundException as e:
+        return jsonify({"error": e.get_message()}), 404
+    except UploadOffsetException as e:
+        return jsonify({"error": e.get_message(), "offset": e.offset}), 409
+    except UploadException as e:
+        return jsonify({"error": e.get_message()}), 400
+    except RequestEntityTooLarge:
+        return jsonify({"error": "The chunk is too large."}), 413
+    except Exception:
+        logging.error("Something went wrong %s", traceback.format_exc())
+        return jsonify({"error": "Chunk could not be uploaded."}), 500
+
+
+@memory_bp.route('/jobs/<int:job_id>', methods=["GET"])
+def job_status(job_id: int):
+    """
+    Handles GET requests to url + /memory/jobs/<job_id>.
+
+    Returns the state of a background job started by an upload of the user.
+
+    Answers with:
+    - 200 and the status ("queued", "running", "done" or "failed") of the job
+    - 401 if user is not authenticated
+    - 404 if the job does not exist or was started by another user
+
+    Returns:
+        Response: JSON status of the job.
+    """
+    # -- Check if user is already logged in --
+    if not session.get("user_id", False):
+        return jsonify({"error": "Please login first"}), 401
+
+    job = job_queue.get_job(job_id)
+    if job is None or job["payload"].get("user_id") != session["user_id"]:
+        return jsonify({"error": "Job does not exist."}), 404
+
+    return jsonify({"id": job["id"], "status": job["status"], "error": job["last_error"]
+                    if job["status"] == "failed" else None})
+
+
+def _get_accessible_vault_ids() -> list:
+    """
+    Returns the ids of all vaults the logged in user is allowed to view.
+
+    Returns:
+        list: containing the ids of the private and family vault
+    """
+    vault_ids = []
+    for vault_key in ["vault_info", "family_vault_info"]:
+        if session.get(vault_key, False):
+            vault_ids.append(session[vault_key]["vault_id"])
+
+    return vault_ids
+
+
+@memory_bp.route('/<int:memory_id>/image', methods=["GET"])
+def image(memory_id: int):
+    """
+    Handles GET requests to url + /memory/<memory_id>/image.
+
+    Streams the image of a memory so browsers can cache it independently of the slide.
+    The optional query parameter "rendition" selects a smaller stored rendition.
+    The format is negotiated using the Accept header.
+    Supports conditional requests (ETag / Last-Modified) and HTTP Range requests.
+
+    Answers with:
+    - 302 to a signed blob storage URL if IMAGE_SIGNED_URLS is enabled
+    - 401 if user is not authenticated
+    - 404 if memory has no image or belongs to a vault the user cannot access
+
+    Returns:
+        Response: The image bytes or an empty 304 / 206 response.
+    """
+    # -- Check if user is already logged in --
+    if not session.get("user_id", False):
+        abort(401)
+
+    try:
+        # -- Check if memory belongs to one of the users vaults --
+        memory_data = MemoryManagement.get_memory_data(memory_id=memory_id)
+        if memory_data is None or not memory_data["image_uri"] \
+                or memory_data["vault_id"] not in _get_accessible_vault_ids():
+            abort(404)
+
+        image_uri, mimetype = select_image(memory_data, request.args.get("rendition"),
+                                           request.accept_mimetypes)
+
+        # -- Client fetches the image directly from blob storage --
+        signed_url = MemoryManagement.get_image_url(image_uri, mimetype)
+        if signed_url:
+            response = redirect(signed_url)
+            response.vary.add("Accept")
+            return response
+
+        # -- Content-addressed images already carry their hash in the uri --
+        etag = MemoryManagement.get_image_hash(image_uri)
+        image_path = MemoryManagement.get_image_path(image_uri)
+        accel_prefix = current_app.config["IMAGE_ACCEL_REDIRECT_PREFIX"]
+
+        if image_path and accel_prefix:
+            # -- Reverse proxy sends the file, the app only answers conditional requests --
+            response = current_app.response_class(mimetype=mimetype)
+            response.headers["X-Accel-Redirect"] = accel_prefix.rstrip("/") + "/" + image_uri
+            response.set_etag(etag or hashlib.sha256(image_uri.encode()).hexdigest())
+            response.last_modified = memory_data["created_at"]
+            response = response.make_conditional(request)
+        elif image_path:
+            # -- Local files are passed to the WSGI server's file wrapper (sendfile) --
+            response = send_file(image_path,
+                                 mimetype=mimetype,
+                                 etag=etag or True,
+                                 last_modified=memory_data["created_at"],
+                                 conditional=True)
+        else:
+            image_bytes = MemoryManagement.get_image_bytes(image_uri)
+            response = send_file(io.BytesIO(image_bytes),
+                                 mimetype=mimetype,
+                                 etag=etag or hashlib.sha256(image_bytes).hexdigest(),
+                                 last_modified=memory_data["created_at"],
+                                 conditional=True)
+
+        # -- Image belongs to a single user session and never changes --
+        response.vary.add("Accept")
+        response.cache_control.no_cache = None
+        response.cache_control.private = True
+        response.cache_control.max_age = current_app.config["IMAGE_CACHE_MAX_AGE"]
+
+        return response
+    except HTTPException:
+        raise
+    except FileNotFoundError:
+        logging.warning("Image of memory %s is missing in the storage", memory_id)
+        abort(404)
+    except Exception:
+        logging.error("Something went wrong %s", traceback.format_exc())
+        abort(500)
@@ -5,7 +5,7 @@ Defines blueprint and logic for handeling requests to /settings url.
 import traceback
 import logging
 from flask import Blueprint, render_template, request, session, redirect, url_for, flash
-from ..services import UserManagement, VaultManagement, UserException
+from ..services import UserManagement, VaultManagement, UserException, regenerate_session
 
 settings_bp = Blueprint('settings', __name__, url_prefix='/settings')
 
@@ -39,10 +39,27 @@ def index():
         if session["user_info"].get("family_id", False):
             family_info = session.get("family_vault_info")
 
+        # -- Load statistics of all periods of both vaults at once --
+        vault_ids = [info["vault_id"] for info in [vault_info, family_info]
+                     if info and info.get("vault_id")]
+        period_stats = VaultManagement.get_period_stats(vault_ids)
+        vault_periods = None
+        if vault_info and vault_info.get("vault_id"):
+            vault_periods = VaultManagement.get_all_periods(
+                vault_id=vault_info["vault_id"],
+                period_stats=period_stats.get(vault_info["vault_id"], {}))[::-1]
+        family_periods = None
+        if family_info and family_info.get("vault_id"):
+            family_periods = VaultManagement.get_all_periods(
+                vault_id=family_info["vault_id"],
+                period_stats=period_stats.get(family_info["vault_id"], {}))[::-1]
+
         return render_template("settings.html",
                                user=session["user_info"],
                                vault=vault_info,
-                               family_vault=family_info)
+                               vault_periods=vault_periods,
+                               family_vault=family_info,
+                               family_periods=family_periods)
 
     except Exception as e:
         logging.error("Something went wrong %s", traceback.format_exc())
@@ -127,6 +144,8 @@ def join_family():
             family_id = UserManagement.join_family(
                 user_id=session["user_id"], invite_code=request.form.get("invite-code", ""))
 
+            # -- Access to the family vault is granted under a new session id --
+            regenerate_session()
             # -- Load family information into session --
             session["user_info"] = UserManagement.get_user_info(
                 session["user_id"])
@@ -176,6 +195,8 @@ def create_family():
             # -- Create family and store in db --
             family_id = UserManagement.create_family(
                 user_id=session["user_id"], family_name=request.form.get("family-name"))
+            # -- Access to the family vault is granted under a new session id --
+            regenerate_session()
             session["user_info"] = UserManagement.get_user_info(
                 session["user_id"])
             session["family_info"] = UserManagement.get_family_info(
@@ -230,6 +251,7 @@ def quit_family():
             logging.info(
                 f"User {session.get('user_id', None)} left his family.")
             UserManagement.quit_family(session["user_id"])
+            regenerate_session()
             session["user_info"] = UserManagement.get_user_info(
                 session["user_id"])
             session.pop("family_vault_info")
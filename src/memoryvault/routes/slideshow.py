@@ -3,17 +3,169 @@ Module containing HTTP routes for slideshow.
 Defines blueprint and logic for handeling requests to /slideshow url.
 """
 import os
-import base64
 import logging
 import traceback
 from datetime import datetime
-from flask import Blueprint, render_template, \
-    request, session, redirect, url_for, flash, current_app
+from flask import Blueprint, render_template, make_response, \
+    request, session, redirect, url_for, flash, current_app, jsonify
 
-from ..services import MemoryManagement, SlideshowModes, VaultManagement
+from ..services import MemoryManagement, SlideshowModes, VaultManagement, slide_prefetcher, \
+    slideshow_store, slideshow_memories, SlideshowNotFoundException
 
 slideshow_bp = Blueprint('slideshow', __name__, url_prefix='/slideshow')
 
+# Rendered width of slide images, used by the srcset selection of the browser
+IMAGE_SIZES = "(min-width: 768px) 66vw, 100vw"
+
+
+def _get_image_srcset(memory_data: dict) -> str:
+    """
+    Builds the srcset attribute listing all stored renditions of a memory image.
+
+    Parameters:
+        memory_data: dict
+            Memory information as returned by MemoryManagement.get_memory_data
+
+    Returns:
+        str: srcset value or None if no renditions are stored
+    """
+    renditions = sorted(memory_data.get("images", {}).values(),
+                        key=lambda rendition: rendition["width"])
+    if not renditions:
+        return None
+
+    return ", ".join(
+        f'{url_for("memory.image", memory_id=memory_data["id"], rendition=rendition["rendition"])} '
+        f'{rendition["width"]}w'
+        for rendition in renditions)
+
+
+def _get_signed_image_sources(memory_data: dict) -> dict:
+    """
+    Lists signed blob storage URLs for every stored format of a memory image.
+
+    Parameters:
+        memory_data: dict
+            Memory information as returned by MemoryManagement.get_memory_data
+
+    Returns:
+        dict: mapping mimetype to a list of (signed URL, width) sorted by width,
+              ordered from smallest to largest format
+        None: if the images cannot be fetched with signed URLs
+    """
+    renditions = sorted(memory_data.get("images", {}).values(),
+                        key=lambda rendition: rendition["width"])
+
+    # -- Memories uploaded before renditions were introduced only have a JPEG --
+    if not renditions:
+        signed_url = MemoryManagement.get_image_url(memory_data["image_uri"])
+        return {"image/jpeg": [(signed_url, None)]} if signed_url else None
+
+    sources = {}
+    format_sizes = {}
+    for rendition in renditions:
+        for mimetype, image in rendition["formats"].items():
+            signed_url = MemoryManagement.get_image_url(image["image_uri"], mimetype)
+            if signed_url is None:
+                return None
+            sources.setdefault(mimetype, []).append((signed_url, rendition["width"]))
+            format_sizes[mimetype] = format_sizes.get(mimetype, 0) + (image["size_bytes"] or 0)
+
+    return {mimetype: sources[mimetype]
+            for mimetype in sorted(sources, key=lambda mimetype: format_sizes[mimetype])}
+
+
+def _get_slide_images(memory_data: dict) -> dict:
+    """
+    Builds the image URLs rendered for a memory. With IMAGE_SIGNED_URLS images are
+    referenced by signed blob storage URLs, otherwise by the memory image route.
+
+    Parameters:
+        memory_data: dict
+            Memory information as returned by MemoryManagement.get_memory_data
+
+    Returns:
+        dict: containing "image_url", "image_srcset" and "image_sources"
+              (list of alternative formats with "type" and "srcset")
+    """
+    slide_images = {"image_url": None, "image_srcset": None, "image_sources": None}
+    if not memory_data["image_uri"]:
+        return slide_images
+
+    # -- Image is served separately so browsers can cache it --
+    signed_sources = _get_signed_image_sources(memory_data) \
+        if current_app.config["IMAGE_SIGNED_URLS"] else None
+    if signed_sources and "image/jpeg" in signed_sources:
+        # -- Browser picks the first format it supports, JPEG is the fallback --
+        jpeg_sources = signed_sources.pop("image/jpeg")
+        slide_images["image_url"] = jpeg_sources[-1][0]
+        if jpeg_sources[-1][1]:
+            slide_images["image_srcset"] = ", ".join(f"{signed_url} {width}w"
+                                                     for signed_url, width in jpeg_sources)
+        slide_images["image_sources"] = [
+            {"type": mimetype,
+             "srcset": ", ".join(f"{signed_url} {width}w" for signed_url, width in sources)}
+            for mimetype, sources in signed_sources.items()]
+    else:
+        slide_images["image_url"] = url_for("memory.image", memory_id=memory_data["id"])
+        slide_images["image_srcset"] = _get_image_srcset(memory_data)
+
+    return slide_images
+
+
+def _get_preload_link(slide_images: dict) -> str:
+    """
+    Builds a Link header value preloading the image the browser will pick for a slide.
+    Only the preferred format is preloaded, browsers not supporting it skip the hint.
+
+    Parameters:
+        slide_images: dict
+            Image URLs as returned by _get_slide_images
+
+    Returns:
+        str: Link header value or None if the slide has no image
+    """
+    if not slide_images["image_url"]:
+        return None
+
+    image_url = slide_images["image_url"]
+    image_srcset = slide_images["image_srcset"]
+    link = f"<{image_url}>; rel=preload; as=image; fetchpriority=low"
+    if slide_images["image_sources"]:
+        preferred_source = slide_images["image_sources"][0]
+        image_srcset = preferred_source["srcset"]
+        link += f'; type="{preferred_source["type"]}"'
+    if image_srcset:
+        link += f'; imagesrcset="{image_srcset}"; imagesizes="{IMAGE_SIZES}"'
+
+    return link
+
+
+def _get_slide_info(memory_data: dict, slide_images: dict, position: int) -> dict:
+    """
+    Builds the information displayed on a slide.
+
+    Parameters:
+        memory_data: dict
+            Memory information as returned by MemoryManagement.get_memory_data
+        slide_images: dict
+            Image URLs as returned by _get_slide_images
+        position: int
+            1-based position of the slide.
+
+    Returns:
+        dict: containing index, date, description, image URLs and coordinates
+    """
+    return {
+        "index": position,
+        "date": memory_data["date"].strftime("%A, %b %d, %Y"),
+        "description": memory_data["description"],
+        **slide_images,
+        "image_sizes": IMAGE_SIZES,
+        "latitude": float(memory_data["latitude"]) if memory_data["latitude"] else None,
+        "longitude": float(memory_data["longitude"]) if memory_data["longitude"] else None
+    }
+
 
 @slideshow_bp.route('/', methods=["GET"])
 def index():
@@ -32,13 +184,19 @@ def index():
         flash("Please login first", "warning")
         return redirect(url_for("user.login"))
     try:
+        # -- Load statistics of all periods of both vaults at once --
+        period_stats = VaultManagement.get_period_stats(
+            [session[info]["vault_id"] for info in ["vault_info", "family_vault_info"]
+             if session.get(info, False)])
+
         # -- Check if user has private vault with a finished collection period to view --
         vault_slideshow_available = False
         vault_collection_periods = None
         if session.get("vault_info", False):
             # -- Get all existing periods of vault --
             vault_collection_periods = VaultManagement.get_all_periods(
-                vault_id=session["vault_info"]["vault_id"])
+                vault_id=session["vault_info"]["vault_id"],
+                period_stats=period_stats.get(session["vault_info"]["vault_id"], {}))
             # -- If not admin: is there one closed period --
             vault_slideshow_available = len(vault_collection_periods) > 0\
                 if session["user_info"]["admin"] else len(vault_collection_periods) > 1
@@ -49,7 +207,8 @@ def index():
         if session.get("family_vault_info", False):
             # -- Get all existing periods of vault --
             family_collection_periods = VaultManagement.get_all_periods(
-                vault_id=session["family_vault_info"]["vault_id"])
+                vault_id=session["family_vault_info"]["vault_id"],
+                period_stats=period_stats.get(session["family_vault_info"]["vault_id"], {}))
             # -- If not admin: is there one closed period --
             family_slideshow_available = len(family_collection_periods) > 0\
                 if session["user_info"]["admin"] else len(family_collection_periods) > 1
@@ -125,49 +284,72 @@ def start_slideshow():
             period_start = datetime.strptime(period[0], "%A, %b %d, %Y").date()
             period_end = datetime.strptime(period[1], "%A, %b %d, %Y").date()
 
-            # -- Get slideshow order --
-            session["slideshow_order"] = MemoryManagement.get_slideshow_order(vault_id=vault_id,
-                                                                              order=order,
-                                                                              period_start=period_start,
-                                                                              period_end=period_end)
+            # -- Start slideshow, only the id of the stored slideshow is kept in the session --
+            slideshow_id = MemoryManagement.create_slideshow(user_id=session["user_id"],
+                                                             vault_id=vault_id,
+                                                             order=order,
+                                                             period_start=period_start,
+                                                             period_end=period_end)
 
-            if len(session["slideshow_order"]) <= 0:
+            if slideshow_id is None:
                 flash("No memories were found for this collection period", "warning")
                 return redirect(url_for("slideshow.index"))
 
+            if session.get("slideshow_id"):
+                slideshow_store.delete(session["slideshow_id"])
+                slideshow_memories.delete(session["slideshow_id"])
+            session["slideshow_id"] = slideshow_id
             current_memory = 1
 
         # -- Logic for navigating through slideshow --
         elif request.method == "GET":
             current_memory = int(request.args.get("number", 1))
-            memory_order = session["slideshow_order"]
 
-            if current_memory >= len(memory_order):
-                current_memory = len(memory_order)
-            elif current_memory < 1:
-                current_memory = 1
+        try:
+            slideshow = slideshow_store.get(session.get("slideshow_id"), session["user_id"])
+        except SlideshowNotFoundException:
+            flash("The slideshow has expired, please start it again.", "warning")
+            return redirect(url_for("slideshow.index"))
+        number_memories = slideshow["number_memories"]
 
-        # -- Logic for displaying memories --
-        memory_data = MemoryManagement.get_memory_data(
-            memory_id=session["slideshow_order"][current_memory - 1])
-        image_b64 = None
+        if current_memory >= number_memories:
+            current_memory = number_memories
+        elif current_memory < 1:
+            current_memory = 1
 
-        if memory_data["image_uri"]:
-            image_data = MemoryManagement.get_image_bytes(
-                memory_data["image_uri"])
-            image_b64 = base64.b64encode(image_data).decode("utf-8")
+        # -- Logic for displaying memories --
+        slide_memories = MemoryManagement.get_slideshow_memories(
+            slideshow, current_memory - 1, current_memory + slide_prefetcher.count)
+        memory_data = slide_memories.get(current_memory - 1)
+        if memory_data is None:
+            flash("The memory was deleted, please start the slideshow again.", "warning")
+            return redirect(url_for("slideshow.index"))
+        slide_images = _get_slide_images(memory_data)
 
         display_memory_info = {
-            "index": current_memory,
-            "number_memories": len(session["slideshow_order"]),
-            "date": memory_data["date"].strftime("%A, %b %d, %Y"),
-            "description": memory_data["description"],
-            "image_b64": image_b64 if image_b64 else None,
-            "latitude": memory_data["latitude"] if memory_data["latitude"] else None,
-            "longitude": memory_data["longitude"] if memory_data["longitude"] else None
+            **_get_slide_info(memory_data, slide_images, current_memory),
+            "number_memories": number_memories
         }
 
-        return render_template("slide.html", user=session["user_info"], memory=display_memory_info)
+        # -- Load images of upcoming slides in the background and hint them to the browser --
+        upcoming_memories = list(slide_memories.values())[1:]
+        slide_prefetcher.prefetch(str(session["user_id"]), upcoming_memories,
+                                  request.accept_mimetypes)
+
+        window_size = current_app.config["SLIDESHOW_WINDOW_SIZE"]
+        response = make_response(render_template("slide.html",
+                                                  user=session["user_info"],
+                                                  memory=display_memory_info,
+                                                  window_size=window_size))
+        preload_links = []
+        for upcoming_data in upcoming_memories:
+            preload_link = _get_preload_link(_get_slide_images(upcoming_data))
+            if preload_link:
+                preload_links.append(preload_link)
+        if preload_links:
+            response.headers["Link"] = ", ".join(preload_links)
+
+        return response
 
     except Exception as e:
         logging.error("Something went wrong %s", traceback.format_exc())
@@ -175,3 +357,49 @@ def start_slideshow():
         if session.get("user_info", {}).get("is_admin", False):
             message = traceback.format_exc()
         return render_template("base.html", user=session["user_info"], error=message)
+
+
+@slideshow_bp.route('/slides', methods=["GET"])
+def slides():
+    """
+    Handles GET requests to url + /slideshow/slides.
+
+    Returns a window of slides of the running slideshow, used by the slideshow page
+    to navigate without reloading. Query parameters:
+    - start: 1-based position of the first slide
+    - count: number of slides, at most SLIDESHOW_WINDOW_SIZE
+
+    Answers with:
+    - 200 and the slides of the window
+    - 400 if the window is invalid
+    - 401 if user is not authenticated
+    - 404 if the slideshow expired
+
+    Returns:
+        Response: JSON containing "number_memories", "start" and "slides".
+    """
+    # -- Check if user is already logged in --
+    if not session.get("user_id", False):
+        return jsonify({"error": "Please login first"}), 401
+
+    window_size = current_app.config["SLIDESHOW_WINDOW_SIZE"]
+    start = request.args.get("start", 1, type=int)
+    count = min(request.args.get("count", window_size, type=int), window_size)
+    if start < 1 or count < 1:
+        return jsonify({"error": "Invalid window of slides."}), 400
+
+    try:
+        slideshow = slideshow_store.get(session.get("slideshow_id"), session["user_id"])
+    except SlideshowNotFoundException as e:
+        return jsonify({"error": e.get_message()}), 404
+
+    slide_memories = MemoryManagement.get_slideshow_memories(slideshow, start - 1,
+                                                             start - 1 + count)
+    window = [_get_slide_info(memory_data, _get_slide_images(memory_data), position + 1)
+              for position, memory_data in slide_memories.items()]
+
+    return jsonify({
+        "number_memories": slideshow["number_memories"],
+        "start": start,
+        "slides": window
+    })
@@ -2,11 +2,12 @@
 Module containing HTTP routes for user page.
 Defines blueprint and logic for handeling requests to /user url.
 """
+import time
 import logging
 import traceback
 from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, session
 
-from ..services import UserManagement, UserException, VaultManagement
+from ..services import UserManagement, UserException, VaultManagement, regenerate_session
 
 user_bp = Blueprint('user', __name__, url_prefix="/u")
 
@@ -36,7 +37,11 @@ def login():
 
             # -- Handle successful login and load user data into session --
             if user_id:
+                # -- New session id, so ids planted in the browser before never get logged in --
+                regenerate_session()
                 session["user_id"] = user_id
+                # -- Bounds the lifetime of signed image URLs handed out to the session --
+                session["login_at"] = time.time()
                 session["user_info"] = UserManagement.get_user_info(
                     user_id)
                 session["vault_info"] = VaultManagement.get_vault_info(user_id)
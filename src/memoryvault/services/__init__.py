@@ -2,15 +2,68 @@
 Service package initializer.
 Loads all utility classes and enables easier imports.
 """
-from .memory_util import MemoryManagement, SlideshowModes
+from flask import Flask
+
+from .image_util import image_executor, ImageProcessingException
+from .job_util import job_queue, JobException
+from .storage_util import blob_client_registry, blob_replicator, image_storage
+from .cache_util import image_cache
+from .memory_util import MemoryManagement, SlideshowModes, select_image
+from .prefetch_util import slide_prefetcher
+from .session_util import server_sessions, regenerate_session, get_session_expiry
+from .slideshow_util import slideshow_store, slideshow_memories, SlideshowNotFoundException
+from .stats_util import PeriodStatistics
+from .upload_util import chunked_uploads, UploadException, UploadNotFoundException, \
+    UploadOffsetException
 from .user_util import UserManagement, UserException, LoginException
 from .vault_util import VaultManagement
 
 __all__ = [
+    "blob_client_registry",
+    "blob_replicator",
+    "image_cache",
+    "image_executor",
+    "image_storage",
+    "ImageProcessingException",
+    "job_queue",
+    "JobException",
     "MemoryManagement",
+    "PeriodStatistics",
+    "regenerate_session",
+    "get_session_expiry",
+    "select_image",
+    "server_sessions",
     "SlideshowModes",
+    "slide_prefetcher",
+    "slideshow_store",
+    "slideshow_memories",
+    "SlideshowNotFoundException",
+    "chunked_uploads",
+    "UploadException",
+    "UploadNotFoundException",
+    "UploadOffsetException",
     "UserManagement",
     "UserException",
     "LoginException",
     "VaultManagement"
 ]
+
+
+def init_app(app: Flask) -> None:
+    """
+    Initializes services that hold per-app state.
+
+    Returns:
+        None
+    """
+    image_executor.init_app(app)
+    blob_client_registry.init_app(app)
+    blob_replicator.init_app(app)
+    image_storage.init_app(app)
+    image_cache.init_app(app)
+    slide_prefetcher.init_app(app)
+    slideshow_store.init_app(app)
+    slideshow_memories.init_app(app)
+    chunked_uploads.init_app(app)
+    job_queue.init_app(app)
+    server_sessions.init_app(app)
@@ -0,0 +1,304 @@
+"""
+Module containing utility classes for caching in front of the image storage.
+Image uris are content-addressed and never change their content,
+so cached images never have to be invalidated.
+"""
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from flask import Flask
+
+from .storage_util import write_file_atomic
+
+
+class ImageCache:
+    """
+    Two tier cache for image bytes keyed by image_uri.
+    The memory tier is an LRU bounded by the total number of cached bytes, the optional
+    disk tier keeps evicted images on local disk. Missing images are cached negatively
+    for a short time, so repeated requests do not hit the storage again.
+    """
+
+    def __init__(self):
+        self.max_bytes = 0
+        self.max_item_bytes = 0
+        self.disk_folder = None
+        self.disk_max_bytes = 0
+        self.negative_ttl = 0
+        self.metrics_interval = 0
+        self._last_metrics_log = None
+
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._disk_bytes = 0
+        self._missing = {}
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._negative_hits = 0
+        self._evictions = 0
+
+    def init_app(self, app: Flask) -> None:
+        """
+        Reads the cache sizes from the app configuration and measures the disk tier.
+
+        Returns:
+            None
+        """
+        self.max_bytes = app.config["IMAGE_MEMORY_CACHE_BYTES"]
+        self.max_item_bytes = app.config["IMAGE_CACHE_MAX_ITEM_BYTES"]
+        self.disk_folder = app.config["IMAGE_DISK_CACHE_FOLDER"]
+        self.disk_max_bytes = app.config["IMAGE_DISK_CACHE_BYTES"]
+        self.negative_ttl = app.config["IMAGE_NEGATIVE_CACHE_TTL"]
+        self.metrics_interval = app.config["IMAGE_CACHE_METRICS_INTERVAL"]
+        self._last_metrics_log = time.monotonic()
+        self.clear()
+
+        if self.disk_folder:
+            os.makedirs(self.disk_folder, exist_ok=True)
+            self._disk_bytes = sum(size for _, _, size in self._list_disk_entries())
+
+    def clear(self) -> None:
+        """
+        Removes all entries of the memory tier and the negative cache.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._entries.clear()
+            self._missing.clear()
+            self._bytes = 0
+
+    def get(self, image_uri: str) -> bytes:
+        """
+        Returns the cached bytes of an image.
+
+        Parameters:
+            image_uri: str
+                Storage key of the image.
+
+        Returns:
+            bytes: the cached image
+            None: if the image is not cached
+        """
+        self._log_metrics_periodically()
+        with self._lock:
+            image_bytes = self._entries.get(image_uri)
+            if image_bytes is not None:
+                self._entries.move_to_end(image_uri)
+                self._hits += 1
+                return image_bytes
+
+        image_bytes = self._get_from_disk(image_uri)
+        with self._lock:
+            if image_bytes is None:
+                self._misses += 1
+                return None
+            self._disk_hits += 1
+        self._put_in_memory(image_uri, image_bytes)
+
+        return image_bytes
+
+    def put(self, image_uri: str, image_bytes: bytes) -> None:
+        """
+        Adds an image to the memory and disk tier.
+        Images larger than IMAGE_CACHE_MAX_ITEM_BYTES are not cached.
+
+        Parameters:
+            image_uri: str
+                Storage key of the image.
+            image_bytes: bytes
+                The image.
+
+        Returns:
+            None
+        """
+        if len(image_bytes) > self.max_item_bytes:
+            return
+
+        self._put_in_memory(image_uri, image_bytes)
+        self._put_on_disk(image_uri, image_bytes)
+
+    def is_missing(self, image_uri: str) -> bool:
+        """
+        Returns whether the image was recently found to be missing in the storage.
+
+        Parameters:
+            image_uri: str
+                Storage key of the image.
+
+        Returns:
+            bool
+        """
+        with self._lock:
+            expires = self._missing.get(image_uri)
+            if expires is None:
+                return False
+            if expires < time.monotonic():
+                del self._missing[image_uri]
+                return False
+            self._negative_hits += 1
+            return True
+
+    def put_missing(self, image_uri: str) -> None:
+        """
+        Remembers that an image is missing in the storage for IMAGE_NEGATIVE_CACHE_TTL seconds.
+
+        Parameters:
+            image_uri: str
+                Storage key of the image.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._missing[image_uri] = time.monotonic() + self.negative_ttl
+
+    def get_metrics(self) -> dict:
+        """
+        Returns hit, miss and eviction counters as well as the size of the cache tiers.
+
+        Returns:
+            dict: containing the cache metrics
+        """
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "negative_hits": self._negative_hits,
+                "evictions": self._evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "disk_bytes": self._disk_bytes
+            }
+
+    def _log_metrics_periodically(self) -> None:
+        """
+        Logs the metrics at most every IMAGE_CACHE_METRICS_INTERVAL seconds,
+        so the effectiveness of the cache shows up in the logs of the app.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if not self.metrics_interval \
+                    or time.monotonic() - self._last_metrics_log < self.metrics_interval:
+                return
+            self._last_metrics_log = time.monotonic()
+
+        logging.info("Image cache: %(hits)s memory hits, %(disk_hits)s disk hits, "
+                     "%(misses)s misses, %(negative_hits)s negative hits, %(evictions)s "
+                     "evictions, %(entries)s entries, %(bytes)s bytes in memory, "
+                     "%(disk_bytes)s bytes on disk", self.get_metrics())
+
+    def _put_in_memory(self, image_uri: str, image_bytes: bytes) -> None:
+        """
+        Adds an image to the memory tier and evicts the least recently used images.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if image_uri in self._entries:
+                self._entries.move_to_end(image_uri)
+                return
+
+            self._entries[image_uri] = image_bytes
+            self._bytes += len(image_bytes)
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted_bytes = self._entries.popitem(last=False)
+                self._bytes -= len(evicted_bytes)
+                self._evictions += 1
+
+    def _get_disk_path(self, image_uri: str) -> str:
+        """
+        Returns the path an image is cached under in the disk tier.
+
+        Returns:
+            str
+        """
+        return os.path.join(self.disk_folder, image_uri)
+
+    def _get_from_disk(self, image_uri: str) -> bytes:
+        """
+        Reads an image from the disk tier and marks it as recently used.
+
+        Returns:
+            bytes: the cached image
+            None: if the image is not cached on disk
+        """
+        if not self.disk_folder:
+            return None
+
+        disk_path = self._get_disk_path(image_uri)
+        try:
+            with open(disk_path, "rb") as fp:
+                image_bytes = fp.read()
+            os.utime(disk_path)
+        except FileNotFoundError:
+            return None
+
+        return image_bytes
+
+    def _put_on_disk(self, image_uri: str, image_bytes: bytes) -> None:
+        """
+        Writes an image to the disk tier and evicts the least recently used images
+        once IMAGE_DISK_CACHE_BYTES is exceeded.
+
+        Returns:
+            None
+        """
+        if not self.disk_folder:
+            return
+
+        disk_path = self._get_disk_path(image_uri)
+        if os.path.exists(disk_path):
+            return
+        write_file_atomic(disk_path, image_bytes)
+
+        with self._lock:
+            self._disk_bytes += len(image_bytes)
+            if self._disk_bytes <= self.disk_max_bytes:
+                return
+
+        # -- Evict down to 90% of the limit, so eviction does not run on every write --
+        for path, _, size in sorted(self._list_disk_entries(), key=lambda entry: entry[1]):
+            with self._lock:
+                if self._disk_bytes <= self.disk_max_bytes * 0.9:
+                    break
+                self._disk_bytes -= size
+                self._evictions += 1
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _list_disk_entries(self) -> list:
+        """
+        Lists all images in the disk tier.
+
+        Returns:
+            list: containing tuples of path, last access time and size
+        """
+        entries = []
+        for folder, _, filenames in os.walk(self.disk_folder):
+            for filename in filenames:
+                if filename.endswith(".partial"):
+                    continue
+                path = os.path.join(folder, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((path, stat.st_mtime, stat.st_size))
+
+        return entries
+
+
+image_cache = ImageCache()
@@ -0,0 +1,317 @@
+"""
+Module containing utility classes for image processing.
+Decoding, resizing and encoding of uploaded images is offloaded to a process pool
+so CPU heavy uploads do not block the request workers.
+Pillow is imported on first use, so processes that never touch images do not load it.
+"""
+import io
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from flask import Flask
+
+
+class ImageProcessingException(Exception):
+    """
+    Custom Exception for uploaded images that are invalid or could not be processed in time.
+    """
+
+    def __init__(self, message: str, *args):
+        super().__init__(*args)
+        self.message = message
+
+    def get_message(self) -> str:
+        """
+        Returns error message.
+        """
+        return self.message
+
+
+def validate_image_header(image_path: str,
+                          allowed_formats: tuple,
+                          max_pixels: int) -> tuple:
+    """
+    Checks format and dimensions of an image by only parsing its header.
+    No pixel data is decoded, so this is cheap even for very large uploads.
+
+    Parameters:
+        image_path: str
+            Path of the uploaded image.
+        allowed_formats: tuple
+            Pillow format names that are accepted, e.g. "JPEG".
+        max_pixels: int
+            Maximum number of pixels (width * height) of the image.
+
+    Returns:
+        tuple: width and height of the image
+    """
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        with Image.open(image_path) as image:
+            image_format = image.format
+            image_size = image.size
+    except (UnidentifiedImageError, Image.DecompressionBombError) as e:
+        raise ImageProcessingException(
+            "The uploaded file is not a supported image.") from e
+
+    if image_format not in allowed_formats:
+        raise ImageProcessingException(
+            f"Images of type {image_format} are not supported.")
+    if image_size[0] * image_size[1] > max_pixels:
+        raise ImageProcessingException(
+            "The uploaded image has too many pixels.")
+
+    return image_size
+
+
+def get_supported_encoders(encoders: dict) -> dict:
+    """
+    Filters the configured encoders to the formats the installed Pillow build can write.
+
+    Parameters:
+        encoders: dict
+            Mapping of mimetype to Pillow save options including "format".
+
+    Returns:
+        dict: the encoders that are supported
+    """
+    from PIL import Image
+
+    Image.init()
+
+    return {mimetype: options for mimetype, options in encoders.items()
+            if options["format"] in Image.SAVE}
+
+
+def process_image(image_path: str, renditions: list, encoders: dict) -> list:
+    """
+    Decodes an uploaded image and encodes it in all requested renditions and formats.
+    Renditions have to be sorted from largest to smallest. Renditions that would not
+    be smaller than the previous one are skipped.
+    JPEGs are decoded directly at the smallest scale still covering the largest rendition,
+    so memory usage does not depend on the resolution of the upload.
+    Runs inside the worker processes, therefore only takes and returns picklable values.
+
+    Parameters:
+        image_path: str
+            Path of the uploaded image.
+        renditions: list
+            Tuples of rendition name and maximum (width, height).
+        encoders: dict
+            Mapping of mimetype to Pillow save options including "format".
+            Formats the Pillow build cannot write are skipped.
+
+    Returns:
+        list: containing dicts with keys "rendition", "mimetype", "width", "height" and "data"
+    """
+    from PIL import Image, ImageOps
+
+    encoders = get_supported_encoders(encoders)
+
+    with Image.open(image_path) as source_image:
+        # -- Draft has to be set before EXIF transpose loads the pixel data --
+        # Square target, as the orientation is only known after the transpose
+        max_edge = max(renditions[0][1])
+        source_image.draft("RGB", (max_edge, max_edge))
+        image = ImageOps.exif_transpose(source_image)
+
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    # -- Resize from largest to smallest rendition, reusing the previous result --
+    results = []
+    for rendition_name, max_size in renditions:
+        previous_size = image.size
+        image = image.copy()
+        image.thumbnail(max_size)
+        if results and image.size == previous_size:
+            continue
+
+        for mimetype, options in encoders.items():
+            image_buffer = io.BytesIO()
+            image.save(image_buffer, **options)
+            results.append({
+                "rendition": rendition_name,
+                "mimetype": mimetype,
+                "width": image.size[0],
+                "height": image.size[1],
+                "data": image_buffer.getvalue()
+            })
+
+    return results
+
+
+class ImageExecutor:
+    """
+    Bounded executor running image processing in a pool of worker processes.
+    With IMAGE_PROCESSING_WORKERS set to 0 (or before init_app is called)
+    images are processed in-process, which is used for testing.
+    """
+
+    def __init__(self):
+        self.workers = 0
+        self.timeout = None
+        self.metrics_interval = 0
+        self._last_metrics_log = None
+        self._slots = None
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+
+        self._queue_depth = 0
+        self._submitted = 0
+        self._rejected = 0
+        self._timeouts = 0
+        self._total_latency = 0.0
+        self._max_latency = 0.0
+
+    def init_app(self, app: Flask) -> None:
+        """
+        Reads pool size, queue size and timeout from the app configuration.
+
+        Returns:
+            None
+        """
+        self.workers = app.config["IMAGE_PROCESSING_WORKERS"]
+        self.timeout = app.config["IMAGE_PROCESSING_TIMEOUT"]
+        self.metrics_interval = app.config["IMAGE_PROCESSING_METRICS_INTERVAL"]
+        self._last_metrics_log = time.monotonic()
+        self._slots = threading.BoundedSemaphore(
+            self.workers + app.config["IMAGE_PROCESSING_QUEUE_SIZE"])
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """
+        Returns the process pool of the current process.
+        The pool is created lazily so forked app workers do not share it.
+
+        Returns:
+            ProcessPoolExecutor
+        """
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _record_latency(self, started: float) -> None:
+        """
+        Updates the latency metrics with a finished task.
+
+        Returns:
+            None
+        """
+        latency = time.perf_counter() - started
+        with self._lock:
+            self._total_latency += latency
+            self._max_latency = max(self._max_latency, latency)
+        logging.debug("Image processed in %.1f ms", latency * 1000)
+        self._log_metrics_periodically()
+
+    def _release_slot(self, _future=None) -> None:
+        """
+        Frees a queue slot once a task has actually finished.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._queue_depth -= 1
+        if self._slots is not None:
+            self._slots.release()
+
+    def submit(self, fn, *args):
+        """
+        Runs fn(*args) in the process pool and waits for the result.
+
+        Parameters:
+            fn: callable
+                Picklable top level function to run.
+            args:
+                Picklable arguments passed to fn.
+
+        Returns:
+            The return value of fn.
+        """
+        if self._slots is not None and not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._rejected += 1
+            self._log_metrics_periodically()
+            raise ImageProcessingException(
+                "Too many images are currently processed. Please try again later.")
+
+        with self._lock:
+            self._queue_depth += 1
+            self._submitted += 1
+        started = time.perf_counter()
+
+        # -- In-process fallback --
+        if self.workers <= 0:
+            try:
+                return fn(*args)
+            finally:
+                self._release_slot()
+                self._record_latency(started)
+
+        try:
+            future = self._get_pool().submit(fn, *args)
+        except Exception:
+            # -- Pool is broken (e.g. a worker was killed), recreate it on next submit --
+            with self._lock:
+                self._pool = None
+            self._release_slot()
+            raise
+        future.add_done_callback(self._release_slot)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError as e:
+            future.cancel()
+            with self._lock:
+                self._timeouts += 1
+            raise ImageProcessingException(
+                "Processing the image took too long. Please try again later.") from e
+        finally:
+            self._record_latency(started)
+
+    def get_metrics(self) -> dict:
+        """
+        Returns the current queue depth and latency metrics of the executor.
+
+        Returns:
+            dict: containing queue depth, task counters and latencies in milliseconds
+        """
+        with self._lock:
+            return {
+                "queue_depth": self._queue_depth,
+                "submitted": self._submitted,
+                "rejected": self._rejected,
+                "timeouts": self._timeouts,
+                "avg_latency_ms": (self._total_latency / self._submitted * 1000)
+                if self._submitted else 0.0,
+                "max_latency_ms": self._max_latency * 1000
+            }
+
+
+    def _log_metrics_periodically(self) -> None:
+        """
+        Logs the metrics at most every IMAGE_PROCESSING_METRICS_INTERVAL seconds,
+        so a growing queue and rising latencies show up in the logs of the app.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if not self.metrics_interval \
+                    or time.monotonic() - self._last_metrics_log < self.metrics_interval:
+                return
+            self._last_metrics_log = time.monotonic()
+
+        logging.info("Image processing: %(queue_depth)s in queue, %(submitted)s submitted, "
+                     "%(rejected)s rejected, %(timeouts)s timed out, average latency "
+                     "%(avg_latency_ms).1f ms, max latency %(max_latency_ms).1f ms",
+                     self.get_metrics())
+
+
+image_executor = ImageExecutor()
@@ -0,0 +1,290 @@
+"""
+Module containing utility classes for running background jobs.
+Jobs are stored in the database and claimed by workers with SELECT ... FOR UPDATE SKIP LOCKED,
+so several workers can share the queue without an external message broker.
+Workers are started with "flask --app app.py run-worker" or as threads of the app
+(JOB_EMBEDDED_WORKERS).
+"""
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from flask import Flask
+from sqlalchemy import and_, or_
+
+from ..models import db, Job
+
+
+class JobException(Exception):
+    """
+    Custom Exception raised by job handlers for errors that retrying cannot fix.
+    """
+
+    def __init__(self, message: str, *args):
+        super().__init__(*args)
+        self.message = message
+
+    def get_message(self) -> str:
+        """
+        Returns error message.
+        """
+        return self.message
+
+
+def _utcnow() -> datetime:
+    """
+    Returns the current time as naive UTC timestamp, as stored in the job table.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class JobQueue:
+    """
+    Database backed job queue.
+    Handlers are registered per job kind and called with the payload of the job.
+    Failed jobs are retried with exponential backoff up to max_attempts times. A claimed job
+    is invisible to other workers for JOB_VISIBILITY_TIMEOUT seconds, afterwards it is
+    considered abandoned (e.g. the worker crashed) and claimed again.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._handlers = {}
+        self._workers = []
+        self._workers_pid = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def init_app(self, app: Flask) -> None:
+        """
+        Keeps a reference to the app for worker threads and starts embedded workers.
+
+        Returns:
+            None
+        """
+        self.app = app
+        if app.config["JOB_EMBEDDED_WORKERS"] > 0:
+            self._ensure_workers()
+
+    def register(self, kind: str, handler) -> None:
+        """
+        Registers the handler of a job kind.
+
+        Parameters:
+            kind: str
+                Name of the job kind.
+            handler: callable
+                Called with the payload dict inside an app context,
+                may return a JSON serializable result.
+
+        Returns:
+            None
+        """
+        self._handlers[kind] = handler
+
+    def enqueue(self,
+                kind: str,
+                payload: dict,
+                priority: int = 0,
+                delay: int = 0,
+                commit: bool = True) -> Job:
+        """
+        Adds a job to the queue.
+
+        Parameters:
+            kind: str
+                Name of a registered job kind.
+            payload: dict
+                JSON serializable arguments of the job.
+            priority: int
+                Jobs with higher priority are run first.
+            delay: int
+                Seconds before the job may run.
+            commit: bool
+                Whether the session is committed. Pass False to enqueue the job
+                in the same transaction as other changes.
+
+        Returns:
+            Job: the queued job
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind {kind}")
+
+        job = Job(kind=kind,
+                  payload=payload,
+                  priority=priority,
+                  status="queued",
+                  attempts=0,
+                  max_attempts=self.app.config["JOB_MAX_ATTEMPTS"],
+                  run_at=_utcnow() + timedelta(seconds=delay))
+        db.session.add(job)
+        if commit:
+            db.session.commit()
+
+        if self.app.config["JOB_EMBEDDED_WORKERS"] > 0:
+            self._ensure_workers()
+
+        return job
+
+    def get_job(self, job_id: int) -> dict:
+        """
+        Returns the state of a job.
+
+        Parameters:
+            job_id: int
+
+        Returns:
+            dict: containing the job details including its payload
+            None: if no job with this id exists
+        """
+        job = db.session.get(Job, job_id)
+        if job is None:
+            return None
+
+        return {**job.to_json(), "payload": job.payload}
+
+    def claim(self) -> Job:
+        """
+        Claims the next due job. Jobs locked by other workers are skipped.
+
+        Returns:
+            Job: the claimed job, now running
+            None: if no job is due
+        """
+        while True:
+            now = _utcnow()
+            job = Job.query.filter(
+                or_(and_(Job.status == "queued", Job.run_at <= now),
+                    and_(Job.status == "running", Job.locked_until < now))
+            ).order_by(Job.priority.desc(), Job.run_at.asc(), Job.id.asc()) \
+                .with_for_update(skip_locked=True).first()
+
+            if job is None:
+                db.session.commit()
+                return None
+
+            # -- Abandoned job already used all attempts --
+            if job.status == "running" and job.attempts >= job.max_attempts:
+                job.status = "failed"
+                job.last_error = "Job did not finish within the visibility timeout."
+                job.locked_until = None
+                db.session.commit()
+                continue
+
+            job.status = "running"
+            job.attempts += 1
+            job.locked_until = now + timedelta(seconds=self.app.config["JOB_VISIBILITY_TIMEOUT"])
+            db.session.commit()
+
+            return job
+
+    def _finish(self, job: Job, attempt: int, **values) -> None:
+        """
+        Updates a job unless another worker claimed it again in the meantime.
+
+        Returns:
+            None
+        """
+        db.session.rollback()
+        updated = Job.query.filter_by(id=job.id, attempts=attempt, status="running") \
+            .update(values, synchronize_session=False)
+        db.session.commit()
+        if not updated:
+            logging.warning("Job %s was claimed by another worker before it finished", job.id)
+
+    def run_job(self, job: Job) -> bool:
+        """
+        Runs a claimed job and records its result. Failed jobs are scheduled for a retry.
+
+        Parameters:
+            job: Job
+                A job returned by claim.
+
+        Returns:
+            bool: whether the job succeeded
+        """
+        job_id, kind, payload = job.id, job.kind, dict(job.payload)
+        attempt, max_attempts = job.attempts, job.max_attempts
+        started = time.perf_counter()
+        try:
+            result = self._handlers[kind](payload)
+        except Exception as e:
+            retry = not isinstance(e, JobException) and attempt < max_attempts
+            error = e.get_message() if isinstance(e, JobException) else repr(e)
+            logging.warning("Job %s (%s) failed in attempt %s%s", job_id, kind, attempt,
+                            ", retrying" if retry else "", exc_info=not isinstance(e, JobException))
+
+            if retry:
+                backoff = min(self.app.config["JOB_RETRY_BACKOFF"] * 2 ** (attempt - 1),
+                              self.app.config["JOB_RETRY_MAX_BACKOFF"])
+                self._finish(job, attempt, status="queued", last_error=error, locked_until=None,
+                             run_at=_utcnow() + timedelta(seconds=backoff))
+            else:
+                self._finish(job, attempt, status="failed", last_error=error, locked_until=None)
+            return False
+
+        self._finish(job, attempt, status="done", result=result, locked_until=None)
+        logging.info("Job %s (%s) done in %.1f ms", job_id, kind,
+                     (time.perf_counter() - started) * 1000)
+        return True
+
+    def run_once(self) -> bool:
+        """
+        Claims and runs the next due job.
+
+        Returns:
+            bool: whether a job was run
+        """
+        job = self.claim()
+        if job is None:
+            return False
+
+        self.run_job(job)
+        return True
+
+    def run_worker(self, stop_event: threading.Event = None) -> None:
+        """
+        Runs jobs until stop_event is set, polling every JOB_POLL_INTERVAL seconds when idle.
+        Every job runs in its own app context.
+
+        Parameters:
+            stop_event: threading.Event
+                Stops the worker after the current job.
+
+        Returns:
+            None
+        """
+        stop_event = stop_event or self._stop
+        while not stop_event.is_set():
+            try:
+                with self.app.app_context():
+                    ran_job = self.run_once()
+            except Exception:
+                logging.error("Job worker failed", exc_info=True)
+                ran_job = False
+
+            if not ran_job:
+                stop_event.wait(self.app.config["JOB_POLL_INTERVAL"])
+
+    def _ensure_workers(self) -> None:
+        """
+        Starts the embedded worker threads of the current process if they are not running.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if self._workers_pid == os.getpid() \
+                    and all(worker.is_alive() for worker in self._workers):
+                return
+            self._workers_pid = os.getpid()
+            self._workers = [worker for worker in self._workers if worker.is_alive()]
+            for index in range(len(self._workers), self.app.config["JOB_EMBEDDED_WORKERS"]):
+                worker = threading.Thread(target=self.run_worker,
+                                          name=f"job-worker-{index}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+
+job_queue = JobQueue()
@@ -4,14 +4,64 @@ Module containing utility classes for memory management.
 import os
 import io
 import enum
-import random
+import shutil
+import hashlib
+import secrets
+import tempfile
+import time
 from abc import ABC
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from PIL import Image, ImageOps
-from azure.storage.blob import BlobServiceClient
-from flask import current_app, session
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.orm import selectinload
+
+from ..models import db, Memory, MemoryImage
+from .cache_util import image_cache
+from .image_util import image_executor, process_image, validate_image_header, \
+    ImageProcessingException
+from .job_util import job_queue, JobException
+from .session_util import get_session_expiry
+from .slideshow_util import get_shuffled_position, slideshow_store, slideshow_memories
+from .stats_util import PeriodStatistics
+from .storage_util import image_storage
+
+
+def select_image(memory_data: dict, rendition_name: str, accept_mimetypes=None) -> tuple:
+    """
+    Selects the stored image to serve for a memory.
+    Out of the formats stored for the requested rendition the smallest one the client accepts
+    is chosen. WebP and AVIF are only served if explicitly listed in the Accept header,
+    JPEG is always acceptable.
+
+    Parameters:
+        memory_data: dict
+            Memory information as returned by MemoryManagement.get_memory_data
+        rendition_name: str
+            Name of the requested rendition. The largest rendition is used if unknown.
+        accept_mimetypes: MIMEAccept (optional)
+            Parsed Accept header of the client, only JPEG is acceptable if not given.
+
+    Returns:
+        tuple: image_uri and mimetype of the selected image
+    """
+    renditions = memory_data["images"]
+    rendition = renditions.get(rendition_name)
+    if rendition is None and renditions:
+        rendition = max(renditions.values(), key=lambda item: item["width"])
+
+    # -- Memories uploaded before renditions were introduced only have a JPEG --
+    if rendition is None:
+        return memory_data["image_uri"], "image/jpeg"
+
+    accepted_mimetypes = {mimetype for mimetype, quality in accept_mimetypes or []
+                          if quality > 0}
+    candidates = [image for mimetype, image in rendition["formats"].items()
+                  if mimetype == "image/jpeg" or mimetype in accepted_mimetypes]
+    image = min(candidates or rendition["formats"].values(),
+                key=lambda image: image["size_bytes"] or float("inf"))
 
-from ..models import db, Memory
+    return image["image_uri"], image["mimetype"]
 
 
 class SlideshowModes(enum.Enum):
@@ -33,7 +83,8 @@ class MemoryManagement(ABC):
                       vault_id: int,
                       latitude: str = None,
                       longitude: str = None,
-                      image_file: str = None) -> None:
+                      image_file: str = None,
+                      user_id: int = None) -> None:
         """
         Creates memory in a specified vault and contaings description,
         date, and optional coordinates and image.
@@ -51,74 +102,427 @@ class MemoryManagement(ABC):
                 Longitude of the coordinate
             image_file: str (optional)
                 Bytes of the image.
+            user_id: int (optional)
+                Id of the uploading user
 
         Returns:
             None
         """
         memory_date = datetime.strptime(date, '%Y-%m-%d').date()
 
-        image_uri = None
-        if image_file:
-            image_uri = MemoryManagement.save_image(image_file)
+        stored_images = MemoryManagement.save_image(image_file) if image_file else []
+
+        new_memory = MemoryManagement._create_memory(description=description,
+                                                     memory_date=memory_date,
+                                                     vault_id=vault_id,
+                                                     latitude=latitude,
+                                                     longitude=longitude,
+                                                     stored_images=stored_images,
+                                                     user_id=user_id)
+        db.session.add(new_memory)
+        PeriodStatistics.add_memories([new_memory])
+        db.session.commit()
+
+    @staticmethod
+    def upload_memory_async(description: str,
+                            date: str,
+                            vault_id: int,
+                            user_id: int,
+                            image_file,
+                            latitude: str = None,
+                            longitude: str = None) -> int:
+        """
+        Creates memory right away and processes its image in a background job.
+        The image is attached to the memory once the job is done.
+
+        Parameters:
+            description: str
+                Description of the uploaded memory.
+            date: str
+                Date of the memory in %Y-%m-%d format.
+            vault_id: int
+                Id of the vault the memory will be uploaded to
+            user_id: int
+                Id of the uploading user, allowed to view the job status
+            image_file:
+                File-like object of the uploaded image.
+            latitude: str (optional)
+                Latitude of the coordinate
+            longitude: str (optional)
+                Longitude of the coordinate
+
+        Returns:
+            int: id of the job processing the image
+        """
+        memory_date = datetime.strptime(date, '%Y-%m-%d').date()
+
+        # -- Staged image has to outlive the request until a worker picks it up --
+        os.makedirs(current_app.config["JOB_STAGING_FOLDER"], exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=current_app.config["JOB_STAGING_FOLDER"],
+                                         suffix=".upload", delete=False) as staging_file:
+            shutil.copyfileobj(image_file, staging_file)
+
+        try:
+            new_memory = MemoryManagement._create_memory(description=description,
+                                                         memory_date=memory_date,
+                                                         vault_id=vault_id,
+                                                         latitude=latitude,
+                                                         longitude=longitude,
+                                                         stored_images=[],
+                                                         user_id=user_id)
+            db.session.add(new_memory)
+            PeriodStatistics.add_memories([new_memory])
+            db.session.flush()
+            job = job_queue.enqueue("process_upload",
+                                    {"memory_id": new_memory.id,
+                                     "user_id": user_id,
+                                     "path": staging_file.name},
+                                    priority=10,
+                                    commit=False)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            os.remove(staging_file.name)
+            raise
+
+        return job.id
+
+    @staticmethod
+    def process_uploaded_image(payload: dict) -> dict:
+        """
+        Job handler storing the staged image of a memory created by upload_memory_async.
+
+        Parameters:
+            payload: dict
+                containing "memory_id" and "path" of the staged image
+
+        Returns:
+            dict: containing the memory id and the image_uri of the memory
+        """
+        memory = db.session.get(Memory, payload["memory_id"])
+        if memory is None or not os.path.exists(payload["path"]):
+            raise JobException("Memory or uploaded image does not exist anymore.")
+
+        # -- Invalid images fail right away instead of being retried --
+        try:
+            validate_image_header(payload["path"],
+                                  allowed_formats=current_app.config["IMAGE_ALLOWED_FORMATS"],
+                                  max_pixels=current_app.config["IMAGE_MAX_PIXELS"])
+        except ImageProcessingException as e:
+            os.remove(payload["path"])
+            raise JobException(e.get_message()) from e
+
+        with open(payload["path"], "rb") as image_file:
+            stored_images = MemoryManagement.save_image(image_file)
+        old_images = list(memory.images)
+        MemoryManagement._attach_images(memory, stored_images)
+        PeriodStatistics.update_images(memory, old_images)
+        db.session.commit()
+        os.remove(payload["path"])
+
+        return {"memory_id": memory.id, "image_uri": memory.image_uri}
+
+    @staticmethod
+    def generate_derivatives(payload: dict) -> dict:
+        """
+        Job handler recreating all renditions and formats of a memory image from its
+        largest stored image, e.g. after IMAGE_RENDITIONS or IMAGE_ENCODERS changed.
+
+        Parameters:
+            payload: dict
+                containing "memory_id"
+
+        Returns:
+            dict: containing the memory id and the number of stored images
+        """
+        memory = db.session.get(Memory, payload["memory_id"])
+        if memory is None or not memory.image_uri:
+            raise JobException("Memory has no image.")
+
+        image_bytes = MemoryManagement.get_image_bytes(memory.image_uri)
+        stored_images = MemoryManagement.save_image(io.BytesIO(image_bytes))
+        old_images = list(memory.images)
+        for image in old_images:
+            db.session.delete(image)
+        MemoryManagement._attach_images(memory, stored_images)
+        PeriodStatistics.update_images(memory, old_images)
+        db.session.commit()
+
+        return {"memory_id": memory.id, "images": len(stored_images)}
+
+    @staticmethod
+    def upload_memories(memories: list, vault_id: int, user_id: int = None) -> list:
+        """
+        Creates several memories in a vault within a single transaction.
+        Images are processed in parallel. Memories whose image cannot be processed
+        are not created and reported as failed.
+
+        Parameters:
+            memories: list
+                dicts with keys "description", "date" (date), "latitude", "longitude"
+                and optional "image_file"
+            vault_id: int
+                Id of the vault the memories will be uploaded to
+            user_id: int (optional)
+                Id of the uploading user
+
+        Returns:
+            list: one dict per memory with key "status" ("created" or "failed")
+                  and "memory_id" or "error"
+        """
+        app = current_app._get_current_object()
+
+        def _save_image(image_file):
+            with app.app_context():
+                return MemoryManagement.save_image(image_file)
+
+        results = [None] * len(memories)
+        stored_images = {}
+        with ThreadPoolExecutor(
+                max_workers=max(1, current_app.config["IMAGE_PROCESSING_WORKERS"])) as pool:
+            futures = {index: pool.submit(_save_image, memory["image_file"])
+                       for index, memory in enumerate(memories) if memory.get("image_file")}
+            for index, future in futures.items():
+                try:
+                    stored_images[index] = future.result()
+                except ImageProcessingException as e:
+                    results[index] = {"status": "failed", "error": e.get_message()}
+
+        new_memories = {}
+        for index, memory in enumerate(memories):
+            if results[index] is not None:
+                continue
+            new_memories[index] = MemoryManagement._create_memory(
+                description=memory["description"],
+                memory_date=memory["date"],
+                vault_id=vault_id,
+                latitude=memory.get("latitude"),
+                longitude=memory.get("longitude"),
+                stored_images=stored_images.get(index, []),
+                user_id=user_id)
+
+        db.session.add_all(list(new_memories.values()))
+        PeriodStatistics.add_memories(list(new_memories.values()))
+        db.session.commit()
+
+        for index, new_memory in new_memories.items():
+            results[index] = {"status": "created", "memory_id": new_memory.id}
+
+        return results
+
+    @staticmethod
+    def _create_memory(description: str,
+                       memory_date: datetime.date,
+                       vault_id: int,
+                       latitude: str,
+                       longitude: str,
+                       stored_images: list,
+                       user_id: int = None) -> Memory:
+        """
+        Builds a memory row together with the rows of its stored images.
+
+        Parameters:
+            stored_images: list
+                Stored images as returned by save_image
+            user_id: int (optional)
+                Id of the uploading user
 
+        Returns:
+            Memory: the memory, not yet added to the session
+        """
         new_memory = Memory(description=description,
                             date=memory_date,
                             latitude=latitude,
                             longitude=longitude,
-                            image_uri=image_uri,
-                            vault_id=vault_id)
-        db.session.add(new_memory)
-        db.session.commit()
+                            vault_id=vault_id,
+                            user_id=user_id)
+        MemoryManagement._attach_images(new_memory, stored_images)
+
+        return new_memory
 
     @staticmethod
-    def save_image(image_file: str) -> str:
+    def _attach_images(memory: Memory, stored_images: list) -> None:
         """
-        Saves uploaded image to local folder or S3 storage.
+        Sets the stored images of a memory.
+
+        Parameters:
+            memory: Memory
+            stored_images: list
+                Stored images as returned by save_image
+
+        Returns:
+            None
+        """
+        memory.images = [MemoryImage(**stored_image) for stored_image in stored_images]
+        memory.image_uri = None
+        if stored_images:
+            # -- Largest rendition is referenced directly by the memory, preferably as JPEG --
+            memory.image_uri = max(
+                stored_images,
+                key=lambda stored_image: (stored_image["width"],
+                                          stored_image["mimetype"] == "image/jpeg")
+            )["image_uri"]
+
+    @staticmethod
+    def save_image(image_file: str) -> list:
+        """
+        Saves uploaded image in all configured renditions and formats to the storage backend.
+        Renditions that would not be smaller than the next larger one are skipped.
 
         Parameters:
             image_file: str (optional)
                 Bytes of the image.
 
+        Returns:
+            list: containing dicts with keys "rendition", "mimetype", "width", "height",
+                  "size_bytes" and "image_uri" for every stored image
+        """
+        # -- Stream upload to a staging file, so it is never held in memory as a whole --
+        with tempfile.NamedTemporaryFile(dir=current_app.config["IMAGE_STAGING_FOLDER"],
+                                         suffix=".upload", delete=False) as staging_file:
+            shutil.copyfileobj(image_file, staging_file)
+
+        try:
+            validate_image_header(staging_file.name,
+                                  allowed_formats=current_app.config["IMAGE_ALLOWED_FORMATS"],
+                                  max_pixels=current_app.config["IMAGE_MAX_PIXELS"])
+
+            # -- Decode, resize and encode in the image processing pool --
+            sorted_renditions = sorted(current_app.config["IMAGE_RENDITIONS"].items(),
+                                       key=lambda item: item[1][0] * item[1][1],
+                                       reverse=True)
+            processed_images = image_executor.submit(process_image,
+                                                     staging_file.name,
+                                                     sorted_renditions,
+                                                     current_app.config["IMAGE_ENCODERS"])
+        finally:
+            os.remove(staging_file.name)
+
+        stored_images = []
+        for processed_image in processed_images:
+            image_data = processed_image.pop("data")
+            stored_images.append({
+                **processed_image,
+                "size_bytes": len(image_data),
+                "image_uri": MemoryManagement._store_image(image_data,
+                                                           processed_image["mimetype"])
+            })
+
+        return stored_images
+
+    @staticmethod
+    def get_image_key(image_data: bytes, mimetype: str = "image/jpeg") -> str:
+        """
+        Returns the content-addressed storage key of an encoded image.
+        Keys are sharded into two directory levels (ab/cd/abcd...jpg) to keep folders small.
+
+        Parameters:
+            image_data: bytes
+                The encoded image.
+            mimetype: str
+                Mimetype of the encoded image, determines the file extension.
+
+        Returns:
+            str: storage key of the image
+        """
+        image_hash = hashlib.sha256(image_data).hexdigest()
+        extension = current_app.config["IMAGE_EXTENSIONS"][mimetype]
+
+        return f"{image_hash[0:2]}/{image_hash[2:4]}/{image_hash}.{extension}"
+
+    @staticmethod
+    def get_image_hash(image_uri: str) -> str:
+        """
+        Returns the content hash of a content-addressed image.
+
+        Parameters:
+            image_uri: str
+                Storage key of the image.
+
+        Returns:
+            str: sha256 hex digest of the image
+            None: if the image was stored before content addressing was introduced
+        """
+        image_hash = os.path.splitext(image_uri.split("/")[-1])[0]
+        if "/" not in image_uri or len(image_hash) != 64:
+            return None
+
+        return image_hash
+
+    @staticmethod
+    def _store_image(image_data: bytes, mimetype: str = "image/jpeg") -> str:
+        """
+        Writes encoded image to the storage backend under its content-addressed key.
+        Images that are already stored are not written again.
+
+        Parameters:
+            image_data: bytes
+                The encoded image.
+            mimetype: str
+                Mimetype of the encoded image.
+
         Returns:
             str: uri of the saved image
         """
-        # Generate filename
-        filename = f'{session["user_id"]}_{datetime.strftime(
-            datetime.now(), "%Y_%m_%d-%H_%M_%S")}.jpg'
-
-        # Resize image for saving storage space
-        image = Image.open(image_file)
-        image = ImageOps.exif_transpose(image)
-        max_size = current_app.config["IMAGE_MAX_SIZE"]
-        image.thumbnail(max_size)
-        image_buffer = io.BytesIO()
-        image.save(image_buffer, format="JPEG")
-        image_buffer.seek(0)
-
-        if current_app.config["USE_BLOB_STORAGE"]:
-            blob_service = BlobServiceClient.from_connection_string(
-                current_app.config["AZURE_STORAGE_CONNECTION_STRING"]
-            )
-
-            blob_client = blob_service.get_blob_client(
-                container=current_app.config["UPLOAD_FOLDER"],
-                blob=filename
-            )
-
-            blob_client.upload_blob(image_buffer, overwrite=True)
-        else:
-            save_path = os.path.join(
-                current_app.config["UPLOAD_FOLDER"], filename)
+        image_uri = MemoryManagement.get_image_key(image_data, mimetype)
+        image_storage.get_backend().write(image_uri, image_data, mimetype)
+
+        return image_uri
+
+    @staticmethod
+    def _delete_image(image_uri: str) -> None:
+        """
+        Removes an image from the storage backend.
+
+        Parameters:
+            image_uri: str
+                Storage key of the image.
+
+        Returns:
+            None
+        """
+        image_storage.get_backend().delete(image_uri)
 
-            with open(save_path, "wb") as fp:
-                fp.write(image_buffer.getvalue())
+    @staticmethod
+    def migrate_image_storage(delete_old: bool = False) -> int:
+        """
+        Moves all images stored under their legacy filename to content-addressed keys
+        and rewrites the image_uri of memories and memory images accordingly.
+
+        Parameters:
+            delete_old: bool
+                Whether the images under the legacy filename are removed afterwards.
+
+        Returns:
+            int: number of migrated images
+        """
+        migrated_uris = {}
+        rows = Memory.query.filter(Memory.image_uri.isnot(None)).all() + \
+            MemoryImage.query.all()
 
-        return filename
+        for row in rows:
+            if MemoryManagement.get_image_hash(row.image_uri):
+                continue
+
+            if row.image_uri not in migrated_uris:
+                image_data = MemoryManagement.get_image_bytes(row.image_uri)
+                migrated_uris[row.image_uri] = MemoryManagement._store_image(
+                    image_data)
+            row.image_uri = migrated_uris[row.image_uri]
+
+        db.session.commit()
+
+        if delete_old:
+            for legacy_uri in migrated_uris:
+                MemoryManagement._delete_image(legacy_uri)
+
+        return len(migrated_uris)
 
     @staticmethod
     def get_image_bytes(filename: str) -> str:
         """
-        Loads image from file storage.
+        Loads image from the image cache or file storage.
+        Raises FileNotFoundError if the image does not exist.
 
         Parameters:
             filename: str
@@ -127,29 +531,80 @@ class MemoryManagement(ABC):
         Returns:
             str: byte representation of image
         """
-        if current_app.config["USE_BLOB_STORAGE"]:
-            blob_service = BlobServiceClient.from_connection_string(
-                current_app.config["AZURE_STORAGE_CONNECTION_STRING"]
-            )
+        img_bytes = image_cache.get(filename)
+        if img_bytes is not None:
+            return img_bytes
 
-            blob_client = blob_service.get_blob_client(
-                container=current_app.config["UPLOAD_FOLDER"],
-                blob=filename
-            )
+        if image_cache.is_missing(filename):
+            raise FileNotFoundError(filename)
 
-            downloader = blob_client.download_blob()
-            img_bytes = downloader.readall()
-            return img_bytes
-        else:
-            image_path = os.path.join(
-                current_app.config["UPLOAD_FOLDER"],
-                filename
-            )
+        try:
+            img_bytes = MemoryManagement._load_image_bytes(filename)
+        except FileNotFoundError:
+            image_cache.put_missing(filename)
+            raise
 
-            with open(image_path, "rb") as img_file:
-                img_bytes = img_file.read()
+        image_cache.put(filename, img_bytes)
+        return img_bytes
 
-            return img_bytes
+    @staticmethod
+    def _load_image_bytes(filename: str) -> bytes:
+        """
+        Loads image from file storage.
+
+        Parameters:
+            filename: str
+                Filename of the image.
+
+        Returns:
+            bytes: byte representation of image
+        """
+        return image_storage.get_backend().read(filename)
+
+    @staticmethod
+    def get_image_path(filename: str) -> str:
+        """
+        Returns the local path of an image if the storage backend keeps it on disk,
+        so it can be sent without loading its bytes into Python.
+
+        Parameters:
+            filename: str
+                Filename of the image.
+
+        Returns:
+            str: path of the image
+            None: if the image is not available as local file
+        """
+        return image_storage.get_backend().get_local_path(filename)
+
+    @staticmethod
+    def get_image_url(filename: str, mimetype: str = "image/jpeg") -> str:
+        """
+        Returns a signed URL clients can fetch the image from directly,
+        valid for IMAGE_SIGNED_URL_TTL but at most until the current session expires.
+
+        Parameters:
+            filename: str
+                Filename of the image.
+            mimetype: str
+                Mimetype of the image.
+
+        Returns:
+            str: signed URL of the image
+            None: if signed URLs are disabled or not supported by the storage backend
+        """
+        if not current_app.config["IMAGE_SIGNED_URLS"]:
+            return None
+
+        expires_in = current_app.config["IMAGE_SIGNED_URL_TTL"]
+        # -- Only sessions ending before the URL pass their expiry, so URLs of all other
+        #    sessions are shared --
+        session_expiry = get_session_expiry()
+        if session_expiry is not None and session_expiry < time.time() + expires_in:
+            return image_storage.get_backend().get_signed_url(filename, mimetype, expires_in,
+                                                              session_expiry)
+
+        return image_storage.get_backend().get_signed_url(filename, mimetype, expires_in)
 
     @staticmethod
     def get_memory_data(memory_id: int) -> dict:
@@ -161,37 +616,209 @@ class MemoryManagement(ABC):
 
         Returns:
             dict: containing the information of the memory
+            None: if no memory with this id exists
         """
         memory = Memory.query.filter_by(id=memory_id).first()
 
+        if memory is None:
+            return None
+
         return memory.to_json()
 
+    @staticmethod
+    def get_memories_data(memory_ids: list) -> dict:
+        """
+        Requests the information of several memories from database at once.
+        Memories and their images are loaded with one query each.
+
+        Parameters:
+            memory_ids: list
+
+        Returns:
+            dict: mapping memory id to the information of the memory,
+                  memories that do not exist are left out
+        """
+        if not memory_ids:
+            return {}
+
+        memories = Memory.query.options(selectinload(Memory.images)) \
+            .filter(Memory.id.in_(memory_ids)).all()
+
+        return {memory.id: memory.to_json() for memory in memories}
+
     @staticmethod
     def get_slideshow_order(vault_id: int,
                             order: SlideshowModes,
                             period_start: datetime.date,
-                            period_end: datetime.date) -> list:
+                            period_end: datetime.date,
+                            seed: int = None) -> list:
         """
         Lists all memories of a vault in a specified timespan
 
         Parameters:
-            memory_id: int
+            vault_id: int
+            order: SlideshowModes
+            period_start: datetime.date
+            period_end: datetime.date
+            seed: int
+                Seed of the random order, the same seed results in the same order.
+                A new seed is picked if None.
 
         Returns:
-            list: containing the information of the memory
+            list: containing the ids of the memories in slideshow order
         """
         query = Memory.query.filter_by(vault_id=vault_id)
         query = query.filter(Memory.date.between(period_start, period_end))
 
-        memories = query.order_by(Memory.date.asc()).all()
+        memories = query.order_by(Memory.date.asc(), Memory.id.asc()).all()
         memories_ids = [memory.id for memory in memories]
 
         if order == SlideshowModes.CHRONOLOGICAL:
             return memories_ids
         elif order == SlideshowModes.RANDOM:
-            random.shuffle(memories_ids)
-            return memories_ids
+            seed = seed if seed is not None else secrets.randbits(63)
+            return [memories_ids[get_shuffled_position(index, len(memories_ids), seed)]
+                    for index in range(len(memories_ids))]
         elif order == SlideshowModes.REVERSE_CHRONOLOGICAL:
             return memories_ids[::-1]
         else:
             return memories_ids
+
+    @staticmethod
+    def create_slideshow(user_id: int,
+                         vault_id: int,
+                         order: SlideshowModes,
+                         period_start: datetime.date,
+                         period_end: datetime.date) -> str:
+        """
+        Starts a slideshow of all memories of a vault in a specified timespan.
+        Random slideshows only store their seed, period and the highest memory id when started,
+        every slide is computed on demand from the memories up to this id.
+
+        Parameters:
+            user_id: int
+                Id of the user viewing the slideshow.
+            vault_id: int
+            order: SlideshowModes
+            period_start: datetime.date
+            period_end: datetime.date
+
+        Returns:
+            str: id of the slideshow
+            None: if there are no memories in the timespan
+        """
+        if order == SlideshowModes.RANDOM:
+            memories = Memory.query.filter_by(vault_id=vault_id) \
+                .filter(Memory.date.between(period_start, period_end))
+            # -- Memories uploaded later get higher ids and do not shift the positions --
+            max_memory_id = memories.with_entities(func.max(Memory.id)).scalar()
+            if max_memory_id is None:
+                return None
+            number_memories = memories.filter(Memory.id <= max_memory_id).count()
+            return slideshow_store.create(user_id,
+                                          number_memories=number_memories,
+                                          max_memory_id=max_memory_id,
+                                          seed=secrets.randbits(63),
+                                          vault_id=vault_id,
+                                          period_start=period_start.isoformat(),
+                                          period_end=period_end.isoformat())
+
+        memory_order = MemoryManagement.get_slideshow_order(vault_id=vault_id,
+                                                            order=order,
+                                                            period_start=period_start,
+                                                            period_end=period_end)
+        if len(memory_order) <= 0:
+            return None
+        return slideshow_store.create(user_id, memory_order)
+
+    @staticmethod
+    def get_slideshow_memory_ids(slideshow: dict, start: int, stop: int) -> dict:
+        """
+        Returns the ids of the memories shown at positions start to stop (exclusive).
+
+        Parameters:
+            slideshow: dict
+                Slideshow as returned by slideshow_store.get
+            start: int
+                0-based position of the first slide.
+            stop: int
+                Position after the last slide, clipped to the number of slides.
+
+        Returns:
+            dict: mapping position to memory id in slideshow order,
+                  memories deleted in the meantime are left out
+        """
+        if "seed" not in slideshow:
+            memory_ids = slideshow_store.get_memory_ids(slideshow["slideshow_id"], start, stop)
+            return dict(enumerate(memory_ids, start=max(start, 0)))
+
+        number_memories = slideshow["number_memories"]
+        positions = {index: get_shuffled_position(index, number_memories, slideshow["seed"])
+                     for index in range(max(start, 0), min(stop, number_memories))}
+        if not positions:
+            return {}
+
+        # -- Look up the memories at the chronological positions in one query --
+        row_number = func.row_number().over(
+            order_by=(Memory.date.asc(), Memory.id.asc())).label("row_number")
+        ordered = db.session.query(Memory.id.label("memory_id"), row_number) \
+            .filter(Memory.vault_id == slideshow["vault_id"],
+                    Memory.id <= slideshow["max_memory_id"]) \
+            .filter(Memory.date.between(datetime.fromisoformat(slideshow["period_start"]).date(),
+                                        datetime.fromisoformat(slideshow["period_end"]).date())) \
+            .subquery()
+        row_numbers = [position + 1 for position in positions.values()]
+        memory_ids = dict(db.session.query(ordered.c.row_number, ordered.c.memory_id)
+                          .filter(ordered.c.row_number.in_(row_numbers)).all())
+
+        return {index: memory_ids[position + 1] for index, position in positions.items()
+                if position + 1 in memory_ids}
+
+    @staticmethod
+    def get_slideshow_memories(slideshow: dict, start: int, stop: int) -> dict:
+        """
+        Returns the memories shown at positions start to stop (exclusive).
+        Memories are loaded in batches of SLIDESHOW_WINDOW_SIZE slides and cached
+        for the slideshow, so navigating only queries the database for new batches.
+
+        Parameters:
+            slideshow: dict
+                Slideshow as returned by slideshow_store.get
+            start: int
+                0-based position of the first slide.
+            stop: int
+                Position after the last slide, clipped to the number of slides.
+
+        Returns:
+            dict: mapping 0-based position to memory information in slideshow order,
+                  memories deleted in the meantime are left out
+        """
+        start = max(start, 0)
+        stop = min(stop, slideshow["number_memories"])
+        if stop <= start:
+            return {}
+
+        slideshow_id = slideshow["slideshow_id"]
+        memories = slideshow_memories.get(slideshow_id, start, stop)
+        if memories is not None:
+            return memories
+
+        # -- Load whole batches, the following slides are likely to be shown next --
+        batch_size = current_app.config["SLIDESHOW_WINDOW_SIZE"]
+        batch_start = start // batch_size * batch_size
+        while slideshow_memories.get(slideshow_id, batch_start,
+                                     batch_start + batch_size) is not None:
+            batch_start += batch_size
+        batch_stop = min(-(-stop // batch_size) * batch_size, slideshow["number_memories"])
+        memory_ids = MemoryManagement.get_slideshow_memory_ids(slideshow, batch_start, batch_stop)
+        memories_data = MemoryManagement.get_memories_data(list(memory_ids.values()))
+        # -- Memories deleted in the meantime are cached as None, so their batch is complete --
+        slideshow_memories.put(slideshow_id, {
+            position: memories_data.get(memory_ids.get(position))
+            for position in range(batch_start, batch_stop)})
+
+        return slideshow_memories.get(slideshow_id, start, stop, complete=False)
+
+
+job_queue.register("process_upload", MemoryManagement.process_uploaded_image)
+job_queue.register("generate_derivatives", MemoryManagement.generate_derivatives)
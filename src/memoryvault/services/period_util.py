@@ -0,0 +1,133 @@
+"""
+Module containing utility classes for calculating collection periods.
+Periods are computed arithmetically from the initial start and the duration of a vault,
+so the cost of finding the current period does not grow with the age of the vault.
+"""
+import calendar
+from datetime import date, timedelta
+from functools import lru_cache
+
+PERIOD_DATE_FORMAT = "%A, %b %d, %Y"
+
+
+def _add_months(day: date, months: int) -> date:
+    """
+    Adds months to a date, clipping the day to the length of the resulting month
+    like dateutil's relativedelta.
+
+    Returns:
+        date
+    """
+    year, month = divmod(day.month - 1 + months, 12)
+    year += day.year
+    month += 1
+    return day.replace(year=year, month=month,
+                       day=min(day.day, calendar.monthrange(year, month)[1]))
+
+
+class PeriodCalendar:
+    """
+    Collection periods of a vault. Period n starts n * duration months after the initial start
+    and ends on the last day of the month before the following period starts.
+    """
+
+    def __init__(self, initial_start: date, duration_months: int):
+        if duration_months <= 0:
+            raise ValueError("Duration of a collection period has to be positive")
+        self.initial_start = initial_start
+        self.duration_months = duration_months
+
+    def get_start(self, index: int) -> date:
+        """
+        Returns the first day of a period.
+
+        Parameters:
+            index: int
+                0-based index of the period.
+
+        Returns:
+            date
+        """
+        return _add_months(self.initial_start, index * self.duration_months)
+
+    def get_period(self, index: int) -> tuple:
+        """
+        Returns the first and last day of a period.
+
+        Parameters:
+            index: int
+                0-based index of the period.
+
+        Returns:
+            tuple: start and end date of the period
+        """
+        end = self.get_start(index + 1) - timedelta(days=1)
+        return self.get_start(index), end.replace(day=calendar.monthrange(end.year, end.month)[1])
+
+    def get_index(self, day: date) -> int:
+        """
+        Returns the index of the period containing a day.
+
+        Parameters:
+            day: date
+
+        Returns:
+            int: 0-based index of the period, negative if the day is before the first period
+        """
+        months = (day.year - self.initial_start.year) * 12 + day.month - self.initial_start.month
+        index = months // self.duration_months
+        # -- Period starting later in the same month has not begun yet --
+        if self.get_start(index) > day:
+            index -= 1
+        return index
+
+    def get_current_period(self, today: date) -> tuple:
+        """
+        Returns the first and last day of the ongoing period.
+        Before the first period has started, the first period is returned.
+
+        Parameters:
+            today: date
+
+        Returns:
+            tuple: start and end date of the period
+        """
+        return self.get_period(max(self.get_index(today), 0))
+
+    def iter_periods(self, today: date):
+        """
+        Lazily enumerates all periods that have started until today, oldest first.
+
+        Parameters:
+            today: date
+
+        Returns:
+            generator: of tuples with start and end date of the periods
+        """
+        for index in range(self.get_index(today) + 1):
+            yield self.get_period(index)
+
+
+@lru_cache(maxsize=1024)
+def get_period_calendar(initial_start: date, duration_months: int) -> PeriodCalendar:
+    """
+    Returns the period calendar of an initial start and duration.
+
+    Returns:
+        PeriodCalendar
+    """
+    return PeriodCalendar(initial_start, duration_months)
+
+
+@lru_cache(maxsize=1024)
+def get_formatted_periods(initial_start: date, duration_months: int, today: date) -> tuple:
+    """
+    Returns all periods that have started until today with formatted start and end dates.
+    Results are cached, vaults with the same initial start and duration share them.
+
+    Returns:
+        tuple: of tuples with formatted start and end date of the periods, oldest first
+    """
+    return tuple((start.strftime(PERIOD_DATE_FORMAT), end.strftime(PERIOD_DATE_FORMAT))
+                 for start, end in get_period_calendar(initial_start, duration_months)
+                 .iter_periods(today))
@@ -0,0 +1,155 @@
+"""
+Module containing utility classes for prefetching slideshow slides.
+While a slide is shown, the images of the following memories are loaded
+in a small thread pool, so navigating to them does not wait for the image storage.
+"""
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, current_app
+
+from .cache_util import image_cache
+from .memory_util import MemoryManagement, select_image
+from .storage_util import image_storage
+
+
+class SlidePrefetcher:
+    """
+    Loads image bytes of upcoming slides into the image_cache in background threads.
+    Every session has at most SLIDESHOW_PREFETCH_COUNT prefetches in flight,
+    so a single user cannot occupy the whole pool.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.workers = 0
+
+        self._in_flight = {}
+        self._generation = 0
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app: Flask) -> None:
+        """
+        Reads window size and pool size from the app configuration.
+
+        Returns:
+            None
+        """
+        self.count = app.config["SLIDESHOW_PREFETCH_COUNT"]
+        self.workers = app.config["SLIDESHOW_PREFETCH_WORKERS"]
+        with self._lock:
+            self._in_flight.clear()
+            # -- Prefetches started before are discarded when they finish --
+            self._generation += 1
+
+    def enabled(self) -> bool:
+        """
+        Returns whether slides are prefetched.
+
+        Returns:
+            bool
+        """
+        return self.count > 0 and self.workers > 0
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        """
+        Returns the thread pool of the current process.
+
+        Returns:
+            ThreadPoolExecutor
+        """
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ThreadPoolExecutor(max_workers=self.workers,
+                                                thread_name_prefix="slide-prefetch")
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def prefetch(self, session_key: str, memories: list, accept_mimetypes=None) -> int:
+        """
+        Starts loading the images of the given memories in the background.
+        Only the format the client negotiates for the largest rendition is loaded.
+        Memories in flight are skipped.
+
+        Parameters:
+            session_key: str
+                Identifies the session the prefetch is done for.
+            memories: list
+                Information of the upcoming memories as returned by
+                MemoryManagement.get_memory_data, at most SLIDESHOW_PREFETCH_COUNT are used.
+            accept_mimetypes: MIMEAccept (optional)
+                Parsed Accept header of the client, JPEG is loaded if not given.
+
+        Returns:
+            int: number of started prefetches
+        """
+        if not self.enabled():
+            return 0
+
+        app = current_app._get_current_object()
+        started = 0
+        for memory_data in memories[:self.count]:
+            if not memory_data["image_uri"]:
+                continue
+
+            memory_id = memory_data["id"]
+            with self._lock:
+                in_flight = self._in_flight.setdefault(session_key, set())
+                if memory_id in in_flight or len(in_flight) >= self.count:
+                    continue
+                in_flight.add(memory_id)
+
+            try:
+                self._get_pool().submit(self._load, app, session_key, memory_data,
+                                        accept_mimetypes, self._generation)
+            except RuntimeError:
+                self._done(session_key, memory_id)
+                raise
+            started += 1
+
+        return started
+
+    def _done(self, session_key: str, memory_id: int) -> None:
+        """
+        Removes a finished prefetch from the in-flight prefetches of its session.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            in_flight = self._in_flight.get(session_key, set())
+            in_flight.discard(memory_id)
+            if not in_flight:
+                self._in_flight.pop(session_key, None)
+
+    def _load(self, app: Flask, session_key: str, memory_data: dict, accept_mimetypes,
+              generation: int) -> None:
+        """
+        Loads the bytes of the default image of a memory inside the worker thread.
+
+        Returns:
+            None
+        """
+        memory_id = memory_data["id"]
+        try:
+            with app.app_context():
+                image_uri, _ = select_image(memory_data, None, accept_mimetypes)
+                # -- Local files and signed URLs do not pass image bytes through the app --
+                if app.config["IMAGE_SIGNED_URLS"] \
+                        or image_storage.get_backend().get_local_path(image_uri):
+                    return
+                # -- Prefetches started before init_app are discarded --
+                if generation != self._generation:
+                    return
+                if image_cache.get(image_uri) is None:
+                    MemoryManagement.get_image_bytes(image_uri)
+        except Exception:
+            logging.warning("Prefetching memory %s failed", memory_id, exc_info=True)
+        finally:
+            self._done(session_key, memory_id)
+
+
+slide_prefetcher = SlidePrefetcher()
@@ -0,0 +1,466 @@
+"""
+Module containing utility classes for server side sessions.
+The session data (user, vault and family information) is kept in a folder or table shared by
+all worker processes and the session cookie only carries an opaque session id,
+so the size of every request stays the same no matter what is stored in the session.
+"""
+import os
+import re
+import time
+import secrets
+import logging
+import threading
+from datetime import datetime, timezone
+from flask import Flask, Request, Response, current_app, has_request_context, \
+    session as request_session
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSession, SessionInterface
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from ..models import db, WebSession
+from .storage_util import write_file_atomic
+
+SESSION_BACKENDS = ("cookie", "filesystem", "database")
+
+
+def _to_datetime(timestamp: float) -> datetime:
+    """
+    Returns a POSIX timestamp as naive UTC datetime.
+
+    Returns:
+        datetime
+    """
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+
+class ServerSession(SecureCookieSession):
+    """
+    Session whose data is stored on the server under session_id.
+    Like cookie sessions, only assignments to the session itself mark it as modified.
+    """
+
+    def __init__(self, initial=None, session_id: str = None, expires_at: float = None):
+        super().__init__(initial)
+        self.session_id = session_id
+        # -- POSIX timestamp the stored session expires at, None if not stored yet --
+        self.expires_at = expires_at
+
+
+class FilesystemSessionBackend:
+    """
+    Stores every session in <folder>/<session_id>.session. The modification time of the file
+    is set to the expiry of the session, so extending the expiry does not rewrite the data.
+    """
+    EXTENSION = ".session"
+
+    def __init__(self, folder: str):
+        self.folder = folder
+
+    def _get_path(self, session_id: str) -> str:
+        """
+        Returns the path of the file of a session.
+
+        Returns:
+            str
+        """
+        return os.path.join(self.folder, f"{session_id}{self.EXTENSION}")
+
+    def load(self, session_id: str) -> tuple:
+        """
+        Loads a session that did not expire.
+
+        Parameters:
+            session_id: str
+
+        Returns:
+            tuple: serialized session data and POSIX timestamp of the expiry
+            None: if the session does not exist or expired
+        """
+        try:
+            with open(self._get_path(session_id), "r", encoding="utf-8") as fp:
+                expires_at = os.fstat(fp.fileno()).st_mtime
+                data = fp.read()
+        except FileNotFoundError:
+            return None
+
+        if expires_at < time.time():
+            return None
+        return data, expires_at
+
+    def save(self, session_id: str, data: str, expires_at: float) -> None:
+        """
+        Stores the data of a session.
+
+        Parameters:
+            session_id: str
+            data: str
+                Serialized session data.
+            expires_at: float
+                POSIX timestamp after which the session is removed.
+
+        Returns:
+            None
+        """
+        path = self._get_path(session_id)
+        write_file_atomic(path, data.encode("utf-8"))
+        os.utime(path, (expires_at, expires_at))
+
+    def touch(self, session_id: str, expires_at: float) -> None:
+        """
+        Extends the expiry of a session without changing its data.
+
+        Returns:
+            None
+        """
+        try:
+            os.utime(self._get_path(session_id), (expires_at, expires_at))
+        except FileNotFoundError:
+            pass
+
+    def delete(self, session_id: str) -> None:
+        """
+        Removes a session.
+
+        Returns:
+            None
+        """
+        try:
+            os.remove(self._get_path(session_id))
+        except FileNotFoundError:
+            pass
+
+    def collect_expired(self) -> int:
+        """
+        Removes all expired sessions.
+
+        Returns:
+            int: number of removed sessions
+        """
+        if not os.path.isdir(self.folder):
+            return 0
+
+        removed = 0
+        now = time.time()
+        for filename in os.listdir(self.folder):
+            session_id, extension = os.path.splitext(filename)
+            if extension != self.EXTENSION \
+                    or not ServerSessionInterface.SESSION_ID_PATTERN.match(session_id):
+                continue
+            try:
+                if os.path.getmtime(os.path.join(self.folder, filename)) >= now:
+                    continue
+            except FileNotFoundError:
+                continue
+            self.delete(session_id)
+            removed += 1
+        return removed
+
+
+class DatabaseSessionBackend:
+    """
+    Stores sessions in the web_session table. Statements run on their own connection,
+    so storing a session never commits or rolls back the changes of a request.
+    """
+
+    def __init__(self):
+        self.table = WebSession.__table__
+
+    def load(self, session_id: str) -> tuple:
+        """
+        Loads a session that did not expire.
+
+        Parameters:
+            session_id: str
+
+        Returns:
+            tuple: serialized session data and POSIX timestamp of the expiry
+            None: if the session does not exist or expired
+        """
+        with db.engine.connect() as connection:
+            row = connection.execute(
+                select(self.table.c.data, self.table.c.expires_at)
+                .where(self.table.c.id == session_id)
+            ).first()
+
+        if row is None:
+            return None
+        expires_at = row.expires_at.replace(tzinfo=timezone.utc).timestamp()
+        if expires_at < time.time():
+            return None
+        return row.data, expires_at
+
+    def save(self, session_id: str, data: str, expires_at: float) -> None:
+        """
+        Stores the data of a session.
+
+        Parameters:
+            session_id: str
+            data: str
+                Serialized session data.
+            expires_at: float
+                POSIX timestamp after which the session is removed.
+
+        Returns:
+            None
+        """
+        values = {"data": data, "expires_at": _to_datetime(expires_at)}
+        with db.engine.begin() as connection:
+            result = connection.execute(
+                update(self.table).where(self.table.c.id == session_id).values(**values))
+            # -- Session ids are random, so no other request inserts the same id --
+            if result.rowcount == 0:
+                connection.execute(insert(self.table).values(id=session_id, **values))
+
+    def touch(self, session_id: str, expires_at: float) -> None:
+        """
+        Extends the expiry of a session without changing its data.
+
+        Returns:
+            None
+        """
+        with db.engine.begin() as connection:
+            connection.execute(update(self.table).where(self.table.c.id == session_id)
+                               .values(expires_at=_to_datetime(expires_at)))
+
+    def delete(self, session_id: str) -> None:
+        """
+        Removes a session.
+
+        Returns:
+            None
+        """
+        with db.engine.begin() as connection:
+            connection.execute(delete(self.table).where(self.table.c.id == session_id))
+
+    def collect_expired(self) -> int:
+        """
+        Removes all expired sessions.
+
+        Returns:
+            int: number of removed sessions
+        """
+        with db.engine.begin() as connection:
+            result = connection.execute(delete(self.table)
+                                        .where(self.table.c.expires_at < _to_datetime(time.time())))
+        return result.rowcount
+
+
+def regenerate_session() -> None:
+    """
+    Issues a new id for the session of the current request and removes the stored session
+    under the old id. Called whenever a session gains privileges, e.g. on login, so an id
+    planted in the browser before never refers to the privileged session.
+    Signed cookie sessions carry their data themselves and are left unchanged.
+
+    Returns:
+        None
+    """
+    interface = current_app.session_interface
+    if isinstance(interface, ServerSessionInterface):
+        interface.regenerate(request_session._get_current_object())
+
+
+def get_session_expiry() -> float:
+    """
+    Returns when the session of the current request expires: the stored expiry of server side
+    sessions, PERMANENT_SESSION_LIFETIME after login for signed cookie sessions.
+
+    Returns:
+        float: POSIX timestamp
+        None: if the expiry of the session is not known, e.g. outside of requests
+    """
+    if not has_request_context():
+        return None
+
+    if isinstance(request_session, ServerSession) and request_session.expires_at is not None:
+        return request_session.expires_at
+    if "login_at" in request_session:
+        return request_session["login_at"] \
+            + current_app.permanent_session_lifetime.total_seconds()
+    return None
+
+
+class ServerSessionInterface(SessionInterface):
+    """
+    Session interface keeping sessions in the backend selected by SESSION_BACKEND.
+    Sessions expire PERMANENT_SESSION_LIFETIME after their last use. The expiry of unchanged
+    sessions is extended at most every SESSION_TOUCH_INTERVAL seconds, so most requests only
+    read the session. Expired sessions are garbage collected every SESSION_GC_INTERVAL seconds.
+    With SESSION_BACKEND "cookie" Flask's signed cookie sessions are kept.
+    """
+    SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{43}$")
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self):
+        self.backend = None
+        self.touch_interval = 0
+        self.gc_interval = 0
+        self._last_gc = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app: Flask) -> None:
+        """
+        Reads the session settings from the app configuration and
+        replaces the session interface of the app by a server side one.
+
+        Returns:
+            None
+        """
+        backend = app.config["SESSION_BACKEND"]
+        if backend not in SESSION_BACKENDS:
+            raise ValueError(f"Unknown session backend: {backend}")
+
+        self.touch_interval = app.config["SESSION_TOUCH_INTERVAL"]
+        self.gc_interval = app.config["SESSION_GC_INTERVAL"]
+        self._last_gc = None
+        if backend == "cookie":
+            self.backend = None
+            return
+
+        if backend == "filesystem":
+            self.backend = FilesystemSessionBackend(app.config["SESSION_FOLDER"])
+        else:
+            self.backend = DatabaseSessionBackend()
+        app.session_interface = self
+
+    def enabled(self) -> bool:
+        """
+        Returns whether sessions are stored on the server.
+
+        Returns:
+            bool
+        """
+        return self.backend is not None
+
+    @staticmethod
+    def _new_session_id() -> str:
+        """
+        Returns a new random session id.
+
+        Returns:
+            str
+        """
+        return secrets.token_urlsafe(32)
+
+    def regenerate(self, server_session: ServerSession) -> None:
+        """
+        Removes the stored session and moves its data to a new session id,
+        which is stored and sent to the browser at the end of the request.
+
+        Parameters:
+            server_session: ServerSession
+
+        Returns:
+            None
+        """
+        if server_session.session_id is not None:
+            self.backend.delete(server_session.session_id)
+        server_session.session_id = self._new_session_id()
+        server_session.new = True
+        server_session.modified = True
+
+    def open_session(self, app: Flask, request: Request) -> ServerSession:
+        """
+        Loads the session whose id is sent in the session cookie.
+        Unknown, malformed and expired ids start a new session.
+
+        Returns:
+            ServerSession
+        """
+        session_id = request.cookies.get(self.get_cookie_name(app))
+        if not session_id or not self.SESSION_ID_PATTERN.match(session_id):
+            return ServerSession()
+
+        stored = self.backend.load(session_id)
+        if stored is None:
+            return ServerSession()
+
+        data, expires_at = stored
+        try:
+            return ServerSession(self.serializer.loads(data), session_id, expires_at)
+        except ValueError:
+            logging.warning("Discarding unreadable session", exc_info=True)
+            return ServerSession()
+
+    def save_session(self, app: Flask, session: ServerSession, response: Response) -> None:
+        """
+        Stores modified sessions, extends the expiry of used ones and
+        sets the session cookie to the session id.
+
+        Returns:
+            None
+        """
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        partitioned = self.get_cookie_partitioned(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        # -- Cleared sessions are removed together with their cookie --
+        if not session:
+            if session.modified:
+                if session.session_id is not None:
+                    self.backend.delete(session.session_id)
+                response.delete_cookie(name, domain=domain, path=path, secure=secure,
+                                       partitioned=partitioned, samesite=samesite,
+                                       httponly=httponly)
+                response.vary.add("Cookie")
+            return
+
+        expires_at = time.time() + app.permanent_session_lifetime.total_seconds()
+        if session.session_id is None:
+            session.session_id = self._new_session_id()
+            session.new = True
+
+        if session.modified:
+            self.backend.save(session.session_id, self.serializer.dumps(dict(session)),
+                              expires_at)
+        elif expires_at - session.expires_at >= self.touch_interval:
+            self.backend.touch(session.session_id, expires_at)
+        self._collect_periodically()
+
+        if session.new or self.should_set_cookie(app, session):
+            response.set_cookie(name, session.session_id,
+                                expires=self.get_expiration_time(app, session),
+                                httponly=httponly, domain=domain, path=path, secure=secure,
+                                partitioned=partitioned, samesite=samesite)
+            response.vary.add("Cookie")
+
+    def collect_expired(self) -> int:
+        """
+        Removes all expired sessions from the backend.
+
+        Returns:
+            int: number of removed sessions
+        """
+        removed = self.backend.collect_expired()
+        if removed:
+            logging.info("Removed %s expired sessions", removed)
+        return removed
+
+    def _collect_periodically(self) -> None:
+        """
+        Garbage collects expired sessions at most every SESSION_GC_INTERVAL seconds.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if self._last_gc is not None \
+                    and time.monotonic() - self._last_gc < self.gc_interval:
+                return
+            self._last_gc = time.monotonic()
+
+        try:
+            self.collect_expired()
+        except (OSError, SQLAlchemyError):
+            logging.warning("Collecting expired sessions failed", exc_info=True)
+
+
+server_sessions = ServerSessionInterface()
@@ -0,0 +1,395 @@
+"""
+Module containing utility classes for storing the state of running slideshows.
+The order of a slideshow is kept on the server, so the session cookie only carries an
+opaque slideshow id instead of the ids of all memories of a collection period.
+"""
+import os
+import re
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+from flask import Flask
+
+
+class SlideshowNotFoundException(Exception):
+    """
+    Custom Exception for slideshows that do not exist, expired or belong to another user.
+    """
+
+    def __init__(self, message: str, *args):
+        super().__init__(*args)
+        self.message = message
+
+    def get_message(self) -> str:
+        """
+        Returns error message.
+        """
+        return self.message
+
+
+def get_shuffled_position(index: int, size: int, seed: int) -> int:
+    """
+    Maps a slide position to a position in the chronological order of a shuffled slideshow.
+    The mapping is a permutation of range(size) determined by the seed, so any slide of a
+    random slideshow is computed on its own without shuffling the whole order.
+    A keyed Feistel network permutes the smallest even bit width covering size,
+    results outside of range(size) are mapped again until they fall into it (cycle walking).
+
+    Parameters:
+        index: int
+            0-based position in the slideshow.
+        size: int
+            Number of slides.
+        seed: int
+            Non-negative 64 bit key of the permutation.
+
+    Returns:
+        int: 0-based position in chronological order
+    """
+    if not 0 <= index < size:
+        raise IndexError("Slide position out of range")
+    if size <= 1:
+        return index
+
+    bits = max((size - 1).bit_length(), 2)
+    half_bits = (bits + 1) // 2
+    mask = (1 << half_bits) - 1
+    key = seed.to_bytes(8, "big")
+
+    position = index
+    while True:
+        left, right = position >> half_bits, position & mask
+        for round_number in range(4):
+            digest = hashlib.blake2b(f"{round_number}:{right}".encode(), key=key,
+                                     digest_size=8).digest()
+            left, right = right, left ^ (int.from_bytes(digest, "big") & mask)
+        position = (left << half_bits) | right
+        if position < size:
+            return position
+
+
+class SlideshowStore:
+    """
+    Stores running slideshows in SLIDESHOW_STATE_FOLDER, so all worker processes share them.
+    Every slideshow consists of <slideshow_id>.json holding owner, number of slides and state
+    and, if its order is stored, <slideshow_id>.ids holding the memory ids in slideshow order
+    as 64 bit integers. A slide is looked up by reading its 8 bytes at a fixed offset,
+    without loading the order.
+    Slideshows without activity for SLIDESHOW_STATE_EXPIRY seconds are garbage collected.
+    """
+    SLIDESHOW_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+    ID_TYPECODE = "q"
+
+    def __init__(self):
+        self.folder = None
+        self.expiry = 0
+        self.gc_interval = 0
+        self._last_gc = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app: Flask) -> None:
+        """
+        Reads the slideshow settings from the app configuration.
+
+        Returns:
+            None
+        """
+        self.folder = app.config["SLIDESHOW_STATE_FOLDER"]
+        self.expiry = app.config["SLIDESHOW_STATE_EXPIRY"]
+        self.gc_interval = app.config["SLIDESHOW_STATE_GC_INTERVAL"]
+
+    def _get_path(self, slideshow_id: str, extension: str) -> str:
+        """
+        Returns the path of a file of a slideshow.
+
+        Returns:
+            str
+        """
+        if not isinstance(slideshow_id, str) or not self.SLIDESHOW_ID_PATTERN.match(slideshow_id):
+            raise SlideshowNotFoundException("Slideshow does not exist.")
+        return os.path.join(self.folder, f"{slideshow_id}.{extension}")
+
+    def create(self, user_id: int, memory_ids: list = None, **state) -> str:
+        """
+        Stores a new slideshow. Either the order of the slideshow is stored or
+        the state needed to compute it, e.g. the seed of a random slideshow.
+
+        Parameters:
+            user_id: int
+                Id of the user viewing the slideshow.
+            memory_ids: list
+                Ids of the memories in slideshow order.
+            state:
+                JSON serializable values stored with the slideshow,
+                has to contain "number_memories" if no memory_ids are given.
+
+        Returns:
+            str: id of the slideshow
+        """
+        os.makedirs(self.folder, exist_ok=True)
+        self._collect_periodically()
+
+        slideshow_id = uuid.uuid4().hex
+        if memory_ids is not None:
+            # -- Order is written first, so metadata never exists without it --
+            with open(self._get_path(slideshow_id, "ids"), "wb") as fp:
+                array(self.ID_TYPECODE, memory_ids).tofile(fp)
+            state["number_memories"] = len(memory_ids)
+        with open(self._get_path(slideshow_id, "json"), "w", encoding="utf-8") as fp:
+            json.dump({**state, "user_id": user_id, "created_at": time.time()}, fp)
+
+        return slideshow_id
+
+    def get(self, slideshow_id: str, user_id: int) -> dict:
+        """
+        Loads a slideshow, checks its owner and extends its expiry.
+
+        Parameters:
+            slideshow_id: str
+            user_id: int
+
+        Returns:
+            dict: containing "slideshow_id", "user_id", "number_memories"
+                  and the state the slideshow was created with
+        """
+        metadata_path = self._get_path(slideshow_id, "json")
+        try:
+            with open(metadata_path, "r", encoding="utf-8") as fp:
+                slideshow = json.load(fp)
+            os.utime(metadata_path)
+        except (FileNotFoundError, ValueError) as e:
+            raise SlideshowNotFoundException("Slideshow does not exist.") from e
+
+        if slideshow["user_id"] != user_id:
+            raise SlideshowNotFoundException("Slideshow does not exist.")
+
+        return {"slideshow_id": slideshow_id, **slideshow}
+
+    def get_memory_ids(self, slideshow_id: str, start: int, stop: int) -> list:
+        """
+        Returns the ids of the memories shown at positions start to stop (exclusive).
+
+        Parameters:
+            slideshow_id: str
+            start: int
+                0-based position of the first slide.
+            stop: int
+                Position after the last slide, clipped to the number of slides.
+
+        Returns:
+            list: memory ids in slideshow order
+        """
+        memory_ids = array(self.ID_TYPECODE)
+        start = max(start, 0)
+        if stop <= start:
+            return []
+
+        try:
+            fd = os.open(self._get_path(slideshow_id, "ids"), os.O_RDONLY)
+        except FileNotFoundError as e:
+            raise SlideshowNotFoundException("Slideshow does not exist.") from e
+        try:
+            data = os.pread(fd, (stop - start) * memory_ids.itemsize, start * memory_ids.itemsize)
+        finally:
+            os.close(fd)
+
+        memory_ids.frombytes(data)
+        return memory_ids.tolist()
+
+    def get_memory_id(self, slideshow_id: str, index: int) -> int:
+        """
+        Returns the id of the memory shown at a position.
+
+        Parameters:
+            slideshow_id: str
+            index: int
+                0-based position of the slide.
+
+        Returns:
+            int: memory id
+        """
+        memory_ids = self.get_memory_ids(slideshow_id, index, index + 1)
+        if not memory_ids:
+            raise SlideshowNotFoundException("Slide does not exist.")
+
+        return memory_ids[0]
+
+    def delete(self, slideshow_id: str) -> None:
+        """
+        Removes a slideshow.
+
+        Parameters:
+            slideshow_id: str
+
+        Returns:
+            None
+        """
+        for extension in ["json", "ids"]:
+            try:
+                os.remove(self._get_path(slideshow_id, extension))
+            except (FileNotFoundError, SlideshowNotFoundException):
+                pass
+
+    def collect_expired(self) -> int:
+        """
+        Removes all slideshows without activity for SLIDESHOW_STATE_EXPIRY seconds.
+
+        Returns:
+            int: number of removed slideshows
+        """
+        if not os.path.isdir(self.folder):
+            return 0
+
+        removed = 0
+        expired_before = time.time() - self.expiry
+        for filename in os.listdir(self.folder):
+            slideshow_id, extension = os.path.splitext(filename)
+            if extension not in [".json", ".ids"] \
+                    or not self.SLIDESHOW_ID_PATTERN.match(slideshow_id):
+                continue
+            # -- Order files are only checked when left behind by interrupted creates --
+            if extension == ".ids" and os.path.exists(self._get_path(slideshow_id, "json")):
+                continue
+            try:
+                if os.path.getmtime(os.path.join(self.folder, filename)) >= expired_before:
+                    continue
+            except FileNotFoundError:
+                continue
+            self.delete(slideshow_id)
+            removed += 1
+
+        if removed:
+            logging.info("Removed %s expired slideshows", removed)
+        return removed
+
+    def _collect_periodically(self) -> None:
+        """
+        Garbage collects expired slideshows at most every SLIDESHOW_STATE_GC_INTERVAL seconds.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if self._last_gc is not None \
+                    and time.monotonic() - self._last_gc < self.gc_interval:
+                return
+            self._last_gc = time.monotonic()
+
+        try:
+            self.collect_expired()
+        except OSError:
+            logging.warning("Collecting expired slideshows failed", exc_info=True)
+
+
+class SlideshowMemoryCache:
+    """
+    Keeps the memories of running slideshows by slide position, so navigating back and forth
+    does not query the database again. Memories are cached per process for
+    SLIDESHOW_MEMORY_CACHE_TTL seconds after the last access of the slideshow, at most
+    SLIDESHOW_MEMORY_CACHE_SIZE slideshows with SLIDESHOW_MEMORY_CACHE_SLIDES slides each.
+    """
+
+    def __init__(self):
+        self.ttl = 0
+        self.max_slideshows = 0
+        self.max_slides = 0
+
+        self._slideshows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app: Flask) -> None:
+        """
+        Reads the cache settings from the app configuration.
+
+        Returns:
+            None
+        """
+        self.ttl = app.config["SLIDESHOW_MEMORY_CACHE_TTL"]
+        self.max_slideshows = app.config["SLIDESHOW_MEMORY_CACHE_SIZE"]
+        self.max_slides = app.config["SLIDESHOW_MEMORY_CACHE_SLIDES"]
+        with self._lock:
+            self._slideshows.clear()
+
+    def get(self, slideshow_id: str, start: int, stop: int, complete: bool = True) -> list:
+        """
+        Returns the cached memories shown at positions start to stop (exclusive).
+
+        Parameters:
+            slideshow_id: str
+            start: int
+                0-based position of the first slide.
+            stop: int
+                Position after the last slide.
+            complete: bool
+                Whether all slides have to be cached. Otherwise missing slides are left out.
+
+        Returns:
+            dict: mapping position to memory information in slideshow order,
+                  memories deleted in the meantime are left out
+            None: if complete and not all of the slides are cached
+        """
+        with self._lock:
+            entry = self._slideshows.get(slideshow_id)
+            if entry is not None and entry["expires"] < time.monotonic():
+                del self._slideshows[slideshow_id]
+                entry = None
+            if entry is None:
+                return None if complete else {}
+
+            slides = entry["slides"]
+            if complete and any(position not in slides for position in range(start, stop)):
+                return None
+            entry["expires"] = time.monotonic() + self.ttl
+            self._slideshows.move_to_end(slideshow_id)
+            return {position: slides[position] for position in range(start, stop)
+                    if slides.get(position) is not None}
+
+    def put(self, slideshow_id: str, memories: dict) -> None:
+        """
+        Caches memories of slides and evicts the least recently used slideshows.
+
+        Parameters:
+            slideshow_id: str
+            memories: dict
+                mapping 0-based position to memory information,
+                None for memories deleted in the meantime.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            entry = self._slideshows.setdefault(slideshow_id, {"slides": {}})
+            entry["expires"] = time.monotonic() + self.ttl
+            self._slideshows.move_to_end(slideshow_id)
+
+            slides = entry["slides"]
+            for position, memory_data in memories.items():
+                slides.pop(position, None)
+                slides[position] = memory_data
+            # -- Slides cached first are evicted first --
+            while len(slides) > self.max_slides:
+                del slides[next(iter(slides))]
+            while len(self._slideshows) > self.max_slideshows:
+                self._slideshows.popitem(last=False)
+
+    def delete(self, slideshow_id: str) -> None:
+        """
+        Removes the memories of a slideshow.
+
+        Parameters:
+            slideshow_id: str
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._slideshows.pop(slideshow_id, None)
+
+
+slideshow_store = SlideshowStore()
+slideshow_memories = SlideshowMemoryCache()
@@ -0,0 +1,251 @@
+"""
+Module containing utility classes for the statistics of collection periods.
+Statistics are maintained incrementally in vault_period_stats while memories are created,
+so pages showing counts never have to scan the memories of a vault.
+"""
+from abc import ABC
+from datetime import date, datetime
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+
+from ..models import db, Memory, MemoryImage, User, Vault, VaultPeriodStats
+from .period_util import get_period_calendar
+
+# -- Dialects supporting INSERT ... ON CONFLICT DO UPDATE --
+UPSERT_DIALECTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert
+}
+COUNT_COLUMNS = ["memory_count", "image_count", "size_bytes"]
+
+
+class PeriodStatistics(ABC):
+    """
+    Utility class for updating and reading the statistics of collection periods.
+    """
+    @staticmethod
+    def add_memories(memories: list) -> None:
+        """
+        Counts new memories and their images in the statistics of their periods.
+        Has to be called before the memories are committed, so both are stored in the
+        same transaction. Does not commit.
+
+        Parameters:
+            memories: list
+                Memory instances with vault_id, date, user_id and images set.
+
+        Returns:
+            None
+        """
+        deltas = {}
+        calendars = {}
+        for memory in memories:
+            if memory.vault_id not in calendars:
+                vault = db.session.get(Vault, memory.vault_id)
+                calendars[memory.vault_id] = get_period_calendar(vault.period_initial_start,
+                                                                 vault.period_duration.value)
+            key = PeriodStatistics._get_key(memory, calendars[memory.vault_id])
+            delta = deltas.setdefault(key, [0, 0, 0])
+            delta[0] += 1
+            delta[1] += 1 if memory.images else 0
+            delta[2] += sum(image.size_bytes or 0 for image in memory.images)
+
+        PeriodStatistics._apply(deltas)
+
+    @staticmethod
+    def update_images(memory: Memory, old_images: list) -> None:
+        """
+        Updates the statistics of the period of a memory after its images were replaced.
+        Does not commit.
+
+        Parameters:
+            memory: Memory
+                Memory with its new images set.
+            old_images: list
+                MemoryImage instances the memory had before.
+
+        Returns:
+            None
+        """
+        vault = db.session.get(Vault, memory.vault_id)
+        key = PeriodStatistics._get_key(memory, get_period_calendar(vault.period_initial_start,
+                                                                    vault.period_duration.value))
+        PeriodStatistics._apply({key: [
+            0,
+            int(bool(memory.images)) - int(bool(old_images)),
+            sum(image.size_bytes or 0 for image in memory.images)
+            - sum(image.size_bytes or 0 for image in old_images)
+        ]})
+
+    @staticmethod
+    def rebuild(vault_id: int = None) -> int:
+        """
+        Recomputes the statistics of one or all vaults from their memories,
+        e.g. after memories were changed outside of the app.
+        Memories uploaded to a vault while it is rebuilt may be counted twice or not at all.
+
+        Parameters:
+            vault_id: int (optional)
+                Id of the vault to rebuild, all vaults if not given.
+
+        Returns:
+            int: number of rebuilt vaults
+        """
+        images = db.session.query(MemoryImage.memory_id,
+                                  func.coalesce(func.sum(MemoryImage.size_bytes), 0)
+                                  .label("size_bytes")) \
+            .group_by(MemoryImage.memory_id).subquery()
+
+        vaults = Vault.query.order_by(Vault.id)
+        if vault_id is not None:
+            vaults = vaults.filter(Vault.id == vault_id)
+
+        number_vaults = 0
+        for vault in vaults.all():
+            calendar = get_period_calendar(vault.period_initial_start, vault.period_duration.value)
+            memories = db.session.query(Memory.date, Memory.user_id, images.c.memory_id,
+                                        images.c.size_bytes) \
+                .outerjoin(images, images.c.memory_id == Memory.id) \
+                .filter(Memory.vault_id == vault.id)
+
+            deltas = {}
+            for memory_date, user_id, image_memory_id, size_bytes in memories.yield_per(1000):
+                key = (vault.id, calendar.get_index(PeriodStatistics._to_date(memory_date)),
+                       user_id or 0)
+                delta = deltas.setdefault(key, [0, 0, 0])
+                delta[0] += 1
+                delta[1] += 1 if image_memory_id is not None else 0
+                delta[2] += size_bytes or 0
+
+            VaultPeriodStats.query.filter(VaultPeriodStats.vault_id == vault.id) \
+                .delete(synchronize_session=False)
+            PeriodStatistics._apply(deltas)
+            db.session.commit()
+            number_vaults += 1
+
+        return number_vaults
+
+    @staticmethod
+    def get_stats(vault_ids: list) -> dict:
+        """
+        Returns the statistics of all periods of several vaults with a single query.
+
+        Parameters:
+            vault_ids: list
+                Ids of the vaults.
+
+        Returns:
+            dict: mapping vault id to a dict mapping period index to a dict with keys
+                  "number_memories", "number_images", "size_bytes" and "uploaders",
+                  a list of dicts with keys "name" and "number_memories", most active first
+        """
+        if not vault_ids:
+            return {}
+
+        rows = db.session.query(VaultPeriodStats, User.firstname) \
+            .outerjoin(User, User.id == VaultPeriodStats.user_id) \
+            .filter(VaultPeriodStats.vault_id.in_(vault_ids))
+
+        stats = {}
+        for row, firstname in rows:
+            period = stats.setdefault(row.vault_id, {}).setdefault(row.period_index, {
+                "number_memories": 0,
+                "number_images": 0,
+                "size_bytes": 0,
+                "uploaders": []
+            })
+            period["number_memories"] += row.memory_count
+            period["number_images"] += row.image_count
+            period["size_bytes"] += row.size_bytes
+            if row.memory_count:
+                period["uploaders"].append({"name": firstname or "Unknown",
+                                            "number_memories": row.memory_count})
+
+        for periods in stats.values():
+            for period in periods.values():
+                period["uploaders"].sort(key=lambda uploader: -uploader["number_memories"])
+
+        return stats
+
+    @staticmethod
+    def get_number_memories(vault_id: int, period_index: int) -> int:
+        """
+        Returns the number of memories uploaded to a period of a vault.
+
+        Parameters:
+            vault_id: int
+            period_index: int
+                0-based index of the period.
+
+        Returns:
+            int: Number of memories
+        """
+        return db.session.query(func.coalesce(func.sum(VaultPeriodStats.memory_count), 0)) \
+            .filter(VaultPeriodStats.vault_id == vault_id,
+                    VaultPeriodStats.period_index == period_index) \
+            .scalar()
+
+    @staticmethod
+    def _get_key(memory: Memory, calendar) -> tuple:
+        """
+        Returns the primary key of the statistics row counting a memory.
+
+        Returns:
+            tuple: vault id, period index and uploader
+        """
+        return (memory.vault_id,
+                calendar.get_index(PeriodStatistics._to_date(memory.date)),
+                memory.user_id or 0)
+
+    @staticmethod
+    def _to_date(memory_date) -> date:
+        """
+        Returns the day of a memory date loaded from the database or set on upload.
+
+        Returns:
+            date
+        """
+        return memory_date.date() if isinstance(memory_date, datetime) else memory_date
+
+    @staticmethod
+    def _apply(deltas: dict) -> None:
+        """
+        Adds counts to the statistics rows, creating missing rows.
+        Counts are incremented by the database, so concurrent uploads do not overwrite
+        each other. Does not commit.
+
+        Parameters:
+            deltas: dict
+                mapping (vault_id, period_index, user_id) to a list of
+                memory count, image count and size in bytes to add
+
+        Returns:
+            None
+        """
+        rows = [{"vault_id": vault_id, "period_index": period_index, "user_id": user_id,
+                 **dict(zip(COUNT_COLUMNS, delta))}
+                for (vault_id, period_index, user_id), delta in deltas.items() if any(delta)]
+        if not rows:
+            return
+
+        table = VaultPeriodStats.__table__
+        insert = UPSERT_DIALECTS.get(db.session.get_bind().dialect.name)
+        if insert is not None:
+            statement = insert(table)
+            statement = statement.on_conflict_do_update(
+                index_elements=[table.c.vault_id, table.c.period_index, table.c.user_id],
+                set_={column: table.c[column] + statement.excluded[column]
+                      for column in COUNT_COLUMNS})
+            db.session.execute(statement, rows)
+            return
+
+        # -- Other databases update first and insert rows that do not exist yet --
+        for row in rows:
+            result = db.session.execute(
+                table.update()
+                .where(table.c.vault_id == row["vault_id"],
+                       table.c.period_index == row["period_index"],
+                       table.c.user_id == row["user_id"])
+                .values({column: table.c[column] + row[column] for column in COUNT_COLUMNS}))
+            if result.rowcount == 0:
+                db.session.execute(table.insert().values(row))
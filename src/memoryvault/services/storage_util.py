@@ -0,0 +1,703 @@
+"""
+Module containing utility classes for accessing the image storage.
+Azure clients are created once per process and reused across requests,
+so connections (and their TLS sessions) are kept alive between image transfers.
+In write-behind mode images are staged locally and replicated to blob storage
+by a background thread.
+The storage backend used for images is selected by the STORAGE_BACKEND setting.
+The Azure SDK is imported on first use, so processes storing images locally never load it.
+"""
+import os
+import time
+import queue
+import logging
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING
+from flask import Flask
+
+from .job_util import job_queue
+
+if TYPE_CHECKING:
+    from azure.storage.blob import BlobServiceClient, ContainerClient
+
+
+def write_file_atomic(path: str, data: bytes) -> None:
+    """
+    Writes data to a temporary file next to path and moves it in place,
+    so readers never see partially written files.
+
+    Parameters:
+        path: str
+            Destination of the file, missing folders are created.
+        data: bytes
+            Content of the file.
+
+    Returns:
+        None
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path),
+                                     suffix=".partial", delete=False) as fp:
+        fp.write(data)
+    os.replace(fp.name, path)
+
+
+class BlobClientRegistry:
+    """
+    Per-process registry of the Azure BlobServiceClient and its container clients.
+    Clients are recreated after a fork, as HTTP connections must not be shared
+    between processes.
+    """
+
+    def __init__(self):
+        self.config = None
+        self._service_client = None
+        self._container_clients = {}
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app: Flask) -> None:
+        """
+        Reads the storage settings and creates the clients if blob storage is used.
+
+        Returns:
+            None
+        """
+        self.config = app.config
+        with self._lock:
+            self._service_client = None
+            self._container_clients = {}
+
+        if app.config["STORAGE_BACKEND"] == "azure":
+            self.get_service_client()
+
+    def _create_service_client(self) -> "BlobServiceClient":
+        """
+        Creates a BlobServiceClient with keep-alive connection pool, transfer sizes
+        and retry policy taken from the configuration.
+
+        Returns:
+            BlobServiceClient
+        """
+        import requests
+        from requests.adapters import HTTPAdapter
+        from azure.core.pipeline.transport import RequestsTransport
+        from azure.storage.blob import BlobServiceClient, ExponentialRetry
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.config["AZURE_STORAGE_POOL_SIZE"],
+                              pool_maxsize=self.config["AZURE_STORAGE_POOL_SIZE"])
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        return BlobServiceClient.from_connection_string(
+            self.config["AZURE_STORAGE_CONNECTION_STRING"],
+            transport=RequestsTransport(session=session, session_owner=False),
+            retry_policy=ExponentialRetry(
+                initial_backoff=self.config["AZURE_STORAGE_RETRY_BACKOFF"],
+                increment_base=self.config["AZURE_STORAGE_RETRY_INCREMENT"],
+                retry_total=self.config["AZURE_STORAGE_RETRY_TOTAL"]),
+            connection_timeout=self.config["AZURE_STORAGE_CONNECTION_TIMEOUT"],
+            read_timeout=self.config["AZURE_STORAGE_READ_TIMEOUT"],
+            max_single_put_size=self.config["AZURE_STORAGE_MAX_SINGLE_PUT_SIZE"],
+            max_block_size=self.config["AZURE_STORAGE_MAX_BLOCK_SIZE"]
+        )
+
+    def get_service_client(self) -> "BlobServiceClient":
+        """
+        Returns the BlobServiceClient of the current process.
+
+        Returns:
+            BlobServiceClient
+        """
+        with self._lock:
+            if self._service_client is None or self._pid != os.getpid():
+                self._service_client = self._create_service_client()
+                self._container_clients = {}
+                self._pid = os.getpid()
+            return self._service_client
+
+    def get_container_client(self, container: str) -> "ContainerClient":
+        """
+        Returns the cached ContainerClient for a container of the storage account.
+
+        Parameters:
+            container: str
+                Name of the container, usually the configured UPLOAD_FOLDER.
+
+        Returns:
+            ContainerClient
+        """
+        service_client = self.get_service_client()
+        with self._lock:
+            if container not in self._container_clients:
+                self._container_clients[container] = service_client.get_container_client(
+                    container)
+            return self._container_clients[container]
+
+    def get_transfer_options(self) -> dict:
+        """
+        Returns the keyword arguments passed to every upload and download.
+
+        Returns:
+            dict: containing the configured max_concurrency
+        """
+        return {"max_concurrency": self.config["AZURE_STORAGE_MAX_CONCURRENCY"]}
+
+
+blob_client_registry = BlobClientRegistry()
+
+
+class BlobReplicator:
+    """
+    Write-behind replication of staged images to blob storage.
+    Every file in the staging folder is an image that still has to be uploaded, so pending
+    uploads survive restarts. A background thread per process uploads newly staged images
+    and periodically reconciles the staging folder to retry failed uploads with backoff.
+    """
+
+    def __init__(self):
+        self.config = None
+        self._queue = queue.Queue()
+        self._queued = set()
+        self._retry_at = {}
+        self._attempts = {}
+        self._worker = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app: Flask) -> None:
+        """
+        Reads the replication settings and starts the background worker if write-behind is used.
+
+        Returns:
+            None
+        """
+        self.config = app.config
+        if self.enabled():
+            os.makedirs(app.config["BLOB_STAGING_FOLDER"], exist_ok=True)
+            self._ensure_worker()
+
+    def enabled(self) -> bool:
+        """
+        Returns whether images are written to blob storage in write-behind mode.
+
+        Returns:
+            bool
+        """
+        return self.config is not None and self.config["STORAGE_BACKEND"] == "azure" \
+            and self.config["BLOB_WRITE_BEHIND"]
+
+    def _get_staging_path(self, image_uri: str) -> str:
+        """
+        Returns the path an image is staged under.
+
+        Returns:
+            str
+        """
+        return os.path.join(self.config["BLOB_STAGING_FOLDER"], image_uri)
+
+    def stage(self, image_data: bytes, image_uri: str) -> None:
+        """
+        Persists an image in the staging folder and queues it for replication.
+
+        Parameters:
+            image_data: bytes
+                The encoded image.
+            image_uri: str
+                Storage key of the image.
+
+        Returns:
+            None
+        """
+        write_file_atomic(self._get_staging_path(image_uri), image_data)
+        self._ensure_worker()
+        self._enqueue(image_uri)
+
+    def is_staged(self, image_uri: str) -> bool:
+        """
+        Returns whether an image is still waiting for replication.
+
+        Parameters:
+            image_uri: str
+                Storage key of the image.
+
+        Returns:
+            bool
+        """
+        return os.path.exists(self._get_staging_path(image_uri))
+
+    def get_staged_bytes(self, image_uri: str) -> bytes:
+        """
+        Returns a staged image that has not been replicated yet.
+
+        Parameters:
+            image_uri: str
+                Storage key of the image.
+
+        Returns:
+            bytes: the staged image
+            None: if the image is not staged (anymore)
+        """
+        try:
+            with open(self._get_staging_path(image_uri), "rb") as fp:
+                return fp.read()
+        except FileNotFoundError:
+            return None
+
+    def _enqueue(self, image_uri: str) -> None:
+        """
+        Queues an image for replication unless it is already queued.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if image_uri in self._queued:
+                return
+            self._queued.add(image_uri)
+        self._queue.put(image_uri)
+
+    def _get_staged_uris(self) -> list:
+        """
+        Lists the storage keys of all images in the staging folder.
+
+        Returns:
+            list: storage keys of the staged images
+        """
+        staging_folder = self.config["BLOB_STAGING_FOLDER"]
+        image_uris = []
+        for folder, _, filenames in os.walk(staging_folder):
+            for filename in filenames:
+                if filename.endswith(".partial"):
+                    continue
+                image_uris.append(os.path.relpath(os.path.join(folder, filename),
+                                                  staging_folder).replace(os.sep, "/"))
+
+        return image_uris
+
+    def reconcile(self) -> int:
+        """
+        Queues all staged images whose retry backoff has passed.
+
+        Returns:
+            int: number of staged images that are still pending
+        """
+        image_uris = self._get_staged_uris()
+        for image_uri in image_uris:
+            if self._retry_at.get(image_uri, 0) <= time.time():
+                self._enqueue(image_uri)
+
+        return len(image_uris)
+
+    def replicate_all(self) -> tuple:
+        """
+        Replicates all staged images synchronously, ignoring retry backoffs.
+
+        Returns:
+            tuple: number of replicated and number of failed images
+        """
+        results = [self.replicate(image_uri) for image_uri in self._get_staged_uris()]
+
+        return results.count(True), results.count(False)
+
+    def replicate(self, image_uri: str) -> bool:
+        """
+        Uploads a staged image to blob storage and removes it from staging.
+        Failed uploads are retried by the reconciler with exponential backoff.
+
+        Parameters:
+            image_uri: str
+                Storage key of the image.
+
+        Returns:
+            bool: whether the image is now stored in blob storage
+        """
+        from azure.core.exceptions import ResourceExistsError
+        from azure.storage.blob import ContentSettings
+
+        with self._lock:
+            self._queued.discard(image_uri)
+
+        image_data = self.get_staged_bytes(image_uri)
+        if image_data is None:
+            return True
+
+        extension = image_uri.rsplit(".", 1)[-1]
+        mimetype = next((mimetype for mimetype, ext in self.config["IMAGE_EXTENSIONS"].items()
+                         if ext == extension), None)
+        try:
+            try:
+                blob_client_registry.get_container_client(
+                    self.config["UPLOAD_FOLDER"]).upload_blob(
+                        image_uri, image_data, overwrite=False,
+                        content_settings=ContentSettings(content_type=mimetype),
+                        **blob_client_registry.get_transfer_options())
+            except ResourceExistsError:
+                pass
+        except Exception:
+            attempts = self._attempts.get(image_uri, 0) + 1
+            self._attempts[image_uri] = attempts
+            backoff = min(self.config["BLOB_REPLICATION_BACKOFF"] * 2 ** (attempts - 1),
+                          self.config["BLOB_REPLICATION_MAX_BACKOFF"])
+            self._retry_at[image_uri] = time.time() + backoff
+            logging.warning("Replicating image %s failed (attempt %s), retrying in %s s",
+                            image_uri, attempts, backoff, exc_info=True)
+            return False
+
+        # -- Image is readable from blob storage before it leaves the staging folder --
+        try:
+            os.remove(self._get_staging_path(image_uri))
+        except FileNotFoundError:
+            pass
+        self._attempts.pop(image_uri, None)
+        self._retry_at.pop(image_uri, None)
+
+        return True
+
+    def _ensure_worker(self) -> None:
+        """
+        Starts the background worker of the current process if it is not running.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive() \
+                    and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._worker = threading.Thread(target=self._run,
+                                            name="blob-replicator", daemon=True)
+            self._worker.start()
+
+    def _run(self) -> None:
+        """
+        Replicates queued images and reconciles the staging folder whenever the queue is idle.
+
+        Returns:
+            None
+        """
+        self.reconcile()
+        while True:
+            try:
+                image_uri = self._queue.get(
+                    timeout=self.config["BLOB_REPLICATION_INTERVAL"])
+            except queue.Empty:
+                self.reconcile()
+                continue
+
+            try:
+                self.replicate(image_uri)
+            except Exception:
+                logging.error("Blob replication failed", exc_info=True)
+
+
+blob_replicator = BlobReplicator()
+
+
+def _replicate_images_job(payload: dict) -> dict:
+    """
+    Job handler replicating all staged images to blob storage.
+
+    Returns:
+        dict: number of replicated and failed images
+    """
+    if not blob_replicator.enabled():
+        return {"replicated": 0, "failed": 0}
+
+    replicated, failed = blob_replicator.replicate_all()
+    return {"replicated": replicated, "failed": failed}
+
+
+job_queue.register("replicate_images", _replicate_images_job)
+
+
+class StorageBackend(ABC):
+    """
+    Interface of the storages images are kept in.
+    Images are addressed by their storage key (image_uri) and never change once written.
+    """
+
+    @abstractmethod
+    def write(self, image_uri: str, image_data: bytes, mimetype: str) -> None:
+        """
+        Stores an image unless an image with the same key is already stored.
+
+        Parameters:
+            image_uri: str
+                Storage key of the image.
+            image_data: bytes
+                The encoded image.
+            mimetype: str
+                Mimetype of the encoded image.
+
+        Returns:
+            None
+        """
+
+    @abstractmethod
+    def read(self, image_uri: str) -> bytes:
+        """
+        Returns the bytes of a stored image.
+        Raises FileNotFoundError if the image does not exist.
+
+        Parameters:
+            image_uri: str
+                Storage key of the image.
+
+        Returns:
+            bytes: the stored image
+        """
+
+    @abstractmethod
+    def delete(self, image_uri: str) -> None:
+        """
+        Removes a stored image.
+
+        Parameters:
+            image_uri: str
+                Storage key of the image.
+
+        Returns:
+            None
+        """
+
+    def get_local_path(self, image_uri: str) -> str:
+        """
+        Returns the path of the image on local disk, so it can be served
+        without passing its bytes through Python.
+
+        Parameters:
+            image_uri: str
+                Storage key of the image.
+
+        Returns:
+            str: path of the image
+            None: if the image is not available as local file
+        """
+        return None
+
+    def get_signed_url(self, image_uri: str, mimetype: str, expires_in: int,
+                       expires_before: float = None) -> str:
+        """
+        Returns a time-limited, read-only URL clients can fetch the image from directly.
+
+        Parameters:
+            image_uri: str
+                Storage key of the image.
+            mimetype: str
+                Mimetype of the image, returned as Content-Type.
+            expires_in: int
+                Lifetime of the URL in seconds.
+            expires_before: float (optional)
+                POSIX timestamp the URL has to expire by, e.g. the end of the session.
+
+        Returns:
+            str: signed URL of the image
+            None: if the backend cannot sign URLs for the image
+        """
+        return None
+
+
+class LocalStorageBackend(StorageBackend):
+    """
+    Stores images in a folder on the local filesystem.
+    """
+
+    def __init__(self, folder: str):
+        # -- Absolute, as send_file resolves relative paths against the app root --
+        self.folder = os.path.abspath(folder)
+
+    def _get_path(self, image_uri: str) -> str:
+        return os.path.join(self.folder, image_uri)
+
+    def write(self, image_uri: str, image_data: bytes, mimetype: str) -> None:
+        path = self._get_path(image_uri)
+        if not os.path.exists(path):
+            write_file_atomic(path, image_data)
+
+    def read(self, image_uri: str) -> bytes:
+        with open(self._get_path(image_uri), "rb") as fp:
+            return fp.read()
+
+    def delete(self, image_uri: str) -> None:
+        os.remove(self._get_path(image_uri))
+
+    def get_local_path(self, image_uri: str) -> str:
+        path = self._get_path(image_uri)
+        return path if os.path.isfile(path) else None
+
+
+class BlobStorageBackend(StorageBackend):
+    """
+    Stores images in a container of Azure blob storage.
+    In write-behind mode images are staged locally and replicated by the blob_replicator.
+    Signed URLs are cached per image and expiry bound and only regenerated shortly before
+    they expire, so clients can reuse cached images.
+    """
+    SIGNED_URL_CACHE_SIZE = 10_000
+
+    def __init__(self, container: str, signed_url_refresh: int = 0):
+        self.container = container
+        self.signed_url_refresh = signed_url_refresh
+        self._signed_urls = OrderedDict()
+        self._lock = threading.Lock()
+
+    def write(self, image_uri: str, image_data: bytes, mimetype: str) -> None:
+        if blob_replicator.enabled():
+            blob_replicator.stage(image_data, image_uri)
+            return
+
+        from azure.core.exceptions import ResourceExistsError
+        from azure.storage.blob import ContentSettings
+
+        try:
+            blob_client_registry.get_container_client(self.container).upload_blob(
+                image_uri, image_data, overwrite=False,
+                content_settings=ContentSettings(content_type=mimetype),
+                **blob_client_registry.get_transfer_options())
+        except ResourceExistsError:
+            pass
+
+    def read(self, image_uri: str) -> bytes:
+        # -- Images not yet replicated are served from the staging folder --
+        if blob_replicator.enabled():
+            image_data = blob_replicator.get_staged_bytes(image_uri)
+            if image_data is not None:
+                return image_data
+
+        from azure.core.exceptions import ResourceNotFoundError
+
+        try:
+            downloader = blob_client_registry.get_container_client(
+                self.container).download_blob(image_uri,
+                                              **blob_client_registry.get_transfer_options())
+            return downloader.readall()
+        except ResourceNotFoundError as e:
+            raise FileNotFoundError(image_uri) from e
+
+    def delete(self, image_uri: str) -> None:
+        blob_client_registry.get_container_client(self.container).delete_blob(image_uri)
+
+    def get_signed_url(self, image_uri: str, mimetype: str, expires_in: int,
+                       expires_before: float = None) -> str:
+        # -- Images not yet replicated only exist in the staging folder --
+        if blob_replicator.enabled() and blob_replicator.is_staged(image_uri):
+            return None
+
+        now = datetime.now(timezone.utc)
+        expires_at = now + timedelta(seconds=expires_in)
+        if expires_before is not None:
+            expires_at = min(expires_at, datetime.fromtimestamp(expires_before, timezone.utc))
+            if expires_at <= now:
+                return None
+
+        # -- URLs bounded by the end of a session are only reused for the same bound --
+        cache_key = (image_uri, expires_before)
+        with self._lock:
+            signed_url, cached_expires_at = self._signed_urls.get(cache_key, (None, None))
+            if signed_url \
+                    and (cached_expires_at - now).total_seconds() > self.signed_url_refresh:
+                self._signed_urls.move_to_end(cache_key)
+                return signed_url
+
+        service_client = blob_client_registry.get_service_client()
+        account_key = getattr(service_client.credential, "account_key", None)
+        if account_key is None:
+            return None
+
+        from azure.storage.blob import BlobSasPermissions, generate_blob_sas
+
+        sas_token = generate_blob_sas(
+            account_name=service_client.account_name,
+            container_name=self.container,
+            blob_name=image_uri,
+            account_key=account_key,
+            permission=BlobSasPermissions(read=True),
+            # -- Tolerate clock skew between app and storage --
+            start=now - timedelta(minutes=5),
+            expiry=expires_at,
+            content_type=mimetype,
+            cache_control=f"private, max-age={int((expires_at - now).total_seconds())}")
+        blob_url = blob_client_registry.get_container_client(
+            self.container).get_blob_client(image_uri).url
+        signed_url = f"{blob_url}?{sas_token}"
+
+        with self._lock:
+            self._signed_urls[cache_key] = (signed_url, expires_at)
+            self._signed_urls.move_to_end(cache_key)
+            if len(self._signed_urls) > self.SIGNED_URL_CACHE_SIZE:
+                self._signed_urls.popitem(last=False)
+
+        return signed_url
+
+
+class MemoryStorageBackend(StorageBackend):
+    """
+    Keeps images in a dict of the current process, used for testing and benchmarking.
+    """
+
+    def __init__(self):
+        self.images = {}
+        self._lock = threading.Lock()
+
+    def write(self, image_uri: str, image_data: bytes, mimetype: str) -> None:
+        with self._lock:
+            self.images.setdefault(image_uri, image_data)
+
+    def read(self, image_uri: str) -> bytes:
+        try:
+            return self.images[image_uri]
+        except KeyError as e:
+            raise FileNotFoundError(image_uri) from e
+
+    def delete(self, image_uri: str) -> None:
+        with self._lock:
+            self.images.pop(image_uri, None)
+
+
+class ImageStorage:
+    """
+    Holds the storage backend selected by the STORAGE_BACKEND setting:
+    "local" (UPLOAD_FOLDER on disk), "azure" (UPLOAD_FOLDER container) or "memory".
+    """
+    BACKENDS = {
+        "local": lambda config: LocalStorageBackend(config["UPLOAD_FOLDER"]),
+        "azure": lambda config: BlobStorageBackend(config["UPLOAD_FOLDER"],
+                                                   config["IMAGE_SIGNED_URL_REFRESH"]),
+        "memory": lambda config: MemoryStorageBackend()
+    }
+
+    def __init__(self):
+        self._backend = None
+
+    def init_app(self, app: Flask) -> None:
+        """
+        Creates the configured storage backend.
+
+        Returns:
+            None
+        """
+        backend_name = app.config["STORAGE_BACKEND"]
+        if backend_name not in self.BACKENDS:
+            raise ValueError(f"Unknown storage backend {backend_name}")
+        self._backend = self.BACKENDS[backend_name](app.config)
+
+    def get_backend(self) -> StorageBackend:
+        """
+        Returns the storage backend of the app.
+
+        Returns:
+            StorageBackend
+        """
+        if self._backend is None:
+            raise RuntimeError("Image storage is not initialized")
+        return self._backend
+
+
+image_storage = ImageStorage()
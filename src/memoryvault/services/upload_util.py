@@ -0,0 +1,293 @@
+"""
+Module containing utility classes for resumable chunked uploads.
+Large images are sent in chunks, so an interrupted upload continues at the last
+received offset instead of starting from zero. Partial uploads are kept in a local
+staging folder until the memory is created or they expire.
+"""
+import os
+import re
+import json
+import time
+import uuid
+import logging
+import threading
+from flask import Flask
+
+
+class UploadException(Exception):
+    """
+    Custom Exception for invalid chunked uploads.
+    """
+
+    def __init__(self, message: str, *args):
+        super().__init__(*args)
+        self.message = message
+
+    def get_message(self) -> str:
+        """
+        Returns error message.
+        """
+        return self.message
+
+
+class UploadNotFoundException(UploadException):
+    """
+    Custom Exception for chunked uploads that do not exist, expired or belong to another user.
+    """
+
+
+class UploadOffsetException(UploadException):
+    """
+    Custom Exception for chunks that do not continue at the current offset of the upload.
+    """
+
+    def __init__(self, message: str, offset: int, *args):
+        super().__init__(message, *args)
+        self.offset = offset
+
+
+class ChunkedUploads:
+    """
+    Stores chunked uploads in CHUNKED_UPLOAD_FOLDER. Every upload consists of
+    <upload_id>.json holding owner and total size and <upload_id>.part holding the bytes
+    received so far. Its size is the current offset, so uploads survive restarts.
+    Uploads without activity for CHUNKED_UPLOAD_EXPIRY seconds are garbage collected.
+    """
+    UPLOAD_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+    COPY_BUFFER_SIZE = 64 * 1024
+
+    def __init__(self):
+        self.folder = None
+        self.max_size = 0
+        self.chunk_size = 0
+        self.expiry = 0
+        self.gc_interval = 0
+        self._last_gc = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app: Flask) -> None:
+        """
+        Reads the upload settings from the app configuration.
+
+        Returns:
+            None
+        """
+        self.folder = app.config["CHUNKED_UPLOAD_FOLDER"]
+        self.max_size = app.config["CHUNKED_UPLOAD_MAX_SIZE"]
+        self.chunk_size = app.config["CHUNKED_UPLOAD_CHUNK_SIZE"]
+        self.expiry = app.config["CHUNKED_UPLOAD_EXPIRY"]
+        self.gc_interval = app.config["CHUNKED_UPLOAD_GC_INTERVAL"]
+
+    def _get_path(self, upload_id: str, extension: str) -> str:
+        """
+        Returns the path of a file of an upload.
+
+        Returns:
+            str
+        """
+        if not self.UPLOAD_ID_PATTERN.match(upload_id):
+            raise UploadNotFoundException("Upload does not exist.")
+        return os.path.join(self.folder, f"{upload_id}.{extension}")
+
+    def _load(self, upload_id: str, user_id: int) -> dict:
+        """
+        Loads the metadata of an upload and checks its owner.
+
+        Returns:
+            dict: containing "user_id", "size" and the current "offset"
+        """
+        try:
+            with open(self._get_path(upload_id, "json"), "r", encoding="utf-8") as fp:
+                upload = json.load(fp)
+            upload["offset"] = os.path.getsize(self._get_path(upload_id, "part"))
+        except (FileNotFoundError, ValueError) as e:
+            raise UploadNotFoundException("Upload does not exist.") from e
+
+        if upload["user_id"] != user_id:
+            raise UploadNotFoundException("Upload does not exist.")
+
+        return upload
+
+    def _get_status(self, upload_id: str, upload: dict) -> dict:
+        """
+        Returns the status of an upload sent to the client.
+
+        Returns:
+            dict
+        """
+        return {
+            "upload_id": upload_id,
+            "offset": upload["offset"],
+            "size": upload["size"],
+            "chunk_size": self.chunk_size,
+            "expires_in": self.expiry
+        }
+
+    def create(self, user_id: int, size: int) -> dict:
+        """
+        Creates a new empty upload.
+
+        Parameters:
+            user_id: int
+                Id of the user owning the upload.
+            size: int
+                Total size of the file in bytes.
+
+        Returns:
+            dict: status of the upload with keys "upload_id", "offset", "size",
+                  "chunk_size" and "expires_in"
+        """
+        if not isinstance(size, int) or size <= 0:
+            raise UploadException("Size of the upload is missing.")
+        if size > self.max_size:
+            raise UploadException("The uploaded image is too large.")
+
+        os.makedirs(self.folder, exist_ok=True)
+        self._collect_periodically()
+
+        upload_id = uuid.uuid4().hex
+        # -- Part file is created first, so metadata never exists without it --
+        open(self._get_path(upload_id, "part"), "wb").close()
+        with open(self._get_path(upload_id, "json"), "w", encoding="utf-8") as fp:
+            json.dump({"user_id": user_id, "size": size, "created_at": time.time()}, fp)
+
+        return self._get_status(upload_id, {"offset": 0, "size": size})
+
+    def get(self, upload_id: str, user_id: int) -> dict:
+        """
+        Returns the status of an upload, used by clients to resume at the current offset.
+
+        Parameters:
+            upload_id: str
+            user_id: int
+
+        Returns:
+            dict: status of the upload
+        """
+        return self._get_status(upload_id, self._load(upload_id, user_id))
+
+    def append(self, upload_id: str, user_id: int, offset: int, stream) -> dict:
+        """
+        Writes a chunk to an upload. The chunk has to start at the current offset.
+
+        Parameters:
+            upload_id: str
+            user_id: int
+            offset: int
+                Position of the chunk in the file.
+            stream:
+                File-like object the chunk is read from.
+
+        Returns:
+            dict: status of the upload
+        """
+        with self._lock:
+            upload = self._load(upload_id, user_id)
+            if offset != upload["offset"]:
+                raise UploadOffsetException("Chunk does not continue the upload.",
+                                            upload["offset"])
+
+            part_path = self._get_path(upload_id, "part")
+            with open(part_path, "r+b") as fp:
+                fp.seek(offset)
+                while True:
+                    data = stream.read(self.COPY_BUFFER_SIZE)
+                    if not data:
+                        break
+                    if fp.tell() + len(data) > upload["size"]:
+                        # -- Drop the whole chunk, the client resumes at the previous offset --
+                        fp.truncate(offset)
+                        raise UploadException("Chunk exceeds the size of the upload.")
+                    fp.write(data)
+                upload["offset"] = fp.tell()
+
+        return self._get_status(upload_id, upload)
+
+    def open_completed(self, upload_id: str, user_id: int):
+        """
+        Opens the file of a completely received upload.
+
+        Parameters:
+            upload_id: str
+            user_id: int
+
+        Returns:
+            file: opened in binary mode, has to be closed by the caller
+        """
+        upload = self._load(upload_id, user_id)
+        if upload["offset"] != upload["size"]:
+            raise UploadException("The image has not been uploaded completely.")
+
+        return open(self._get_path(upload_id, "part"), "rb")
+
+    def delete(self, upload_id: str) -> None:
+        """
+        Removes an upload.
+
+        Parameters:
+            upload_id: str
+
+        Returns:
+            None
+        """
+        for extension in ["json", "part"]:
+            try:
+                os.remove(self._get_path(upload_id, extension))
+            except FileNotFoundError:
+                pass
+
+    def collect_expired(self) -> int:
+        """
+        Removes all uploads without activity for CHUNKED_UPLOAD_EXPIRY seconds.
+
+        Returns:
+            int: number of removed uploads
+        """
+        if not os.path.isdir(self.folder):
+            return 0
+
+        removed = 0
+        expired_before = time.time() - self.expiry
+        for filename in os.listdir(self.folder):
+            upload_id, extension = os.path.splitext(filename)
+            if extension != ".part" or not self.UPLOAD_ID_PATTERN.match(upload_id):
+                continue
+            try:
+                if os.path.getmtime(os.path.join(self.folder, filename)) >= expired_before:
+                    continue
+            except FileNotFoundError:
+                continue
+            self.delete(upload_id)
+            removed += 1
+
+        # -- Metadata left behind by interrupted creates or deletes --
+        for filename in os.listdir(self.folder):
+            upload_id, extension = os.path.splitext(filename)
+            if extension == ".json" and self.UPLOAD_ID_PATTERN.match(upload_id) \
+                    and not os.path.exists(self._get_path(upload_id, "part")):
+                self.delete(upload_id)
+
+        if removed:
+            logging.info("Removed %s expired chunked uploads", removed)
+        return removed
+
+    def _collect_periodically(self) -> None:
+        """
+        Garbage collects expired uploads at most every CHUNKED_UPLOAD_GC_INTERVAL seconds.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if self._last_gc is not None \
+                    and time.monotonic() - self._last_gc < self.gc_interval:
+                return
+            self._last_gc = time.monotonic()
+
+        try:
+            self.collect_expired()
+        except OSError:
+            logging.warning("Collecting expired uploads failed", exc_info=True)
+
+
+chunked_uploads = ChunkedUploads()
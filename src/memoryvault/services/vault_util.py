@@ -2,11 +2,11 @@
 Module containing utility classes for vault management.
 """
 from abc import ABC
-import calendar
-from datetime import datetime, timedelta
-from dateutil.relativedelta import relativedelta
+from datetime import datetime
 
 from ..models import db, User, Vault, CollectionPeriodDurationEnum, Family
+from .period_util import get_period_calendar, get_formatted_periods
+from .stats_util import PeriodStatistics
 
 
 class VaultManagement(ABC):
@@ -103,31 +103,21 @@ class VaultManagement(ABC):
         start of the first collection period and the duration.
 
         Parameters:
-            user_id: int
-                id of the user owning this vault.
-            family_id: int
-                id of the family owning this vault
-            vault_id: int
-                unique identifier of vault instance
+            start_date: datetime.date
+                Start of the first collection period.
+            duration: CollectionPeriodDurationEnum
+                Duration of a collection period.
 
         Returns:
-            Vault
+            dict: containing "start_date" and "end_date" of the current period
         """
-        interval_months = duration.value
-
         today = datetime.today().date()
-
-        while start_date + relativedelta(months=interval_months) <= today:
-            start_date += relativedelta(months=interval_months)
-
-        end_period_date = start_date + \
-            relativedelta(months=interval_months) - timedelta(days=1)
-        last_day = calendar.monthrange(
-            end_period_date.year, end_period_date.month)[1]
+        start_period_date, end_period_date = get_period_calendar(
+            start_date, duration.value).get_current_period(today)
 
         return {
-            "start_date": start_date,
-            "end_date": end_period_date.replace(day=last_day)
+            "start_date": start_period_date,
+            "end_date": end_period_date
         }
 
     @staticmethod
@@ -166,7 +156,8 @@ class VaultManagement(ABC):
     @staticmethod
     def get_all_periods(user_id: int = None,
                         vault_id: int = None,
-                        family_id: int = None) -> list:
+                        family_id: int = None,
+                        period_stats: dict = None) -> list:
         """
         Returns list containing the start and end dates of all Collection Periods since
         the initial Collection Period.
@@ -178,36 +169,51 @@ class VaultManagement(ABC):
                 id of the family owning this vault
             vault_id: int
                 unique identifier of vault instance
+            period_stats: dict (optional)
+                Statistics of the vault as returned by get_period_stats for this vault.
+                If given, they are added to the periods.
 
         Returns:
             list: containing dicts with keys "period_start" and "period_end"
+                  and with period_stats "number_memories", "number_images",
+                  "size_bytes" and "uploaders"
         """
         vault = VaultManagement._get_vault(
             user_id=user_id, vault_id=vault_id, family_id=family_id)
         vault_info = vault.json_package()
 
-        interval_monts = vault_info["period_duration"].value
-        periods = []
-
         today = datetime.today().date()
 
-        current_start = vault_info["period_initial_start"]
-
-        while current_start <= today:
-            current_end = current_start + \
-                relativedelta(months=interval_monts) - timedelta(days=1)
-            last_day = calendar.monthrange(
-                current_end.year, current_end.month)[1]
-            current_end = current_end.replace(day=last_day)
-            periods.append({
-                "period_start": current_start.strftime("%A, %b %d, %Y"),
-                "period_end": current_end.strftime("%A, %b %d, %Y")
-            })
-            current_start = current_start + \
-                relativedelta(months=interval_monts)
+        periods = [{"period_start": period_start, "period_end": period_end}
+                   for period_start, period_end in get_formatted_periods(
+                       vault_info["period_initial_start"], vault_info["period_duration"].value,
+                       today)]
+        if period_stats is not None:
+            for index, period in enumerate(periods):
+                period.update(period_stats.get(index, {
+                    "number_memories": 0,
+                    "number_images": 0,
+                    "size_bytes": 0,
+                    "uploaders": []
+                }))
 
         return periods
 
+    @staticmethod
+    def get_period_stats(vault_ids: list) -> dict:
+        """
+        Returns the statistics of all Collection Periods of several vaults with a single query.
+
+        Parameters:
+            vault_ids: list
+                unique identifiers of vault instances
+
+        Returns:
+            dict: mapping vault id to a dict mapping the 0-based period index to a dict with
+                  keys "number_memories", "number_images", "size_bytes" and "uploaders"
+        """
+        return PeriodStatistics.get_stats(vault_ids)
+
     @staticmethod
     def get_vault_info(user_id: int = None,
                        vault_id: int = None,
@@ -254,12 +260,11 @@ class VaultManagement(ABC):
         """
         vault = VaultManagement._get_vault(
             user_id=user_id, vault_id=vault_id, family_id=family_id)
-        vault_info = VaultManagement._get_vault_info(vault=vault)
 
-        timespan_begin = datetime.strptime(
-            vault_info["curr_period_start"], "%A, %b %d, %Y").date()
-        timespan_end = datetime.strptime(
-            vault_info["curr_period_end"], "%A, %b %d, %Y").date()
+        # -- Counts are read from the period statistics instead of the memories --
+        today = datetime.today().date()
+        period_index = get_period_calendar(vault.period_initial_start,
+                                           vault.period_duration.value).get_index(today)
 
-        return vault.get_number_of_memories_in_timespan(timespan_begin=timespan_begin,
-                                                        timespan_end=timespan_end)
+        return PeriodStatistics.get_number_memories(vault_id=vault.id,
+                                                    period_index=max(period_index, 0))
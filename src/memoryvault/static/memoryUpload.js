@@ -50,6 +50,153 @@ document.addEventListener("DOMContentLoaded", async function () {
         previewImg.style.display = 'none';
     });
 
+    // --------------- Code for resumable chunked image uploads ---------------
+    const memoryForm = document.getElementById("memory-form");
+    const uploadIdInput = document.getElementById("upload-id");
+    const uploadProgress = document.getElementById("uploadProgress");
+    const maxAttempts = 5;
+
+    /**
+     * Waits before retrying a failed request.
+     * @param {number} attempt - Number of the failed attempt
+     * @returns {Promise<void>}
+     */
+    const backoff = attempt => new Promise(resolve => setTimeout(resolve, 1000 * 2 ** attempt));
+
+    /**
+     * Returns the upload status of a file, resuming a previously interrupted upload if possible.
+     * @param {File} file - The file to upload.
+     * @returns {Promise<object>} - Status with upload_id, offset, size and chunk_size
+     */
+    const getUpload = async function(file) {
+        const fileKey = `upload:${file.name}:${file.size}:${file.lastModified}`;
+        const uploadId = localStorage.getItem(fileKey);
+        if (uploadId) {
+            const response = await fetch(`${memoryForm.dataset.uploadUrl}/${uploadId}`);
+            if (response.ok) {
+                return {...await response.json(), fileKey: fileKey};
+            }
+            localStorage.removeItem(fileKey);
+        }
+
+        const response = await fetch(memoryForm.dataset.uploadUrl, {
+            method: "POST",
+            headers: {"Content-Type": "application/json"},
+            body: JSON.stringify({size: file.size})
+        });
+        const upload = await response.json();
+        if (!response.ok) {
+            throw new Error(upload.error);
+        }
+        localStorage.setItem(fileKey, upload.upload_id);
+        return {...upload, fileKey: fileKey};
+    };
+
+    /**
+     * Sends a file in chunks. Failed chunks are retried with backoff at the offset the server received.
+     * @param {File} file - The file to upload.
+     * @returns {Promise<object>} - Status of the completed upload
+     */
+    const uploadInChunks = async function(file) {
+        const upload = await getUpload(file);
+        let offset = upload.offset;
+        let attempt = 0;
+
+        while (offset < upload.size) {
+            uploadProgress.textContent = `Uploading image ${Math.floor(offset / upload.size * 100)} %`;
+            try {
+                const response = await fetch(`${memoryForm.dataset.uploadUrl}/${upload.upload_id}`, {
+                    method: "PUT",
+                    headers: {"Upload-Offset": offset, "Content-Type": "application/octet-stream"},
+                    body: file.slice(offset, offset + upload.chunk_size)
+                });
+                const status = await response.json().catch(() => ({}));
+                if (response.ok || response.status === 409) {
+                    offset = status.offset;
+                    attempt = 0;
+                    continue;
+                }
+                if (response.status < 500) {
+                    throw new Error(status.error);
+                }
+            } catch (error) {
+                // Only network errors are retried
+                if (!(error instanceof TypeError)) {
+                    throw error;
+                }
+            }
+
+            if (++attempt >= maxAttempts) {
+                throw new Error("The connection to the server was lost.");
+            }
+            await backoff(attempt);
+            // Continue at the offset the server has actually received
+            try {
+                const response = await fetch(`${memoryForm.dataset.uploadUrl}/${upload.upload_id}`);
+                if (response.ok) {
+                    offset = (await response.json()).offset;
+                }
+            } catch (error) {
+                // Still offline, the next PUT is retried with backoff
+            }
+        }
+        uploadProgress.textContent = "";
+        return upload;
+    };
+
+    memoryForm.addEventListener("submit", async function(e) {
+        const file = imageUpload.files[0];
+        if (!file || uploadIdInput.value) {
+            return;
+        }
+        e.preventDefault();
+
+        try {
+            const upload = await uploadInChunks(file);
+            uploadIdInput.value = upload.upload_id;
+            localStorage.removeItem(upload.fileKey);
+            // Image is already on the server, only the form fields are posted
+            imageUpload.disabled = true;
+            memoryForm.submit();
+        } catch (error) {
+            uploadProgress.textContent = "";
+            alert(`Image could not be uploaded, press upload again to resume. ${error.message}`);
+        }
+    });
+
+    // --------------- Code for polling the background processing of the image ---------------
+    const jobStatus = document.getElementById("jobStatus");
+    const jobPollInterval = 2000;
+
+    /**
+     * Polls the job processing the uploaded image until it is done or failed.
+     */
+    const pollJobStatus = async function() {
+        try {
+            const response = await fetch(jobStatus.dataset.jobUrl, {credentials: "same-origin"});
+            if (response.ok) {
+                const job = await response.json();
+                if (job.status === "done") {
+                    jobStatus.className = "alert alert-success";
+                    jobStatus.textContent = "Memory was uploaded successfully.";
+                    return;
+                }
+                if (job.status === "failed") {
+                    jobStatus.className = "alert alert-warning";
+                    jobStatus.textContent = `Image of the memory could not be processed. ${job.error || ""}`;
+                    return;
+                }
+            }
+        } catch (error) {
+            // Network errors are retried with the next poll
+        }
+        setTimeout(pollJobStatus, jobPollInterval);
+    };
+
+    if (jobStatus) {
+        setTimeout(pollJobStatus, jobPollInterval);
+    }
+
     // --------------- Code for loading the map and provide interaction ---------------
     const map = L.map('map').setView([51.00399384674889, 10.296337678675117], 5);
     const latitude = document.getElementById("latitude");
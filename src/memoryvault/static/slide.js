@@ -1,31 +1,231 @@
 document.addEventListener("DOMContentLoaded", async function() {
 
+    const slideElement = document.getElementById("slide");
+    const slidesUrl = slideElement.dataset.slidesUrl;
+    const numberMemories = parseInt(slideElement.dataset.numberMemories);
+    const windowSize = parseInt(slideElement.dataset.windowSize);
+    const backButton = document.getElementById("slide-back");
+    const nextButton = document.getElementById("slide-next");
+
+    // Slides already fetched from the server, by 1-based index
+    const slides = new Map();
+    // Windows currently fetched, by start index
+    const pendingWindows = new Map();
+    let currentSlide = JSON.parse(document.getElementById("slide-data").textContent);
+    slides.set(currentSlide.index, currentSlide);
+
     // --------------- Code for loading and displaying the map ---------------
-    if (typeof latitude !== 'undefined' && typeof longitude !== 'undefined'){
-        // Load map
-        const map = L.map('map').setView([latitude, longitude], 16);
-
-        L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', {
-            maxZoom: 19,
-            attribution: '&copy; <a href="http://www.openstreetmap.org/copyright">OpenStreetMap</a>'
-        }).addTo(map);
-
-        // Set marker
-        L.marker([latitude, longitude]).addTo(map);
-
-        // Deactivate user interaction
-        map.zoomControl.remove();
-        map.dragging.disable();
-        map.touchZoom.disable();
-        map.doubleClickZoom.disable();
-        map.scrollWheelZoom.disable();
-        map.keyboard.disable();
-
-        if (map.tap) map.tab.disable();
-
-    } else {
-        // If no coordinates are given: remove map element
-        const map = document.getElementById('map');
-        map.remove();
-    }
-});
\ No newline at end of file
+    let map;
+    let marker;
+
+    /**
+     * Shows the location of a slide on a map without user interaction.
+     * @param {Object} slide - slide as returned by the slides endpoint
+     */
+    const showLocation = function(slide) {
+        const location = document.getElementById("slide-location");
+        if (!slide.latitude || !slide.longitude) {
+            location.classList.add("d-none");
+            return;
+        }
+        location.classList.remove("d-none");
+        document.getElementById("slide-coordinates").textContent = `📍 ${slide.latitude}, ${slide.longitude}`;
+
+        if (!map) {
+            // Load map
+            map = L.map('map').setView([slide.latitude, slide.longitude], 16);
+
+            L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', {
+                maxZoom: 19,
+                attribution: '&copy; <a href="http://www.openstreetmap.org/copyright">OpenStreetMap</a>'
+            }).addTo(map);
+
+            // Set marker
+            marker = L.marker([slide.latitude, slide.longitude]).addTo(map);
+
+            // Deactivate user interaction
+            map.zoomControl.remove();
+            map.dragging.disable();
+            map.touchZoom.disable();
+            map.doubleClickZoom.disable();
+            map.scrollWheelZoom.disable();
+            map.keyboard.disable();
+
+            if (map.tap) map.tap.disable();
+        } else {
+            map.invalidateSize();
+            map.setView([slide.latitude, slide.longitude], 16);
+            marker.setLatLng([slide.latitude, slide.longitude]);
+        }
+    };
+
+    // --------------- Code for navigating through the slideshow ---------------
+
+    /**
+     * Fetches a window of slides starting at an index.
+     * @param {number} start - 1-based index of the first slide
+     * @returns {Promise<void>} - resolves once the slides are stored
+     */
+    const loadWindow = function(start) {
+        if (!pendingWindows.has(start)) {
+            const request = fetch(`${slidesUrl}?start=${start}&count=${windowSize}`, {credentials: "same-origin"})
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error(`Loading slides failed with status ${response.status}`);
+                    }
+                    return response.json();
+                })
+                .then(data => {
+                    data.slides.forEach(slide => slides.set(slide.index, slide));
+                })
+                .finally(() => pendingWindows.delete(start));
+            pendingWindows.set(start, request);
+        }
+        return pendingWindows.get(start);
+    };
+
+    /**
+     * Returns a slide, fetching the window around it if necessary.
+     * @param {number} index - 1-based index of the slide
+     * @returns {Promise<Object>} - the slide
+     */
+    const getSlide = async function(index) {
+        if (!slides.has(index)) {
+            // Going backwards fetches the slides before the index
+            const start = index < currentSlide.index ? Math.max(1, index - windowSize + 1) : index;
+            await loadWindow(start);
+        }
+        if (!slides.has(index)) {
+            throw new Error("Slide does not exist");
+        }
+        return slides.get(index);
+    };
+
+    /**
+     * Lets the browser load the image of a slide before it is shown.
+     * @param {Object} slide - slide as returned by the slides endpoint
+     */
+    const preloadImage = function(slide) {
+        if (!slide || !slide.image_url || slide.preloaded) {
+            return;
+        }
+        // Images of detached elements are loaded as well, the element is kept until shown
+        const picture = document.createElement("picture");
+        picture.innerHTML = renderPicture(slide);
+        slide.preloaded = picture;
+    };
+
+    /**
+     * Builds the picture sources of a slide.
+     * @param {Object} slide - slide as returned by the slides endpoint
+     * @returns {string} - HTML of the picture element content
+     */
+    const renderPicture = function(slide) {
+        const sources = (slide.image_sources || []).map(source => {
+            const element = document.createElement("source");
+            element.type = source.type;
+            element.srcset = source.srcset;
+            element.sizes = slide.image_sizes;
+            return element.outerHTML;
+        });
+        const img = document.createElement("img");
+        img.className = "img-fluid rounded shadow";
+        img.alt = "Erinnerungsbild";
+        if (slide.image_srcset) {
+            img.srcset = slide.image_srcset;
+            img.sizes = slide.image_sizes;
+        }
+        img.src = slide.image_url;
+        return sources.join("") + img.outerHTML;
+    };
+
+    /**
+     * Displays a slide and updates the navigation.
+     * @param {Object} slide - slide as returned by the slides endpoint
+     */
+    const showSlide = function(slide) {
+        currentSlide = slide;
+        document.getElementById("slide-index").textContent = slide.index;
+        document.getElementById("slide-date").textContent = slide.date;
+        document.getElementById("slide-description").textContent = slide.description;
+
+        const image = document.getElementById("slide-image");
+        if (slide.image_url) {
+            image.querySelector("picture").innerHTML = renderPicture(slide);
+            image.classList.remove("d-none");
+        } else {
+            image.classList.add("d-none");
+        }
+        showLocation(slide);
+
+        document.getElementById("slide-back-number").value = slide.index - 1;
+        document.getElementById("slide-next-number").value = slide.index + 1;
+        backButton.disabled = slide.index <= 1;
+        nextButton.disabled = slide.index >= numberMemories;
+    };
+
+    /**
+     * Fetches the window after the current slide ahead of time and preloads the next image.
+     */
+    const loadAhead = function() {
+        const nextIndex = currentSlide.index + 1;
+        if (nextIndex > numberMemories) {
+            return;
+        }
+        // Fetch the following window before the last fetched slide is reached
+        let firstMissing = nextIndex;
+        while (slides.has(firstMissing) && firstMissing < nextIndex + Math.ceil(windowSize / 2)) {
+            firstMissing++;
+        }
+        if (!slides.has(firstMissing) && firstMissing <= numberMemories) {
+            loadWindow(firstMissing)
+                .then(() => preloadImage(slides.get(nextIndex)))
+                .catch(() => {});
+        }
+        preloadImage(slides.get(nextIndex));
+    };
+
+    /**
+     * Navigates to a slide without reloading the page.
+     * Falls back to loading the page, e.g. when the slideshow expired.
+     * @param {number} index - 1-based index of the slide
+     * @param {boolean} pushHistory - whether a history entry is added
+     */
+    const navigate = async function(index, pushHistory = true) {
+        index = Math.min(Math.max(index, 1), numberMemories);
+        try {
+            const slide = await getSlide(index);
+            showSlide(slide);
+            if (pushHistory) {
+                history.pushState({index: index}, "", `?number=${index}`);
+            }
+            loadAhead();
+        } catch (error) {
+            window.location.search = `?number=${index}`;
+        }
+    };
+
+    backButton.addEventListener("click", function(e) {
+        e.preventDefault();
+        navigate(currentSlide.index - 1);
+    });
+    nextButton.addEventListener("click", function(e) {
+        e.preventDefault();
+        navigate(currentSlide.index + 1);
+    });
+    document.addEventListener("keydown", function(e) {
+        if (e.key === "ArrowLeft" && !backButton.disabled) {
+            navigate(currentSlide.index - 1);
+        } else if (e.key === "ArrowRight" && !nextButton.disabled) {
+            navigate(currentSlide.index + 1);
+        }
+    });
+    window.addEventListener("popstate", function(e) {
+        const index = e.state ? e.state.index : parseInt(new URLSearchParams(window.location.search).get("number") || "1");
+        navigate(index, false);
+    });
+
+    history.replaceState({index: currentSlide.index}, "", `?number=${currentSlide.index}`);
+    showLocation(currentSlide);
+    loadAhead();
+});
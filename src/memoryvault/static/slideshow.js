@@ -14,6 +14,9 @@ document.addEventListener("DOMContentLoaded", async function() {
             let option = document.createElement('option');
             option.value = element["period_start"] + "-" + element["period_end"];
             option.textContent = element["period_start"] + " - " + element["period_end"];
+            if (element["number_memories"] !== undefined) {
+                option.textContent += ` (${element["number_memories"]} memories)`;
+            }
             periodSelect.appendChild(option);
         });
     }
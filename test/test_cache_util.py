@@ -0,0 +1,91 @@
+import time
+import logging
+from unittest.mock import MagicMock
+
+from src.memoryvault.services.cache_util import ImageCache
+
+
+def _create_cache(max_bytes: int = 10, disk_folder: str = None, disk_max_bytes: int = 10,
+                  negative_ttl: float = 60, metrics_interval: float = 0) -> ImageCache:
+    app = MagicMock()
+    app.config = {
+        "IMAGE_MEMORY_CACHE_BYTES": max_bytes,
+        "IMAGE_CACHE_MAX_ITEM_BYTES": 8,
+        "IMAGE_DISK_CACHE_FOLDER": disk_folder,
+        "IMAGE_DISK_CACHE_BYTES": disk_max_bytes,
+        "IMAGE_NEGATIVE_CACHE_TTL": negative_ttl,
+        "IMAGE_CACHE_METRICS_INTERVAL": metrics_interval
+    }
+    cache = ImageCache()
+    cache.init_app(app)
+    return cache
+
+
+def test_memory_tier_lru_eviction():
+    """
+    Tests that the least recently used images are evicted once the byte limit is exceeded.
+    """
+    cache = _create_cache(max_bytes=10)
+    cache.put("a.jpg", b"aaaa")
+    cache.put("b.jpg", b"bbbb")
+    assert cache.get("a.jpg") == b"aaaa"
+    cache.put("c.jpg", b"cccc")
+
+    assert cache.get("b.jpg") is None
+    assert cache.get("a.jpg") == b"aaaa"
+    assert cache.get("c.jpg") == b"cccc"
+
+    # -- Images larger than the item limit are not cached --
+    cache.put("d.jpg", b"d" * 9)
+    assert cache.get("d.jpg") is None
+
+    metrics = cache.get_metrics()
+    assert metrics["hits"] == 3
+    assert metrics["misses"] == 2
+    assert metrics["evictions"] == 1
+    assert metrics["bytes"] == 8
+
+
+def test_disk_tier(tmp_path):
+    """
+    Tests that images evicted from memory are still served from the disk tier.
+    """
+    cache = _create_cache(max_bytes=4, disk_folder=str(tmp_path), disk_max_bytes=100)
+    cache.put("ab/cd/a.jpg", b"aaaa")
+    cache.put("ab/cd/b.jpg", b"bbbb")
+
+    assert cache.get("ab/cd/a.jpg") == b"aaaa"
+    assert cache.get_metrics()["disk_hits"] == 1
+
+    # -- Disk tier survives restarts --
+    assert _create_cache(disk_folder=str(tmp_path)).get_metrics()["disk_bytes"] == 8
+
+
+def test_negative_cache():
+    """
+    Tests that missing images are remembered until the negative TTL expired.
+    """
+    cache = _create_cache(negative_ttl=0.05)
+    assert not cache.is_missing("a.jpg")
+    cache.put_missing("a.jpg")
+    assert cache.is_missing("a.jpg")
+
+    time.sleep(0.06)
+    assert not cache.is_missing("a.jpg")
+    assert cache.get_metrics()["negative_hits"] == 1
+
+
+def test_metrics_logged(caplog):
+    """
+    Tests that the metrics are logged once the interval passed.
+    """
+    cache = _create_cache(metrics_interval=60)
+    cache.put("a.jpg", b"aaaa")
+
+    with caplog.at_level(logging.INFO):
+        cache.get("a.jpg")
+        assert "Image cache:" not in caplog.text
+
+        cache._last_metrics_log -= 60
+        cache.get("b.jpg")
+    assert "Image cache: 1 memory hits, 0 disk hits, 0 misses" in caplog.text
@@ -0,0 +1,145 @@
+import io
+import time
+import logging
+import pytest
+from unittest.mock import MagicMock
+from PIL import Image
+
+from src.memoryvault.services.image_util import ImageExecutor, ImageProcessingException, \
+    process_image, validate_image_header
+
+JPEG_ENCODER = {"image/jpeg": {"format": "JPEG"}}
+
+
+def _create_app_mock(workers: int, queue_size: int, timeout: float,
+                     metrics_interval: float = 0):
+    app = MagicMock()
+    app.config = {
+        "IMAGE_PROCESSING_WORKERS": workers,
+        "IMAGE_PROCESSING_QUEUE_SIZE": queue_size,
+        "IMAGE_PROCESSING_TIMEOUT": timeout,
+        "IMAGE_PROCESSING_METRICS_INTERVAL": metrics_interval
+    }
+    return app
+
+
+def _create_jpeg(path, size: tuple, mode: str = "RGB", image_format: str = "JPEG") -> str:
+    Image.new(mode, size).save(path, format=image_format)
+    return str(path)
+
+
+def test_validate_image_header(tmp_path):
+    """
+    Tests rejecting unsupported files, formats and images with too many pixels.
+    """
+    image_path = _create_jpeg(tmp_path / "image.jpg", (400, 300))
+    assert validate_image_header(image_path, ("JPEG",), max_pixels=120_000) == (400, 300)
+
+    with pytest.raises(ImageProcessingException):
+        validate_image_header(image_path, ("JPEG",), max_pixels=100_000)
+    with pytest.raises(ImageProcessingException):
+        validate_image_header(image_path, ("PNG",), max_pixels=120_000)
+
+    text_path = tmp_path / "image.txt"
+    text_path.write_text("no image")
+    with pytest.raises(ImageProcessingException):
+        validate_image_header(str(text_path), ("JPEG",), max_pixels=120_000)
+
+
+def test_process_image_draft_decoding(tmp_path):
+    """
+    Tests that large JPEGs are decoded at reduced scale and transparent images are converted.
+    """
+    results = process_image(_create_jpeg(tmp_path / "large.jpg", (4000, 2000)), [("full", (1000, 1000))], JPEG_ENCODER)
+    assert (results[0]["width"], results[0]["height"]) == (1000, 500)
+
+    results = process_image(_create_jpeg(tmp_path / "alpha.png", (100, 100), "RGBA", "PNG"),
+                            [("full", (50, 50))], JPEG_ENCODER)
+    assert Image.open(io.BytesIO(results[0]["data"])).mode == "RGB"
+
+
+def test_process_image_renditions(tmp_path):
+    """
+    Tests that all renditions are encoded and renditions not smaller than the previous are skipped.
+    """
+    results = process_image(_create_jpeg(tmp_path / "image.jpg", (600, 300)),
+                            [("full", (1024, 1024)), ("medium", (640, 640)), ("thumb", (160, 160))],
+                            JPEG_ENCODER)
+
+    assert [result["rendition"] for result in results] == ["full", "thumb"]
+    assert (results[1]["width"], results[1]["height"]) == (160, 80)
+    assert Image.open(io.BytesIO(results[1]["data"])).format == "JPEG"
+
+
+def test_process_image_formats(tmp_path):
+    """
+    Tests encoding every rendition in all configured formats and skipping unknown formats.
+    """
+    encoders = {"image/jpeg": {"format": "JPEG", "progressive": True},
+                "image/webp": {"format": "WEBP", "quality": 80},
+                "image/unknown": {"format": "UNKNOWN"}}
+    results = process_image(_create_jpeg(tmp_path / "image.jpg", (100, 100)),
+                            [("full", (50, 50))], encoders)
+
+    assert [result["mimetype"] for result in results] == ["image/jpeg", "image/webp"]
+    assert Image.open(io.BytesIO(results[1]["data"])).format == "WEBP"
+
+
+def test_executor_in_process(tmp_path):
+    """
+    Tests the in-process fallback and the collected metrics.
+    """
+    executor = ImageExecutor()
+    executor.init_app(_create_app_mock(workers=0, queue_size=1, timeout=1))
+
+    results = executor.submit(process_image, _create_jpeg(tmp_path / "image.jpg", (100, 100)),
+                               [("full", (50, 50))], JPEG_ENCODER)
+
+    assert results[0]["width"] == 50
+    metrics = executor.get_metrics()
+    assert metrics["queue_depth"] == 0
+    assert metrics["submitted"] == 1
+
+
+def test_executor_logs_metrics(tmp_path, caplog):
+    """
+    Tests that the metrics are logged once the interval passed.
+    """
+    executor = ImageExecutor()
+    executor.init_app(_create_app_mock(workers=0, queue_size=1, timeout=1, metrics_interval=60))
+    image_path = _create_jpeg(tmp_path / "image.jpg", (100, 100))
+
+    with caplog.at_level(logging.INFO):
+        executor.submit(process_image, image_path, [("full", (50, 50))], JPEG_ENCODER)
+        assert "Image processing:" not in caplog.text
+
+        executor._last_metrics_log -= 60
+        executor.submit(process_image, image_path, [("full", (50, 50))], JPEG_ENCODER)
+    assert "Image processing: 0 in queue, 2 submitted, 0 rejected" in caplog.text
+
+
+def test_executor_process_pool(tmp_path):
+    """
+    Tests processing an image in a worker process.
+    """
+    executor = ImageExecutor()
+    executor.init_app(_create_app_mock(workers=1, queue_size=1, timeout=30))
+
+    results = executor.submit(process_image, _create_jpeg(tmp_path / "image.jpg", (100, 100)),
+                               [("full", (50, 50))], JPEG_ENCODER)
+
+    assert results[0]["width"] == 50
+
+
+def test_executor_rejects_when_queue_full():
+    """
+    Tests that submissions are rejected once all queue slots are taken.
+    """
+    executor = ImageExecutor()
+    executor.init_app(_create_app_mock(workers=0, queue_size=1, timeout=0.01))
+    executor._slots.acquire()
+
+    with pytest.raises(ImageProcessingException):
+        executor.submit(time.sleep, 0)
+
+    assert executor.get_metrics()["rejected"] == 1
@@ -0,0 +1,128 @@
+from datetime import timedelta
+import pytest
+from flask import Flask
+
+from src.memoryvault.models import db, Job
+from src.memoryvault.services.job_util import JobQueue, JobException, _utcnow
+
+
+@pytest.fixture
+def queue():
+    app = Flask(__name__)
+    app.config.update({
+        "SQLALCHEMY_DATABASE_URI": "sqlite://",
+        "JOB_EMBEDDED_WORKERS": 0,
+        "JOB_POLL_INTERVAL": 0,
+        "JOB_VISIBILITY_TIMEOUT": 60,
+        "JOB_MAX_ATTEMPTS": 3,
+        "JOB_RETRY_BACKOFF": 10,
+        "JOB_RETRY_MAX_BACKOFF": 15
+    })
+    db.init_app(app)
+
+    job_queue = JobQueue()
+    job_queue.init_app(app)
+    with app.app_context():
+        Job.__table__.create(db.engine)
+        yield job_queue
+
+
+def test_run_job_by_priority(queue):
+    """
+    Tests that due jobs are run by priority and their result is recorded.
+    """
+    calls = []
+    queue.register("echo", lambda payload: calls.append(payload["value"]) or payload["value"])
+
+    low = queue.enqueue("echo", {"value": "low"})
+    high = queue.enqueue("echo", {"value": "high"}, priority=10)
+    queue.enqueue("echo", {"value": "later"}, priority=20, delay=60)
+
+    assert queue.run_once()
+    assert queue.run_once()
+    assert not queue.run_once()
+
+    assert calls == ["high", "low"]
+    assert queue.get_job(high.id)["status"] == "done"
+    assert queue.get_job(low.id)["result"] == "low"
+    assert queue.get_job(low.id)["payload"] == {"value": "low"}
+    assert queue.get_job(-1) is None
+
+    with pytest.raises(ValueError):
+        queue.enqueue("unknown", {})
+
+
+def test_retry_with_backoff(queue):
+    """
+    Tests that failing jobs are retried with exponential backoff until max attempts are used.
+    """
+    def fail(payload):
+        raise OSError("storage unavailable")
+
+    queue.register("fail", fail)
+    job_id = queue.enqueue("fail", {}).id
+
+    before = _utcnow()
+    assert queue.run_once()
+    job = db.session.get(Job, job_id)
+    assert job.status == "queued"
+    assert job.attempts == 1
+    assert "storage unavailable" in job.last_error
+    assert job.run_at >= before + timedelta(seconds=10)
+    # -- Job is not due until its backoff passed --
+    assert not queue.run_once()
+
+    for attempt in range(2, 4):
+        job = db.session.get(Job, job_id)
+        job.run_at = _utcnow()
+        db.session.commit()
+        assert queue.run_once()
+
+    job = db.session.get(Job, job_id)
+    assert job.status == "failed"
+    assert job.attempts == 3
+
+
+def test_job_exception_is_not_retried(queue):
+    """
+    Tests that a JobException fails the job immediately.
+    """
+    def reject(payload):
+        raise JobException("Image is invalid.")
+
+    queue.register("reject", reject)
+    job_id = queue.enqueue("reject", {}).id
+
+    assert queue.run_once()
+    job = queue.get_job(job_id)
+    assert job["status"] == "failed"
+    assert job["attempts"] == 1
+    assert job["last_error"] == "Image is invalid."
+
+
+def test_reclaim_abandoned_job(queue):
+    """
+    Tests that running jobs are claimed again after the visibility timeout and that
+    the abandoned worker cannot overwrite the result.
+    """
+    queue.register("echo", lambda payload: "done")
+    job_id = queue.enqueue("echo", {}).id
+
+    abandoned = queue.claim()
+    assert abandoned.id == job_id
+    assert queue.claim() is None
+
+    # -- Worker crashed, the visibility timeout passes --
+    abandoned.locked_until = _utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    abandoned_attempt = abandoned.attempts
+
+    reclaimed = queue.claim()
+    assert reclaimed.id == job_id
+    assert reclaimed.attempts == 2
+
+    queue._finish(reclaimed, abandoned_attempt, status="failed")
+    assert queue.get_job(job_id)["status"] == "running"
+
+    assert queue.run_job(reclaimed)
+    assert queue.get_job(job_id)["status"] == "done"
@@ -1,4 +1,7 @@
+import io
+import json
 import pytest
+from datetime import datetime
 from unittest.mock import patch
 
 
@@ -181,3 +184,321 @@ def test_exception_handeling(app_client):
         assert res.status_code == 200
         html = res.get_data(as_text=True)
         assert "Please contact an admin to get furhter insights into this error." in html
+
+
+# ------------------- /memory/<id>/image -------------------
+
+
+def test_get_image_not_logged_in(app_client):
+    """
+    Tests that images are not served without a login.
+    """
+    app, client = app_client
+
+    res = client.get("/memory/1/image")
+    assert res.status_code == 401
+
+
+def test_get_image_foreign_vault(app_client):
+    """
+    Tests that images of vaults the user has no access to are not served.
+    """
+    app, client = app_client
+
+    with client.session_transaction() as session:
+        session["user_id"] = 1
+        session["vault_info"] = {"vault_id": 1}
+
+    fake_memory = {"id": 1, "image_uri": "test.jpg", "vault_id": 2,
+                   "created_at": datetime(2025, 8, 1), "images": {}}
+    with patch("src.memoryvault.routes.memory.MemoryManagement.get_memory_data", return_value=fake_memory):
+        res = client.get("/memory/1/image")
+        assert res.status_code == 404
+
+
+def test_get_image_conditional_and_range(app_client):
+    """
+    Tests serving an image including ETag revalidation and Range requests.
+    """
+    app, client = app_client
+
+    with client.session_transaction() as session:
+        session["user_id"] = 1
+        session["vault_info"] = {"vault_id": 1}
+
+    fake_memory = {"id": 1, "image_uri": "test.jpg", "vault_id": 1,
+                   "created_at": datetime(2025, 8, 1), "images": {}}
+    with patch("src.memoryvault.routes.memory.MemoryManagement.get_memory_data", return_value=fake_memory), \
+            patch("src.memoryvault.routes.memory.MemoryManagement.get_image_bytes", return_value=b"0123456789"):
+        res = client.get("/memory/1/image")
+        assert res.status_code == 200
+        assert res.mimetype == "image/jpeg"
+        assert res.content_length == 10
+        assert res.headers["Last-Modified"]
+        etag = res.headers["ETag"]
+
+        res = client.get("/memory/1/image", headers={"If-None-Match": etag})
+        assert res.status_code == 304
+
+        res = client.get("/memory/1/image", headers={"Range": "bytes=2-4"})
+        assert res.status_code == 206
+        assert res.data == b"234"
+
+
+def test_get_image_negotiates_smallest_accepted_format(app_client):
+    """
+    Tests that the smallest format listed in the Accept header is served.
+    """
+    app, client = app_client
+
+    with client.session_transaction() as session:
+        session["user_id"] = 1
+        session["vault_info"] = {"vault_id": 1}
+
+    fake_memory = {"id": 1, "image_uri": "full.jpg", "vault_id": 1,
+                   "created_at": datetime(2025, 8, 1), "images": {
+                       "full": {"rendition": "full", "width": 1024, "height": 768, "formats": {
+                           "image/jpeg": {"mimetype": "image/jpeg", "image_uri": "full.jpg", "size_bytes": 300},
+                           "image/webp": {"mimetype": "image/webp", "image_uri": "full.webp", "size_bytes": 200},
+                           "image/avif": {"mimetype": "image/avif", "image_uri": "full.avif", "size_bytes": 100}
+                       }}}}
+    with patch("src.memoryvault.routes.memory.MemoryManagement.get_memory_data", return_value=fake_memory), \
+            patch("src.memoryvault.routes.memory.MemoryManagement.get_image_bytes", return_value=b"image") as mock_bytes:
+        res = client.get("/memory/1/image", headers={"Accept": "image/webp,image/*,*/*;q=0.8"})
+        assert res.mimetype == "image/webp"
+        assert "Accept" in res.headers["Vary"]
+        mock_bytes.assert_called_with("full.webp")
+
+        res = client.get("/memory/1/image?rendition=full", headers={"Accept": "image/avif,image/webp"})
+        assert res.mimetype == "image/avif"
+
+        res = client.get("/memory/1/image", headers={"Accept": "*/*"})
+        assert res.mimetype == "image/jpeg"
+
+
+def test_get_image_local_file(app_client, tmp_path):
+    """
+    Tests that locally stored images are sent from disk or offloaded to the reverse proxy.
+    """
+    app, client = app_client
+
+    with client.session_transaction() as session:
+        session["user_id"] = 1
+        session["vault_info"] = {"vault_id": 1}
+
+    image_path = tmp_path / "image.jpg"
+    image_path.write_bytes(b"0123456789")
+    fake_memory = {"id": 1, "image_uri": "ab/cd/image.jpg", "vault_id": 1,
+                   "created_at": datetime(2025, 8, 1), "images": {}}
+    with patch("src.memoryvault.routes.memory.MemoryManagement.get_memory_data", return_value=fake_memory), \
+            patch("src.memoryvault.routes.memory.MemoryManagement.get_image_path", return_value=str(image_path)), \
+            patch("src.memoryvault.routes.memory.MemoryManagement.get_image_bytes") as mock_bytes:
+        res = client.get("/memory/1/image")
+        assert res.status_code == 200
+        assert res.data == b"0123456789"
+
+        app.config["IMAGE_ACCEL_REDIRECT_PREFIX"] = "/protected-images/"
+        res = client.get("/memory/1/image")
+        assert res.status_code == 200
+        assert res.headers["X-Accel-Redirect"] == "/protected-images/ab/cd/image.jpg"
+        assert res.data == b""
+
+        res = client.get("/memory/1/image", headers={"If-None-Match": res.headers["ETag"]})
+        assert res.status_code == 304
+        mock_bytes.assert_not_called()
+
+
+def test_get_image_redirects_to_signed_url(app_client):
+    """
+    Tests that images are not proxied if a signed blob storage URL is available.
+    """
+    app, client = app_client
+
+    with client.session_transaction() as session:
+        session["user_id"] = 1
+        session["vault_info"] = {"vault_id": 1}
+
+    fake_memory = {"id": 1, "image_uri": "ab/cd/image.jpg", "vault_id": 1,
+                   "created_at": datetime(2025, 8, 1), "images": {}}
+    with patch("src.memoryvault.routes.memory.MemoryManagement.get_memory_data", return_value=fake_memory), \
+            patch("src.memoryvault.routes.memory.MemoryManagement.get_image_url",
+                  return_value="https://blob/ab/cd/image.jpg?sig") as mock_url, \
+            patch("src.memoryvault.routes.memory.MemoryManagement.get_image_bytes") as mock_bytes:
+        res = client.get("/memory/1/image")
+        assert res.status_code == 302
+        assert res.headers["Location"] == "https://blob/ab/cd/image.jpg?sig"
+        mock_url.assert_called_once_with("ab/cd/image.jpg", "image/jpeg")
+        mock_bytes.assert_not_called()
+
+
+def test_post_batch_upload(app_client):
+    """
+    Test POST a batch upload reporting valid and invalid memories separately.
+    """
+    app, client = app_client
+
+    with client.session_transaction() as session:
+        session["user_id"] = 1
+        session["vault_info"] = {
+            "vault_id": 1,
+            "curr_period_start": "Friday, Aug 01, 2025",
+            "curr_period_end": "Sunday, Aug 31, 2025"
+        }
+
+    memories = [
+        {"description": "Beach", "date": "2025-08-05", "latitude": "51.0", "longitude": "10.2", "image": "image-0"},
+        {"description": "Too early", "date": "2025-07-05"},
+        {"description": "Missing image", "date": "2025-08-06", "image": "image-9"},
+        {"description": "Mountains", "date": "2025-08-07"}
+    ]
+    uploaded_images = []
+
+    def _upload_memories(memories, vault_id, user_id):
+        uploaded_images.extend(memory["image_file"].read() for memory in memories if memory["image_file"])
+        return [{"status": "created", "memory_id": 10}, {"status": "created", "memory_id": 11}]
+
+    with patch("src.memoryvault.routes.memory.MemoryManagement.upload_memories",
+               side_effect=_upload_memories) as mock_upload:
+        res = client.post("/memory/batch", data={
+            "vault": "own_vault",
+            "memories": json.dumps(memories),
+            "image-0": (io.BytesIO(b"image"), "beach.jpg")
+        }, content_type="multipart/form-data")
+
+    assert res.status_code == 200
+    assert res.json["created"] == 2
+    assert res.json["failed"] == 2
+    results = res.json["results"]
+    assert results[0] == {"index": 0, "status": "created", "memory_id": 10}
+    assert "Collection Period" in results[1]["error"]
+    assert "image-9" in results[2]["error"]
+    assert results[3] == {"index": 3, "status": "created", "memory_id": 11}
+
+    uploaded = mock_upload.call_args.args[0]
+    assert [memory["description"] for memory in uploaded] == ["Beach", "Mountains"]
+    assert uploaded[0]["latitude"] == 51.0
+    assert uploaded_images == [b"image"]
+    assert mock_upload.call_args.args[1] == 1
+
+
+def test_post_batch_upload_invalid_request(app_client):
+    """
+    Test POST a batch upload without login, vault or memory list.
+    """
+    app, client = app_client
+
+    res = client.post("/memory/batch", data={"vault": "own_vault", "memories": "[]"})
+    assert res.status_code == 401
+
+    with client.session_transaction() as session:
+        session["user_id"] = 1
+
+    res = client.post("/memory/batch", data={"vault": "own_vault", "memories": "[]"})
+    assert res.status_code == 400
+    assert res.json["error"] == "The chosen vault is not configured."
+
+    with client.session_transaction() as session:
+        session["vault_info"] = {
+            "vault_id": 1,
+            "curr_period_start": "Friday, Aug 01, 2025",
+            "curr_period_end": "Sunday, Aug 31, 2025"
+        }
+
+    res = client.post("/memory/batch", data={"vault": "own_vault", "memories": "no json"})
+    assert res.status_code == 400
+
+
+def test_chunked_upload_and_finalize(app_client, tmp_path):
+    """
+    Test uploading an image in chunks and creating the memory with the completed upload.
+    """
+    app, client = app_client
+    with patch("src.memoryvault.routes.memory.chunked_uploads.folder", str(tmp_path)):
+        res = client.post("/memory/uploads", json={"size": 10})
+        assert res.status_code == 401
+
+        with client.session_transaction() as session:
+            session["user_id"] = 1
+            session["user_info"] = {"firstname": "Max"}
+            session["vault_info"] = {
+                "vault_id": 1,
+                "days_left": 10,
+                "curr_period_start": "Friday, Aug 01, 2025",
+                "curr_period_end": "Sunday, Aug 31, 2025"
+            }
+
+        res = client.post("/memory/uploads", json={"size": 10})
+        assert res.status_code == 201
+        upload_url = res.headers["Location"]
+        upload_id = res.json["upload_id"]
+
+        res = client.put(upload_url, data=b"01234", headers={"Upload-Offset": "0"})
+        assert res.json["offset"] == 5
+        res = client.put(upload_url, data=b"01234", headers={"Upload-Offset": "0"})
+        assert res.status_code == 409
+        assert res.json["offset"] == 5
+        assert client.get(upload_url).json["offset"] == 5
+        client.put(upload_url, data=b"56789", headers={"Upload-Offset": "5"})
+
+        uploaded_images = []
+
+        def _upload_memory(image_file, **kwargs):
+            uploaded_images.append(image_file.read())
+
+        with patch("src.memoryvault.services.MemoryManagement.upload_memory", side_effect=_upload_memory):
+            res = client.post("/memory/", data={
+                "vault": "own_vault",
+                "date": "2025-08-05",
+                "description": "test",
+                "upload_id": upload_id
+            })
+
+        assert res.status_code == 200
+        assert uploaded_images == [b"0123456789"]
+        # -- Upload is removed once the memory is created --
+        assert client.get(upload_url).status_code == 404
+
+
+def test_post_async_upload_and_job_status(app_client):
+    """
+    Test POST of a memory processed by a background job and polling the job status.
+    """
+    app, client = app_client
+    app.config.update({"UPLOAD_ASYNC": True})
+
+    res = client.get("/memory/jobs/1")
+    assert res.status_code == 401
+
+    with client.session_transaction() as session:
+        session["user_id"] = 1
+        session["user_info"] = {"firstname": "Max"}
+        session["vault_info"] = {
+            "vault_id": 1,
+            "days_left": 10,
+            "curr_period_start": "Friday, Aug 01, 2025",
+            "curr_period_end": "Sunday, Aug 31, 2025"
+        }
+
+    with patch("src.memoryvault.services.MemoryManagement.upload_memory_async",
+               return_value=7) as mock_upload:
+        res = client.post("/memory/", data={
+            "vault": "own_vault",
+            "date": "2025-08-05",
+            "description": "test",
+            "image": (io.BytesIO(b"image"), "image.jpg")
+        }, content_type="multipart/form-data")
+
+    assert res.status_code == 202
+    assert mock_upload.call_args.kwargs["user_id"] == 1
+    assert 'data-job-url="/memory/jobs/7"' in res.get_data(as_text=True)
+
+    job = {"id": 7, "status": "failed", "last_error": "Image is invalid.", "payload": {"user_id": 1}}
+    with patch("src.memoryvault.routes.memory.job_queue.get_job", return_value=job):
+        res = client.get("/memory/jobs/7")
+        assert res.status_code == 200
+        assert res.json == {"id": 7, "status": "failed", "error": "Image is invalid."}
+
+    # -- Jobs of other users are not visible --
+    job["payload"]["user_id"] = 2
+    with patch("src.memoryvault.routes.memory.job_queue.get_job", return_value=job):
+        assert client.get("/memory/jobs/7").status_code == 404
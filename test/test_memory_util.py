@@ -1,8 +1,18 @@
+import io
 import pytest
 from unittest.mock import patch, MagicMock
 from datetime import datetime
+from flask import Flask
+from PIL import Image
 
-from src.memoryvault.services import MemoryManagement, SlideshowModes
+from src.memoryvault.services import MemoryManagement, SlideshowModes, ImageProcessingException
+from src.memoryvault.services.storage_util import LocalStorageBackend
+
+
+def _create_app(**config) -> Flask:
+    app = Flask(__name__)
+    app.config.update(config)
+    return app
 
 
 @pytest.fixture
@@ -21,14 +31,22 @@ def memory_mock():
     return mock
 
 
+@patch("src.memoryvault.services.memory_util.PeriodStatistics")
 @patch("src.memoryvault.services.memory_util.db")
 @patch("src.memoryvault.services.memory_util.Memory")
 @patch("src.memoryvault.services.memory_util.MemoryManagement.save_image")
-def test_upload_memory(mock_save_image, MockMemory, mock_db):
+def test_upload_memory(mock_save_image, MockMemory, mock_db, mock_stats):
     """
     Tests the upload of a memory. Due to the use of the patch module no entry will be added to db.
     """
-    mock_save_image.return_value = "test.jpg"
+    mock_save_image.return_value = [
+        {"rendition": "full", "mimetype": "image/webp", "image_uri": "test_full.webp",
+         "width": 1024, "height": 768, "size_bytes": 50},
+        {"rendition": "full", "mimetype": "image/jpeg", "image_uri": "test_full.jpg",
+         "width": 1024, "height": 768, "size_bytes": 80},
+        {"rendition": "thumb", "mimetype": "image/jpeg", "image_uri": "test_thumb.jpg",
+         "width": 160, "height": 120, "size_bytes": 10}
+    ]
     mock_instance = MagicMock()
     MockMemory.return_value = mock_instance
 
@@ -42,7 +60,89 @@ def test_upload_memory(mock_save_image, MockMemory, mock_db):
     )
 
     MockMemory.assert_called_once()
+    assert mock_instance.image_uri == "test_full.jpg"
+    assert len(mock_instance.images) == 3
     mock_db.session.add.assert_called_once_with(mock_instance)
+    mock_stats.add_memories.assert_called_once_with([mock_instance])
+    mock_db.session.commit.assert_called_once()
+
+
+@patch("src.memoryvault.services.memory_util.image_storage")
+def test_save_image_renditions(mock_storage, tmp_path):
+    """
+    Tests that all renditions smaller than the uploaded image are stored locally.
+    """
+    mock_storage.get_backend.return_value = LocalStorageBackend(str(tmp_path))
+    app = _create_app(
+        IMAGE_STAGING_FOLDER=str(tmp_path),
+        IMAGE_ALLOWED_FORMATS=("JPEG",),
+        IMAGE_MAX_PIXELS=1_000_000,
+        IMAGE_RENDITIONS={"thumb": (160, 160), "medium": (640, 640), "full": (1024, 1024)},
+        IMAGE_ENCODERS={"image/jpeg": {"format": "JPEG"}, "image/webp": {"format": "WEBP"}},
+        IMAGE_EXTENSIONS={"image/jpeg": "jpg", "image/webp": "webp"}
+    )
+    with app.app_context():
+        image_file = io.BytesIO()
+        Image.new("RGB", (600, 300)).save(image_file, format="JPEG")
+        image_file.seek(0)
+
+        stored_images = MemoryManagement.save_image(image_file)
+        renditions = {(image["rendition"], image["mimetype"]): image for image in stored_images}
+
+        # -- Medium rendition would be identical to full size and is skipped --
+        assert set(renditions) == {("full", "image/jpeg"), ("full", "image/webp"),
+                                   ("thumb", "image/jpeg"), ("thumb", "image/webp")}
+        full = renditions[("full", "image/jpeg")]
+        assert (full["width"], full["height"]) == (600, 300)
+        thumb = renditions[("thumb", "image/webp")]
+        assert (thumb["width"], thumb["height"]) == (160, 80)
+        assert thumb["image_uri"].endswith(".webp")
+        for image in stored_images:
+            assert (tmp_path / image["image_uri"]).stat().st_size == image["size_bytes"]
+        # -- Staged upload is removed again --
+        assert not list(tmp_path.glob("*.upload"))
+
+        # -- Same image is stored only once under its sharded content hash --
+        image_file.seek(0)
+        assert MemoryManagement.save_image(image_file) == stored_images
+        image_uri = full["image_uri"]
+        image_hash = MemoryManagement.get_image_hash(image_uri)
+        assert image_uri == f"{image_hash[0:2]}/{image_hash[2:4]}/{image_hash}.jpg"
+        assert len(list(tmp_path.rglob("*.jpg"))) == 2
+
+
+def test_get_image_hash_legacy_uri():
+    """
+    Tests that legacy filenames are not treated as content-addressed.
+    """
+    assert MemoryManagement.get_image_hash("1_2025_08_01-10_00_00.jpg") is None
+
+
+@patch("src.memoryvault.services.memory_util.db")
+@patch("src.memoryvault.services.memory_util.MemoryImage")
+@patch("src.memoryvault.services.memory_util.Memory")
+@patch("src.memoryvault.services.memory_util.MemoryManagement._delete_image")
+@patch("src.memoryvault.services.memory_util.MemoryManagement._store_image")
+@patch("src.memoryvault.services.memory_util.MemoryManagement.get_image_bytes")
+def test_migrate_image_storage(mock_get_bytes, mock_store, mock_delete, MockMemory, MockMemoryImage, mock_db):
+    """
+    Tests that legacy images are copied once and all referencing rows are rewritten.
+    """
+    new_uri = "ab/cd/" + "abcd" * 16 + ".jpg"
+    mock_get_bytes.return_value = b"image"
+    mock_store.return_value = new_uri
+    memory = MagicMock(image_uri="legacy.jpg")
+    memory_image = MagicMock(image_uri="legacy.jpg")
+    migrated_image = MagicMock(image_uri=new_uri)
+    MockMemory.query.filter.return_value.all.return_value = [memory]
+    MockMemoryImage.query.all.return_value = [memory_image, migrated_image]
+
+    assert MemoryManagement.migrate_image_storage(delete_old=True) == 1
+
+    assert memory.image_uri == new_uri
+    assert memory_image.image_uri == new_uri
+    mock_store.assert_called_once_with(b"image")
+    mock_delete.assert_called_once_with("legacy.jpg")
     mock_db.session.commit.assert_called_once()
 
 
@@ -92,3 +192,143 @@ def test_get_slideshow_order(MockMemory):
         period_end=datetime(2025, 12, 31).date()
     )
     assert set(ids) == {1, 2}
+
+
+@patch("src.memoryvault.services.memory_util.image_cache")
+@patch("src.memoryvault.services.memory_util.MemoryManagement._load_image_bytes")
+def test_get_image_bytes_cached(mock_load, mock_cache):
+    """
+    Tests that images are loaded from storage only on cache misses and missing images are remembered.
+    """
+    mock_cache.get.return_value = b"cached"
+    assert MemoryManagement.get_image_bytes("a.jpg") == b"cached"
+    mock_load.assert_not_called()
+
+    mock_cache.get.return_value = None
+    mock_cache.is_missing.return_value = False
+    mock_load.return_value = b"stored"
+    assert MemoryManagement.get_image_bytes("a.jpg") == b"stored"
+    mock_cache.put.assert_called_once_with("a.jpg", b"stored")
+
+    mock_load.side_effect = FileNotFoundError
+    with pytest.raises(FileNotFoundError):
+        MemoryManagement.get_image_bytes("b.jpg")
+    mock_cache.put_missing.assert_called_once_with("b.jpg")
+
+
+@patch("src.memoryvault.services.memory_util.PeriodStatistics")
+@patch("src.memoryvault.services.memory_util.db")
+@patch("src.memoryvault.services.memory_util.MemoryManagement.save_image")
+def test_upload_memories_single_transaction(mock_save_image, mock_db, mock_stats):
+    """
+    Tests that a batch of memories is committed once and memories with invalid images are reported.
+    """
+    app = _create_app(IMAGE_PROCESSING_WORKERS=2)
+
+    def _save_image(image_file):
+        if image_file == "broken.jpg":
+            raise ImageProcessingException("The uploaded file is not a supported image.")
+        return [{"rendition": "full", "mimetype": "image/jpeg", "image_uri": f"{image_file}",
+                 "width": 1024, "height": 768, "size_bytes": 80}]
+    mock_save_image.side_effect = _save_image
+
+    memories = [
+        {"description": "First", "date": datetime(2025, 8, 1).date(), "image_file": "first.jpg"},
+        {"description": "Broken", "date": datetime(2025, 8, 2).date(), "image_file": "broken.jpg"},
+        {"description": "Text only", "date": datetime(2025, 8, 3).date()}
+    ]
+    with app.app_context():
+        results = MemoryManagement.upload_memories(memories, vault_id=1)
+
+    assert [result["status"] for result in results] == ["created", "failed", "created"]
+    assert results[1]["error"] == "The uploaded file is not a supported image."
+    added = mock_db.session.add_all.call_args.args[0]
+    assert [memory.description for memory in added] == ["First", "Text only"]
+    assert added[0].image_uri == "first.jpg"
+    assert added[1].image_uri is None
+    mock_stats.add_memories.assert_called_once_with(added)
+    mock_db.session.commit.assert_called_once()
+
+
+@patch("src.memoryvault.services.memory_util.slideshow_store")
+def test_random_slideshow_computed_from_seed(mock_store):
+    """
+    Tests that random slideshows only store their seed and compute the same order
+    as get_slideshow_order with this seed, window by window, even after new memories
+    were uploaded to the period.
+    """
+    from flask import Flask
+    from src.memoryvault.models import db, Memory
+
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        for day in range(1, 31):
+            db.session.add(Memory(description=f"Memory {day}", date=datetime(2025, 8, day), vault_id=1))
+        db.session.add(Memory(description="Other vault", date=datetime(2025, 8, 5), vault_id=2))
+        db.session.add(Memory(description="Other period", date=datetime(2025, 9, 1), vault_id=1))
+        db.session.commit()
+
+        period = {"period_start": datetime(2025, 8, 1).date(), "period_end": datetime(2025, 8, 31).date()}
+        MemoryManagement.create_slideshow(user_id=1, vault_id=1, order=SlideshowModes.RANDOM, **period)
+        state = mock_store.create.call_args.kwargs
+        assert state["number_memories"] == 30
+        assert state["max_memory_id"] == 30
+        assert "memory_ids" not in state
+
+        slideshow = {"slideshow_id": "random", **state}
+        order = MemoryManagement.get_slideshow_order(vault_id=1, order=SlideshowModes.RANDOM,
+                                                     seed=state["seed"], **period)
+        db.session.add(Memory(description="Uploaded later", date=datetime(2025, 8, 1), vault_id=1))
+        db.session.commit()
+        windows = [MemoryManagement.get_slideshow_memory_ids(slideshow, start, start + 4)
+                   for start in range(0, 30, 4)]
+        assert [memory_id for window in windows for memory_id in window.values()] == order
+        assert list(windows[1]) == [4, 5, 6, 7]
+        assert sorted(order) == list(range(1, 31))
+        assert order != list(range(1, 31))
+
+        assert MemoryManagement.create_slideshow(user_id=1, vault_id=3, order=SlideshowModes.RANDOM,
+                                                 **period) is None
+        mock_store.get_memory_ids.assert_not_called()
+
+
+@patch("src.memoryvault.services.memory_util.selectinload")
+@patch("src.memoryvault.services.memory_util.Memory")
+def test_get_memories_data(MockMemory, mock_selectinload):
+    """
+    Tests loading several memories with a single query.
+    """
+    assert MemoryManagement.get_memories_data([]) == {}
+    MockMemory.query.filter.assert_not_called()
+
+    mock1 = MagicMock(id=1)
+    mock1.to_json.return_value = {"id": 1}
+    mock2 = MagicMock(id=2)
+    mock2.to_json.return_value = {"id": 2}
+    MockMemory.query.options.return_value.filter.return_value.all.return_value = [mock1, mock2]
+
+    assert MemoryManagement.get_memories_data([1, 2, 3]) == {1: {"id": 1}, 2: {"id": 2}}
+    MockMemory.query.options.assert_called_once_with(mock_selectinload.return_value)
+
+
+@patch("src.memoryvault.services.memory_util.image_storage")
+def test_get_image_url_bounded_by_session(mock_storage):
+    """
+    Tests that signed URLs do not outlive the session they are handed out to.
+    """
+    app = _create_app(IMAGE_SIGNED_URLS=True, IMAGE_SIGNED_URL_TTL=3600, SECRET_KEY="secret",
+                      PERMANENT_SESSION_LIFETIME=7200)
+    backend = mock_storage.get_backend.return_value
+
+    with app.test_request_context():
+        from flask import session
+        # -- Sessions ending after the URL share the unbounded URL --
+        MemoryManagement.get_image_url("test.jpg")
+        backend.get_signed_url.assert_called_with("test.jpg", "image/jpeg", 3600)
+
+        session["login_at"] = 1_000_000.0
+        MemoryManagement.get_image_url("test.jpg")
+        backend.get_signed_url.assert_called_with("test.jpg", "image/jpeg", 3600, 1_007_200.0)
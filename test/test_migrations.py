@@ -0,0 +1,82 @@
+import sqlite3
+from flask import Flask
+from flask_migrate import upgrade, check
+
+from src.memoryvault import models
+
+
+def _create_app(database_path) -> Flask:
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{database_path}"
+    models.init_app(app)
+    models.init_migrations(app)
+    return app
+
+
+def test_migrations_match_models(tmp_path):
+    """
+    Tests that the migrations create the schema of the models including all indexes.
+    """
+    app = _create_app(tmp_path / "empty.db")
+    with app.app_context():
+        upgrade()
+        # -- Raises if the models differ from the migrated schema --
+        check()
+
+        indexes = {index["name"] for index in models.db.inspect(models.db.engine).get_indexes("memory")}
+        assert "ix_memory_vault_id_date" in indexes
+
+
+def test_migrations_upgrade_database_created_by_create_all(tmp_path):
+    """
+    Tests that databases created by create_all before migrations existed are upgraded in place.
+    """
+    database_path = tmp_path / "legacy.db"
+    connection = sqlite3.connect(database_path)
+    connection.executescript("""
+        CREATE TABLE family (id INTEGER NOT NULL PRIMARY KEY, family_name VARCHAR(30) NOT NULL,
+            invite_code VARCHAR(100) NOT NULL UNIQUE, created_at DATETIME);
+        CREATE TABLE vault (id INTEGER NOT NULL PRIMARY KEY, period_duration VARCHAR(11) NOT NULL,
+            period_initial_start DATE NOT NULL, created_at DATETIME, user_id INTEGER UNIQUE,
+            family_id INTEGER UNIQUE REFERENCES family (id));
+        CREATE TABLE memory (id INTEGER NOT NULL PRIMARY KEY, description VARCHAR(1000) NOT NULL,
+            date DATETIME, latitude NUMERIC, longitude NUMERIC, image_uri VARCHAR(100),
+            created_at DATETIME, vault_id INTEGER NOT NULL REFERENCES vault (id));
+        INSERT INTO family VALUES (1, 'Doe', 'abc', NULL);
+        INSERT INTO vault VALUES (1, 'MONTHLY', '2025-01-01', NULL, NULL, 1);
+        INSERT INTO memory VALUES (1, 'Beach', '2025-01-02', NULL, NULL, NULL, NULL, 1);
+    """)
+    connection.close()
+
+    app = _create_app(database_path)
+    with app.app_context():
+        upgrade()
+
+        inspector = models.db.inspect(models.db.engine)
+        assert "user_id" in {column["name"] for column in inspector.get_columns("memory")}
+        assert "ix_memory_vault_id_date" in {index["name"] for index in inspector.get_indexes("memory")}
+        assert "vault_period_stats" in inspector.get_table_names()
+        assert models.db.session.get(models.Memory, 1).description == "Beach"
+        # -- Statistics of memories stored before they were maintained are backfilled --
+        stats = models.db.session.get(models.VaultPeriodStats, (1, 0, 0))
+        assert (stats.memory_count, stats.image_count) == (1, 0)
+
+
+def test_migration_commands_loaded_on_first_use(tmp_path):
+    """
+    Tests that the "flask db" commands register the migrations when they are run.
+    """
+    from src.memoryvault.commands import init_app as init_commands
+
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'cli.db'}"
+    models.init_app(app)
+    init_commands(app)
+    assert "migrate" not in app.extensions
+
+    result = app.test_cli_runner().invoke(args=["db", "upgrade"])
+
+    assert result.exit_code == 0, result.output
+    assert "migrate" in app.extensions
+    with app.app_context():
+        assert "memory" in models.db.inspect(models.db.engine).get_table_names()
@@ -0,0 +1,56 @@
+import calendar
+from datetime import date, timedelta
+from dateutil.relativedelta import relativedelta
+
+from src.memoryvault.services.period_util import PeriodCalendar, get_formatted_periods
+
+
+def _iterate_periods(initial_start: date, duration_months: int, today: date) -> list:
+    """
+    Reference implementation stepping through the periods month by month.
+    """
+    periods = []
+    start = initial_start
+    while start <= today:
+        end = start + relativedelta(months=duration_months) - timedelta(days=1)
+        periods.append((start, end.replace(day=calendar.monthrange(end.year, end.month)[1])))
+        start += relativedelta(months=duration_months)
+    return periods
+
+
+def test_periods_match_iteration():
+    """
+    Tests that the arithmetic periods equal the periods found by stepping through the months.
+    """
+    for duration in [1, 3, 6, 12]:
+        for initial_start in [date(2020, 1, 1), date(2023, 11, 1), date(2024, 2, 1)]:
+            period_calendar = PeriodCalendar(initial_start, duration)
+            for today in [initial_start, initial_start + timedelta(days=40), date(2024, 2, 29),
+                          date(2025, 8, 12), date(2025, 12, 31), date(2026, 1, 1)]:
+                expected = _iterate_periods(initial_start, duration, today)
+                assert list(period_calendar.iter_periods(today)) == expected
+                if expected:
+                    assert period_calendar.get_current_period(today) == expected[-1]
+                    assert period_calendar.get_index(today) == len(expected) - 1
+
+
+def test_period_before_initial_start():
+    """
+    Tests that the first period is the current period until it has started.
+    """
+    period_calendar = PeriodCalendar(date(2025, 9, 1), 3)
+
+    assert period_calendar.get_index(date(2025, 8, 31)) == -1
+    assert list(period_calendar.iter_periods(date(2025, 8, 31))) == []
+    assert period_calendar.get_current_period(date(2025, 8, 31)) == (date(2025, 9, 1), date(2025, 11, 30))
+
+
+def test_formatted_periods():
+    """
+    Tests formatting the periods for display.
+    """
+    periods = get_formatted_periods(date(2025, 1, 1), 6, date(2025, 8, 12))
+
+    assert periods == (("Wednesday, Jan 01, 2025", "Monday, Jun 30, 2025"),
+                       ("Tuesday, Jul 01, 2025", "Wednesday, Dec 31, 2025"))
+    assert get_formatted_periods(date(2025, 1, 1), 6, date(2025, 8, 12)) is periods
@@ -0,0 +1,95 @@
+import threading
+from unittest.mock import patch, MagicMock
+from flask import Flask
+from werkzeug.datastructures import MIMEAccept
+
+from src.memoryvault.services.prefetch_util import SlidePrefetcher
+
+
+def _create_prefetcher(count: int = 2) -> tuple:
+    app = Flask(__name__)
+    app.config.update({
+        "SLIDESHOW_PREFETCH_COUNT": count,
+        "SLIDESHOW_PREFETCH_WORKERS": 2,
+        "IMAGE_SIGNED_URLS": False
+    })
+    prefetcher = SlidePrefetcher()
+    prefetcher.init_app(app)
+    return app, prefetcher
+
+
+def _fake_image(image_uri: str, mimetype: str, size_bytes: int) -> dict:
+    return {"image_uri": image_uri, "mimetype": mimetype, "size_bytes": size_bytes}
+
+
+def _fake_memory(memory_id: int) -> dict:
+    return {"id": memory_id, "image_uri": f"{memory_id}_full.jpg", "images": {
+        "thumb": {"width": 160, "formats": {
+            "image/jpeg": _fake_image(f"{memory_id}_thumb.jpg", "image/jpeg", 10)}},
+        "full": {"width": 1024, "formats": {
+            "image/jpeg": _fake_image(f"{memory_id}_full.jpg", "image/jpeg", 100),
+            "image/webp": _fake_image(f"{memory_id}_full.webp", "image/webp", 80)}}
+    }}
+
+
+@patch("src.memoryvault.services.prefetch_util.image_cache")
+@patch("src.memoryvault.services.prefetch_util.image_storage")
+@patch("src.memoryvault.services.prefetch_util.MemoryManagement")
+def test_prefetch_loads_images(MockMemoryManagement, mock_storage, mock_cache):
+    """
+    Tests that the largest rendition of upcoming memories is loaded
+    in the format the client negotiates.
+    """
+    mock_storage.get_backend.return_value.get_local_path.return_value = None
+    mock_cache.get.return_value = None
+    app, prefetcher = _create_prefetcher(count=2)
+
+    with app.app_context():
+        assert prefetcher.prefetch("1", [_fake_memory(7), _fake_memory(8), _fake_memory(9)],
+                                   MIMEAccept([("image/webp", 1), ("*/*", 0.8)])) == 2
+    prefetcher._get_pool().shutdown(wait=True)
+
+    MockMemoryManagement.get_memory_data.assert_not_called()
+    loaded_images = {call.args[0] for call in MockMemoryManagement.get_image_bytes.call_args_list}
+    assert loaded_images == {"7_full.webp", "8_full.webp"}
+
+    # -- Clients not listing other formats get JPEG --
+    MockMemoryManagement.get_image_bytes.reset_mock()
+    prefetcher._pool = None
+    with app.app_context():
+        assert prefetcher.prefetch("1", [_fake_memory(9)]) == 1
+    prefetcher._get_pool().shutdown(wait=True)
+    MockMemoryManagement.get_image_bytes.assert_called_once_with("9_full.jpg")
+
+
+@patch("src.memoryvault.services.prefetch_util.image_cache")
+@patch("src.memoryvault.services.prefetch_util.image_storage")
+@patch("src.memoryvault.services.prefetch_util.MemoryManagement")
+def test_prefetch_bounded_per_session(MockMemoryManagement, mock_storage, mock_cache):
+    """
+    Tests that a session never has more prefetches in flight than the window size.
+    """
+    release = threading.Event()
+
+    def _slow_image(image_uri):
+        release.wait(timeout=5)
+        return None
+    MockMemoryManagement.get_image_bytes.side_effect = _slow_image
+    mock_storage.get_backend.return_value.get_local_path.return_value = None
+    mock_cache.get.return_value = None
+    app, prefetcher = _create_prefetcher(count=2)
+
+    with app.app_context():
+        assert prefetcher.prefetch("1", [_fake_memory(7), _fake_memory(8)]) == 2
+        # -- Window of session 1 is exhausted, other sessions are not affected --
+        assert prefetcher.prefetch("1", [_fake_memory(9)]) == 0
+        assert prefetcher.prefetch("2", [_fake_memory(9)]) == 1
+        # -- Memories without image are skipped --
+        assert prefetcher.prefetch("3", [{"id": 10, "image_uri": None, "images": {}}]) == 0
+    release.set()
+    prefetcher._get_pool().shutdown(wait=True)
+    prefetcher._pool = None
+
+    with app.app_context():
+        assert prefetcher.prefetch("1", [_fake_memory(9)]) == 1
+    prefetcher._get_pool().shutdown(wait=True)
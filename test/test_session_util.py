@@ -0,0 +1,190 @@
+import os
+import time
+import pytest
+from datetime import date
+from flask import Flask, session
+
+from src.memoryvault import models
+from src.memoryvault.services.session_util import ServerSessionInterface, regenerate_session, \
+    get_session_expiry
+
+
+def _create_app(tmp_path, backend: str) -> Flask:
+    app = Flask(__name__)
+    app.config.update({
+        "SECRET_KEY": "secret",
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'sessions.db'}",
+        "SESSION_BACKEND": backend,
+        "SESSION_FOLDER": str(tmp_path / "sessions"),
+        "SESSION_TOUCH_INTERVAL": 60,
+        "SESSION_GC_INTERVAL": 60
+    })
+    models.init_app(app)
+    with app.app_context():
+        models.db.create_all()
+    ServerSessionInterface().init_app(app)
+
+    @app.route("/login")
+    def login():
+        regenerate_session()
+        session["user_id"] = 1
+        session["vault_info"] = {"vault_id": 2, "period_initial_start": date(2025, 1, 1)}
+        return "ok"
+
+    @app.route("/info")
+    def info():
+        return {"user_id": session.get("user_id"),
+                "start": str(session.get("vault_info", {}).get("period_initial_start"))}
+
+    @app.route("/expiry")
+    def expiry():
+        return {"expires_at": get_session_expiry()}
+
+    @app.route("/logout")
+    def logout():
+        session.clear()
+        return "ok"
+
+    return app
+
+
+@pytest.mark.parametrize("backend", ["filesystem", "database"])
+def test_server_session(tmp_path, backend):
+    """
+    Tests that only the session id is sent in the cookie and the data is kept on the server.
+    """
+    app = _create_app(tmp_path, backend)
+    client = app.test_client()
+
+    assert client.get("/info").json["user_id"] is None
+    assert client.get_cookie("session") is None
+
+    client.get("/login")
+    session_id = client.get_cookie("session").value
+    assert ServerSessionInterface.SESSION_ID_PATTERN.match(session_id)
+    # -- Values are serialized like in cookie sessions, dates become HTTP date strings --
+    assert client.get("/info").json == {"user_id": 1, "start": "Wed, 01 Jan 2025 00:00:00 GMT"}
+
+    # -- Other clients only share the session with its id --
+    other_client = app.test_client()
+    assert other_client.get("/info").json["user_id"] is None
+    other_client.set_cookie("session", session_id)
+    assert other_client.get("/info").json["user_id"] == 1
+
+    client.get("/logout")
+    assert client.get_cookie("session") is None
+    assert other_client.get("/info").json["user_id"] is None
+
+
+@pytest.mark.parametrize("backend", ["filesystem", "database"])
+def test_session_regenerated_on_login(tmp_path, backend):
+    """
+    Tests that logging in issues a new session id and removes the session under the old one,
+    so a session id planted in the browser before login is not logged in.
+    """
+    app = _create_app(tmp_path, backend)
+    attacker = app.test_client()
+    attacker.get("/login")
+    planted_id = attacker.get_cookie("session").value
+
+    victim = app.test_client()
+    victim.set_cookie("session", planted_id)
+    assert victim.get("/info").json["user_id"] == 1
+    victim.get("/login")
+
+    assert victim.get_cookie("session").value != planted_id
+    assert victim.get("/info").json["user_id"] == 1
+    assert attacker.get("/info").json["user_id"] is None
+
+
+def test_regenerate_cookie_session():
+    """
+    Tests that regenerating leaves signed cookie sessions unchanged.
+    """
+    app = Flask(__name__)
+    app.secret_key = "secret"
+    with app.test_request_context():
+        session["user_id"] = 1
+        regenerate_session()
+        assert session["user_id"] == 1
+
+
+def test_invalid_session_ids(tmp_path):
+    """
+    Tests that unknown and malformed session ids start a new session.
+    """
+    app = _create_app(tmp_path, "filesystem")
+    client = app.test_client()
+
+    for session_id in ["../secret", "a" * 43]:
+        client.set_cookie("session", session_id)
+        assert client.get("/info").json["user_id"] is None
+        client.get("/login")
+        assert client.get_cookie("session").value != session_id
+
+
+def test_collect_expired_sessions(tmp_path):
+    """
+    Tests that expired sessions are not loaded anymore and removed by the garbage collection.
+    """
+    app = _create_app(tmp_path, "filesystem")
+    client = app.test_client()
+    client.get("/login")
+    session_id = client.get_cookie("session").value
+    path = tmp_path / "sessions" / f"{session_id}.session"
+
+    # -- Expiry is stored as modification time of the file --
+    assert os.path.getmtime(path) > time.time() + 60 * 60
+    expired = time.time() - 1
+    os.utime(path, (expired, expired))
+
+    assert client.get("/info").json["user_id"] is None
+    assert app.session_interface.collect_expired() == 1
+    assert not os.path.exists(path)
+
+
+def test_unchanged_session_expiry_extended(tmp_path):
+    """
+    Tests that reading a session only extends its expiry after the touch interval.
+    """
+    app = _create_app(tmp_path, "database")
+    client = app.test_client()
+    client.get("/login")
+    session_id = client.get_cookie("session").value
+
+    with app.app_context():
+        web_session = models.db.session.get(models.WebSession, session_id)
+        expires_at = web_session.expires_at
+
+        client.get("/info")
+        models.db.session.refresh(web_session)
+        assert web_session.expires_at == expires_at
+
+        app.session_interface.touch_interval = 0
+        client.get("/info")
+        models.db.session.refresh(web_session)
+        assert web_session.expires_at > expires_at
+
+
+def test_session_expiry(tmp_path):
+    """
+    Tests that the expiry of stored sessions is known once they were stored.
+    """
+    app = _create_app(tmp_path, "filesystem")
+    client = app.test_client()
+    assert client.get("/expiry").json["expires_at"] is None
+
+    client.get("/login")
+    path = tmp_path / "sessions" / f"{client.get_cookie('session').value}.session"
+    assert client.get("/expiry").json["expires_at"] == os.path.getmtime(path)
+
+
+def test_unknown_session_backend():
+    """
+    Tests that unknown session backends are rejected.
+    """
+    app = Flask(__name__)
+    app.config.update({"SESSION_BACKEND": "redis", "SESSION_TOUCH_INTERVAL": 60,
+                       "SESSION_GC_INTERVAL": 60})
+    with pytest.raises(ValueError):
+        ServerSessionInterface().init_app(app)
@@ -1,6 +1,19 @@
+import pytest
 from datetime import datetime
 from unittest.mock import patch
 
+from src.memoryvault.services import slideshow_store
+
+
+@pytest.fixture(autouse=True)
+def slideshow_folder(app_client, tmp_path):
+    with patch.object(slideshow_store, "folder", str(tmp_path)):
+        yield
+
+
+def _memories_data(fake_memory: dict):
+    return lambda memory_ids: {memory_id: {**fake_memory, "id": memory_id} for memory_id in memory_ids}
+
 # ------------------- /slideshow/ -------------------
 
 
@@ -52,7 +65,9 @@ def test_get_index_with_private_vault(app_client):
          "period_end": "Sunday, 31 August 2025"},
     ]
 
-    with patch("src.memoryvault.routes.slideshow.VaultManagement.get_all_periods", return_value=fake_periods):
+    with patch("src.memoryvault.routes.slideshow.VaultManagement.get_all_periods", return_value=fake_periods), \
+            patch("src.memoryvault.routes.slideshow.VaultManagement.get_period_stats",
+                  return_value={}):
         res = client.get("/slideshow", follow_redirects=True)
 
         assert res.status_code == 200
@@ -82,7 +97,9 @@ def test_get_index_with_private_and_family_vault(app_client):
          "period_end": "Sunday, 31 August 2025"},
     ]
 
-    with patch("src.memoryvault.routes.slideshow.VaultManagement.get_all_periods", return_value=fake_periods):
+    with patch("src.memoryvault.routes.slideshow.VaultManagement.get_all_periods", return_value=fake_periods), \
+            patch("src.memoryvault.routes.slideshow.VaultManagement.get_period_stats",
+                  return_value={}) as mock_stats:
         res = client.get("/slideshow", follow_redirects=True)
 
         assert res.status_code == 200
@@ -90,6 +107,8 @@ def test_get_index_with_private_and_family_vault(app_client):
         assert "Choose the Collection Period:" in html
         assert "Own vault" in html
         assert "Family vault" in html
+        # -- Statistics of both vaults are loaded at once --
+        mock_stats.assert_called_once_with([1, 2])
 
 
 def test_index_exception_handeling(app_client):
@@ -136,8 +155,9 @@ def test_run_exception_handeling(app_client):
         session["user_id"] = 1
         session["user_info"] = {"firstname": "Max", "admin": False}
         session["vault_info"] = {"vault_id": 1}
+        session["slideshow_id"] = slideshow_store.create(1, [1, 2, 3, 4])
 
-    with patch("src.memoryvault.routes.slideshow.MemoryManagement.get_memory_data", side_effect=Exception):
+    with patch("src.memoryvault.routes.slideshow.MemoryManagement.get_memories_data", side_effect=Exception):
         res = client.get("/slideshow/run?number=3")
 
         assert res.status_code == 200
@@ -157,7 +177,11 @@ def test_post_run_start_slideshow_no_memories(app_client):
         session["user_info"] = {"firstname": "Max", "admin": False}
         session["vault_info"] = {"vault_id": 1}
 
-    with patch("src.memoryvault.routes.slideshow.MemoryManagement.get_slideshow_order", return_value=[]):
+    with patch("src.memoryvault.routes.slideshow.MemoryManagement.get_slideshow_order", return_value=[]), \
+            patch("src.memoryvault.routes.slideshow.VaultManagement.get_all_periods",
+                  return_value=[]), \
+            patch("src.memoryvault.routes.slideshow.VaultManagement.get_period_stats",
+                  return_value={}):
         res = client.post("/slideshow/run",
                           data={
                               "vault": "own_vault",
@@ -191,7 +215,8 @@ def test_post_run_start_slideshow(app_client):
         "longitude": None
     }
     with patch("src.memoryvault.routes.slideshow.MemoryManagement.get_slideshow_order", return_value=[1, 2, 3, 4]), \
-            patch("src.memoryvault.routes.slideshow.MemoryManagement.get_memory_data", return_value=fake_memory):
+            patch("src.memoryvault.routes.slideshow.MemoryManagement.get_memories_data",
+               side_effect=_memories_data(fake_memory)):
         res = client.post("/slideshow/run",
                           data={
                               "vault": "own_vault",
@@ -217,7 +242,7 @@ def test_get_run_next_slide(app_client):
         session["user_id"] = 1
         session["user_info"] = {"firstname": "Max", "admin": True}
         session["vault_info"] = {"vault_id": 1}
-        session["slideshow_order"] = [1, 2, 3, 4]
+        session["slideshow_id"] = slideshow_store.create(1, [1, 2, 3, 4])
 
     fake_memory = {
         "description": "Test description of a second memory",
@@ -227,7 +252,8 @@ def test_get_run_next_slide(app_client):
         "longitude": None
     }
 
-    with patch("src.memoryvault.routes.slideshow.MemoryManagement.get_memory_data", return_value=fake_memory):
+    with patch("src.memoryvault.routes.slideshow.MemoryManagement.get_memories_data",
+               side_effect=_memories_data(fake_memory)):
         res = client.get("/slideshow/run?number=2")
 
         assert res.status_code == 200
@@ -235,3 +261,239 @@ def test_get_run_next_slide(app_client):
         print(html)
         assert "Sunday, Aug 03, 2025" in html
         assert fake_memory["description"] in html
+
+
+def test_get_run_slide_with_image_renditions(app_client):
+    """
+    Test GET on run renders the image by URL together with a srcset of all renditions.
+    """
+    app, client = app_client
+
+    # Mock login
+    with client.session_transaction() as session:
+        session["user_id"] = 1
+        session["user_info"] = {"firstname": "Max", "admin": False}
+        session["vault_info"] = {"vault_id": 1}
+        session["slideshow_id"] = slideshow_store.create(1, [7])
+
+    fake_memory = {
+        "id": 7,
+        "description": "Test description of a memory with image",
+        "date": datetime(year=2025, month=8, day=3).date(),
+        "image_uri": "test_full.jpg",
+        "latitude": None,
+        "longitude": None,
+        "images": {
+            "full": {"rendition": "full", "image_uri": "test_full.jpg", "width": 1024, "height": 768},
+            "thumb": {"rendition": "thumb", "image_uri": "test_thumb.jpg", "width": 160, "height": 120}
+        }
+    }
+
+    with patch("src.memoryvault.routes.slideshow.MemoryManagement.get_memories_data",
+               side_effect=_memories_data(fake_memory)):
+        res = client.get("/slideshow/run?number=1")
+
+        assert res.status_code == 200
+        html = res.get_data(as_text=True)
+        assert 'src="/memory/7/image"' in html
+        assert "/memory/7/image?rendition=thumb 160w, /memory/7/image?rendition=full 1024w" in html
+
+
+def test_get_run_slide_with_signed_image_urls(app_client):
+    """
+    Test GET on run renders signed blob storage URLs per format, smallest format first.
+    """
+    app, client = app_client
+
+    # Mock login
+    with client.session_transaction() as session:
+        session["user_id"] = 1
+        session["user_info"] = {"firstname": "Max", "admin": False}
+        session["vault_info"] = {"vault_id": 1}
+        session["slideshow_id"] = slideshow_store.create(1, [7])
+
+    def _image(image_uri, size_bytes):
+        return {"image_uri": image_uri, "size_bytes": size_bytes}
+
+    fake_memory = {
+        "id": 7,
+        "description": "Test description of a memory with image",
+        "date": datetime(year=2025, month=8, day=3).date(),
+        "image_uri": "full.jpg",
+        "latitude": None,
+        "longitude": None,
+        "images": {
+            "full": {"rendition": "full", "width": 1024, "height": 768, "formats": {
+                "image/jpeg": _image("full.jpg", 300), "image/webp": _image("full.webp", 200),
+                "image/avif": _image("full.avif", 100)}},
+            "thumb": {"rendition": "thumb", "width": 160, "height": 120, "formats": {
+                "image/jpeg": _image("thumb.jpg", 30), "image/webp": _image("thumb.webp", 20),
+                "image/avif": _image("thumb.avif", 10)}}
+        }
+    }
+
+    app.config["IMAGE_SIGNED_URLS"] = True
+    with patch("src.memoryvault.routes.slideshow.MemoryManagement.get_memories_data",
+               side_effect=_memories_data(fake_memory)), \
+            patch("src.memoryvault.routes.slideshow.MemoryManagement.get_image_url",
+                  side_effect=lambda image_uri, mimetype="image/jpeg": f"https://blob/{image_uri}?sig"):
+        res = client.get("/slideshow/run?number=1")
+
+        assert res.status_code == 200
+        html = res.get_data(as_text=True)
+        assert "/memory/7/image" not in html
+        assert 'src="https://blob/full.jpg?sig"' in html
+        assert 'srcset="https://blob/thumb.jpg?sig 160w, https://blob/full.jpg?sig 1024w"' in html
+        assert html.index('type="image/avif"') < html.index('type="image/webp"')
+
+
+def test_get_run_slide_prefetches_upcoming_slides(app_client):
+    """
+    Test GET on run prefetches the images of the following memories and hints them to the browser.
+    """
+    app, client = app_client
+
+    # Mock login
+    with client.session_transaction() as session:
+        session["user_id"] = 1
+        session["user_info"] = {"firstname": "Max", "admin": False}
+        session["vault_info"] = {"vault_id": 1}
+        session["slideshow_id"] = slideshow_store.create(1, [7, 8, 9])
+
+    def _fake_memory(memory_id):
+        return {"id": memory_id, "description": "Memory", "date": datetime(year=2025, month=8, day=3).date(),
+                "image_uri": f"{memory_id}.jpg", "latitude": None, "longitude": None, "images": {}}
+
+    with patch("src.memoryvault.routes.slideshow.MemoryManagement.get_memories_data",
+               side_effect=lambda memory_ids: {memory_id: _fake_memory(memory_id) for memory_id in memory_ids}), \
+            patch("src.memoryvault.routes.slideshow.slide_prefetcher.prefetch") as mock_prefetch:
+        res = client.get("/slideshow/run?number=1", headers={"Accept": "text/html,image/webp"})
+
+        assert res.status_code == 200
+        mock_prefetch.assert_called_once()
+        assert mock_prefetch.call_args.args[:2] == ("1", [_fake_memory(8), _fake_memory(9)])
+        # -- Images are prefetched in the format negotiated with the page's Accept header --
+        assert "image/webp" in mock_prefetch.call_args.args[2]
+        assert res.headers["Link"] == "</memory/8/image>; rel=preload; as=image; fetchpriority=low, " \
+                                      "</memory/9/image>; rel=preload; as=image; fetchpriority=low"
+
+
+def test_get_run_slideshow_expired(app_client):
+    """
+    Test GET on run redirects to the slideshow options when the slideshow does not exist
+    or belongs to another user.
+    """
+    app, client = app_client
+
+    # Mock login
+    with client.session_transaction() as session:
+        session["user_id"] = 1
+        session["user_info"] = {"firstname": "Max", "admin": False}
+        session["vault_info"] = {"vault_id": 1}
+
+    res = client.get("/slideshow/run?number=1")
+    assert res.status_code == 302
+    assert "/slideshow/" in res.location
+
+    with client.session_transaction() as session:
+        session["slideshow_id"] = slideshow_store.create(2, [1, 2])
+
+    res = client.get("/slideshow/run?number=1")
+    assert res.status_code == 302
+    assert "/slideshow/" in res.location
+
+
+def test_get_slides_window(app_client):
+    """
+    Test GET on slides returns a window of slides of the running slideshow as JSON.
+    """
+    app, client = app_client
+
+    res = client.get("/slideshow/slides?start=1")
+    assert res.status_code == 401
+
+    # Mock login
+    with client.session_transaction() as session:
+        session["user_id"] = 1
+        session["user_info"] = {"firstname": "Max", "admin": False}
+        session["vault_info"] = {"vault_id": 1}
+
+    res = client.get("/slideshow/slides?start=1")
+    assert res.status_code == 404
+
+    with client.session_transaction() as session:
+        session["slideshow_id"] = slideshow_store.create(1, [7, 8, 9])
+
+    def _fake_memory(memory_id):
+        return {"id": memory_id, "description": f"Memory {memory_id}",
+                "date": datetime(year=2025, month=8, day=memory_id).date(),
+                "image_uri": f"{memory_id}.jpg" if memory_id != 9 else None,
+                "latitude": 51.5 if memory_id == 8 else None, "longitude": 10.25 if memory_id == 8 else None,
+                "images": {}}
+
+    app.config["SLIDESHOW_WINDOW_SIZE"] = 2
+    with patch("src.memoryvault.routes.slideshow.MemoryManagement.get_memories_data",
+               side_effect=lambda memory_ids: {memory_id: _fake_memory(memory_id) for memory_id in memory_ids}):
+        res = client.get("/slideshow/slides?start=2&count=5")
+
+        assert res.status_code == 200
+        assert res.json["number_memories"] == 3
+        assert res.json["start"] == 2
+        assert [slide["index"] for slide in res.json["slides"]] == [2, 3]
+        assert res.json["slides"][0] == {
+            "index": 2,
+            "date": "Friday, Aug 08, 2025",
+            "description": "Memory 8",
+            "image_url": "/memory/8/image",
+            "image_srcset": None,
+            "image_sources": None,
+            "image_sizes": "(min-width: 768px) 66vw, 100vw",
+            "latitude": 51.5,
+            "longitude": 10.25
+        }
+        assert res.json["slides"][1]["image_url"] is None
+
+        assert client.get("/slideshow/slides?start=0").status_code == 400
+
+    # -- Slides following a deleted memory keep their number --
+    with client.session_transaction() as session:
+        session["slideshow_id"] = slideshow_store.create(1, [7, 8, 9])
+    app.config["SLIDESHOW_WINDOW_SIZE"] = 3
+    with patch("src.memoryvault.routes.slideshow.MemoryManagement.get_memories_data",
+               side_effect=lambda memory_ids: {memory_id: _fake_memory(memory_id)
+                                               for memory_id in memory_ids if memory_id != 8}):
+        res = client.get("/slideshow/slides?start=1&count=3")
+        assert [slide["index"] for slide in res.json["slides"]] == [1, 3]
+
+
+def test_get_run_loads_memories_in_batches(app_client):
+    """
+    Test navigating through a slideshow loads its memories in batches instead of one per slide.
+    """
+    app, client = app_client
+
+    # Mock login
+    with client.session_transaction() as session:
+        session["user_id"] = 1
+        session["user_info"] = {"firstname": "Max", "admin": False}
+        session["vault_info"] = {"vault_id": 1}
+        session["slideshow_id"] = slideshow_store.create(1, list(range(1, 26)))
+
+    fake_memory = {
+        "description": "Test description of a memory",
+        "date": datetime(year=2025, month=8, day=2).date(),
+        "image_uri": None,
+        "latitude": None,
+        "longitude": None
+    }
+    with patch("src.memoryvault.routes.slideshow.MemoryManagement.get_memories_data",
+               side_effect=_memories_data(fake_memory)) as mock_load:
+        for number in [1, 2, 3, 2, 1, 5]:
+            assert client.get(f"/slideshow/run?number={number}").status_code == 200
+        mock_load.assert_called_once_with(list(range(1, 11)))
+
+        # -- Slides at the end of the batch also load the following batch for prefetching --
+        client.get("/slideshow/run?number=9")
+        assert mock_load.call_args.args[0] == list(range(11, 21))
+        assert client.get("/slideshow/slides?start=11&count=10").json["slides"][0]["index"] == 11
+        assert mock_load.call_count == 2
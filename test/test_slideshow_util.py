@@ -0,0 +1,142 @@
+import os
+import time
+import pytest
+from unittest.mock import MagicMock
+
+from src.memoryvault.services.slideshow_util import SlideshowStore, SlideshowMemoryCache, \
+    SlideshowNotFoundException, get_shuffled_position
+
+
+def _create_store(tmp_path) -> SlideshowStore:
+    app = MagicMock()
+    app.config = {
+        "SLIDESHOW_STATE_FOLDER": str(tmp_path),
+        "SLIDESHOW_STATE_EXPIRY": 60,
+        "SLIDESHOW_STATE_GC_INTERVAL": 60
+    }
+    store = SlideshowStore()
+    store.init_app(app)
+    return store
+
+
+def test_slideshow_order(tmp_path):
+    """
+    Tests storing a slideshow order and looking up single slides and windows of slides.
+    """
+    store = _create_store(tmp_path)
+    slideshow_id = store.create(user_id=1, memory_ids=[5, 3, 2**40, 1])
+
+    assert store.get(slideshow_id, 1)["number_memories"] == 4
+    assert store.get_memory_id(slideshow_id, 0) == 5
+    assert store.get_memory_id(slideshow_id, 2) == 2**40
+    assert store.get_memory_ids(slideshow_id, 1, 3) == [3, 2**40]
+    # -- Windows are clipped to the slideshow --
+    assert store.get_memory_ids(slideshow_id, 2, 10) == [2**40, 1]
+    assert store.get_memory_ids(slideshow_id, 4, 10) == []
+    with pytest.raises(SlideshowNotFoundException):
+        store.get_memory_id(slideshow_id, 4)
+
+    store.delete(slideshow_id)
+    with pytest.raises(SlideshowNotFoundException):
+        store.get(slideshow_id, 1)
+
+
+def test_slideshow_access(tmp_path):
+    """
+    Tests that slideshows are only accessible by their owner and with valid ids.
+    """
+    store = _create_store(tmp_path)
+    slideshow_id = store.create(user_id=1, memory_ids=[1])
+
+    with pytest.raises(SlideshowNotFoundException):
+        store.get(slideshow_id, 2)
+    for invalid_id in [None, "../secret", "unknown"]:
+        with pytest.raises(SlideshowNotFoundException):
+            store.get(invalid_id, 1)
+
+
+def test_collect_expired_slideshows(tmp_path):
+    """
+    Tests that slideshows without navigation are removed after the expiry.
+    """
+    store = _create_store(tmp_path)
+    expired_id = store.create(user_id=1, memory_ids=[1, 2])
+    active_id = store.create(user_id=1, memory_ids=[3])
+
+    expired = time.time() - 120
+    for extension in ["json", "ids"]:
+        os.utime(tmp_path / f"{expired_id}.{extension}", (expired, expired))
+        os.utime(tmp_path / f"{active_id}.{extension}", (expired, expired))
+    # -- Navigating extends the expiry --
+    store.get(active_id, 1)
+
+    assert store.collect_expired() == 1
+    assert store.get(active_id, 1)["number_memories"] == 1
+    with pytest.raises(SlideshowNotFoundException):
+        store.get(expired_id, 1)
+
+
+def test_shuffled_position():
+    """
+    Tests that shuffled positions are a permutation determined by the seed.
+    """
+    for size in [1, 2, 3, 17, 1000]:
+        positions = [get_shuffled_position(index, size, seed=42) for index in range(size)]
+        assert sorted(positions) == list(range(size))
+
+    positions = [get_shuffled_position(index, 1000, seed=42) for index in range(1000)]
+    assert positions == [get_shuffled_position(index, 1000, seed=42) for index in range(1000)]
+    assert positions != [get_shuffled_position(index, 1000, seed=43) for index in range(1000)]
+    assert positions != list(range(1000))
+
+    with pytest.raises(IndexError):
+        get_shuffled_position(1000, 1000, seed=42)
+
+
+def test_slideshow_state(tmp_path):
+    """
+    Tests storing a slideshow by its state instead of its order.
+    """
+    store = _create_store(tmp_path)
+    slideshow_id = store.create(user_id=1, number_memories=3, seed=7, vault_id=2)
+
+    slideshow = store.get(slideshow_id, 1)
+    assert slideshow["number_memories"] == 3
+    assert slideshow["seed"] == 7
+    assert not os.path.exists(tmp_path / f"{slideshow_id}.ids")
+
+
+def test_slideshow_memory_cache():
+    """
+    Tests caching memories of slideshows by position with eviction of old slideshows and slides.
+    """
+    app = MagicMock()
+    app.config = {
+        "SLIDESHOW_MEMORY_CACHE_TTL": 60,
+        "SLIDESHOW_MEMORY_CACHE_SIZE": 2,
+        "SLIDESHOW_MEMORY_CACHE_SLIDES": 4
+    }
+    cache = SlideshowMemoryCache()
+    cache.init_app(app)
+
+    cache.put("a", {0: {"id": 1}, 1: {"id": 2}, 2: {"id": 3}})
+    assert cache.get("a", 1, 3) == {1: {"id": 2}, 2: {"id": 3}}
+    assert cache.get("a", 2, 4) is None
+    assert cache.get("a", 2, 4, complete=False) == {2: {"id": 3}}
+
+    # -- Oldest slides of a slideshow are evicted first, deleted memories keep their position --
+    cache.put("a", {3: None, 4: {"id": 5}})
+    assert cache.get("a", 0, 1) is None
+    assert cache.get("a", 1, 5) == {1: {"id": 2}, 2: {"id": 3}, 4: {"id": 5}}
+
+    # -- Least recently used slideshow is evicted --
+    cache.put("b", {0: {"id": 6}})
+    cache.get("a", 1, 2)
+    cache.put("c", {0: {"id": 7}})
+    assert cache.get("b", 0, 1) is None
+    assert cache.get("a", 1, 2) == {1: {"id": 2}}
+
+    cache.ttl = -1
+    cache.put("d", {0: {"id": 8}})
+    assert cache.get("d", 0, 1) is None
+    assert cache.get("missing", 0, 1, complete=False) == {}
@@ -0,0 +1,87 @@
+import pytest
+from datetime import datetime
+
+from flask import Flask
+
+from src.memoryvault.models import db, CollectionPeriodDurationEnum, Memory, MemoryImage, User, \
+    Vault, VaultPeriodStats
+from src.memoryvault.services import PeriodStatistics
+
+
+@pytest.fixture
+def stats_app():
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, username="max", firstname="Max", password_hash="x", is_admin=False))
+        db.session.add(User(id=2, username="eva", firstname="Eva", password_hash="x", is_admin=False))
+        db.session.add(Vault(id=1, period_duration=CollectionPeriodDurationEnum.MONTHLY,
+                             period_initial_start=datetime(2025, 7, 1).date(), family_id=1))
+        db.session.commit()
+        yield app
+
+
+def _create_memory(day: datetime, user_id: int, size_bytes: int = None) -> Memory:
+    memory = Memory(description="Memory", date=day, vault_id=1, user_id=user_id)
+    if size_bytes is not None:
+        memory.images = [MemoryImage(rendition="full", width=10, height=10, image_uri="a.jpg",
+                                     size_bytes=size_bytes)]
+    return memory
+
+
+def test_statistics_maintained_incrementally(stats_app):
+    """
+    Tests counting uploaded memories per period and uploader, and replacing images.
+    """
+    memories = [_create_memory(datetime(2025, 7, 1), 1, size_bytes=100),
+                _create_memory(datetime(2025, 7, 31), 2),
+                _create_memory(datetime(2025, 8, 1), 1, size_bytes=50)]
+    db.session.add_all(memories)
+    PeriodStatistics.add_memories(memories)
+    db.session.commit()
+
+    # -- Further uploads increment the existing rows --
+    later = _create_memory(datetime(2025, 7, 15), 1)
+    db.session.add(later)
+    PeriodStatistics.add_memories([later])
+    db.session.commit()
+
+    old_images = list(later.images)
+    later.images = [MemoryImage(rendition="full", width=10, height=10, image_uri="b.jpg",
+                                size_bytes=30)]
+    PeriodStatistics.update_images(later, old_images)
+    db.session.commit()
+
+    stats = PeriodStatistics.get_stats([1])
+    assert stats[1][0]["number_memories"] == 3
+    assert stats[1][0]["number_images"] == 2
+    assert stats[1][0]["size_bytes"] == 130
+    assert stats[1][0]["uploaders"] == [{"name": "Max", "number_memories": 2},
+                                        {"name": "Eva", "number_memories": 1}]
+    assert stats[1][1]["number_memories"] == 1
+    assert PeriodStatistics.get_number_memories(vault_id=1, period_index=0) == 3
+    assert PeriodStatistics.get_number_memories(vault_id=1, period_index=2) == 0
+    assert PeriodStatistics.get_stats([]) == {}
+
+
+def test_rebuild_statistics(stats_app):
+    """
+    Tests that rebuilding the statistics from the memories gives the incremental result.
+    """
+    memories = [_create_memory(datetime(2025, 7, 1), 1, size_bytes=100),
+                _create_memory(datetime(2025, 7, 31), 2),
+                _create_memory(datetime(2025, 8, 1), None, size_bytes=50)]
+    db.session.add_all(memories)
+    PeriodStatistics.add_memories(memories)
+    db.session.commit()
+    expected = PeriodStatistics.get_stats([1])
+
+    db.session.query(VaultPeriodStats).delete()
+    db.session.add(VaultPeriodStats(vault_id=1, period_index=5, user_id=1, memory_count=7))
+    db.session.commit()
+
+    assert PeriodStatistics.rebuild() == 1
+    assert PeriodStatistics.get_stats([1]) == expected
+    assert expected[1][1]["uploaders"] == [{"name": "Unknown", "number_memories": 1}]
@@ -0,0 +1,232 @@
+import os
+import time
+import pytest
+import requests
+from urllib.parse import urlparse, parse_qs
+from unittest.mock import patch, MagicMock
+from azure.storage.blob import generate_blob_sas
+
+from src.memoryvault.services.storage_util import BlobClientRegistry, BlobReplicator, \
+    BlobStorageBackend, ImageStorage
+
+# Connection string of a running Azurite emulator, e.g. started with docker compose --profile azurite up
+AZURITE_CONNECTION_STRING = os.getenv("AZURITE_CONNECTION_STRING")
+
+
+def _create_app_mock(connection_string: str = "DefaultEndpointsProtocol=https;AccountName=test;"
+                                              "AccountKey=dGVzdA==;EndpointSuffix=core.windows.net"):
+    app = MagicMock()
+    app.config = {
+        "STORAGE_BACKEND": "azure",
+        "AZURE_STORAGE_CONNECTION_STRING": connection_string,
+        "AZURE_STORAGE_POOL_SIZE": 2,
+        "AZURE_STORAGE_MAX_SINGLE_PUT_SIZE": 1024,
+        "AZURE_STORAGE_MAX_BLOCK_SIZE": 1024,
+        "AZURE_STORAGE_MAX_CONCURRENCY": 2,
+        "AZURE_STORAGE_RETRY_TOTAL": 1,
+        "AZURE_STORAGE_RETRY_BACKOFF": 0,
+        "AZURE_STORAGE_RETRY_INCREMENT": 2,
+        "AZURE_STORAGE_CONNECTION_TIMEOUT": 5,
+        "AZURE_STORAGE_READ_TIMEOUT": 5
+    }
+    return app
+
+
+def test_registry_reuses_clients():
+    """
+    Tests that service and container clients are created once and reused.
+    """
+    registry = BlobClientRegistry()
+    registry.init_app(_create_app_mock())
+
+    service_client = registry.get_service_client()
+    assert registry.get_service_client() is service_client
+    assert service_client._config.max_single_put_size == 1024
+    assert registry.get_container_client("images") is registry.get_container_client("images")
+    assert registry.get_transfer_options() == {"max_concurrency": 2}
+
+
+def test_registry_recreates_clients_after_fork():
+    """
+    Tests that a forked process does not reuse the clients of its parent.
+    """
+    registry = BlobClientRegistry()
+    registry.init_app(_create_app_mock())
+    service_client = registry.get_service_client()
+
+    with patch("src.memoryvault.services.storage_util.os.getpid", return_value=-1):
+        assert registry.get_service_client() is not service_client
+
+
+@pytest.mark.skipif(AZURITE_CONNECTION_STRING is None,
+                    reason="Set AZURITE_CONNECTION_STRING to run against the Azurite emulator")
+def test_registry_roundtrip_azurite():
+    """
+    Tests uploading and downloading a blob with the Azurite emulator.
+    """
+    registry = BlobClientRegistry()
+    registry.init_app(_create_app_mock(AZURITE_CONNECTION_STRING))
+
+    container_client = registry.get_container_client("memoryvault-test")
+    if not container_client.exists():
+        container_client.create_container()
+    container_client.upload_blob("ab/cd/test.jpg", b"image", overwrite=True,
+                                 **registry.get_transfer_options())
+
+    assert container_client.download_blob("ab/cd/test.jpg").readall() == b"image"
+
+
+def _create_replicator(tmp_path):
+    app = _create_app_mock()
+    app.config.update({
+        "BLOB_WRITE_BEHIND": True,
+        "BLOB_STAGING_FOLDER": str(tmp_path),
+        "BLOB_REPLICATION_INTERVAL": 1,
+        "BLOB_REPLICATION_BACKOFF": 5,
+        "BLOB_REPLICATION_MAX_BACKOFF": 60,
+        "UPLOAD_FOLDER": "images",
+        "IMAGE_EXTENSIONS": {"image/jpeg": "jpg"}
+    })
+    replicator = BlobReplicator()
+    with patch.object(BlobReplicator, "_ensure_worker"):
+        replicator.init_app(app)
+        replicator.stage(b"image", "ab/cd/abcd.jpg")
+    return replicator
+
+
+@patch("src.memoryvault.services.storage_util.blob_client_registry")
+def test_replicator_uploads_staged_image(mock_registry, tmp_path):
+    """
+    Tests that staged images are readable until they are uploaded and removed from staging.
+    """
+    replicator = _create_replicator(tmp_path)
+    assert replicator.get_staged_bytes("ab/cd/abcd.jpg") == b"image"
+
+    assert replicator.replicate("ab/cd/abcd.jpg") is True
+
+    mock_registry.get_container_client.return_value.upload_blob.assert_called_once()
+    assert replicator.get_staged_bytes("ab/cd/abcd.jpg") is None
+    assert replicator.reconcile() == 0
+
+
+@patch("src.memoryvault.services.storage_util.blob_client_registry")
+def test_replicator_retries_failed_upload(mock_registry, tmp_path):
+    """
+    Tests that failed uploads stay staged and are retried after their backoff.
+    """
+    replicator = _create_replicator(tmp_path)
+    replicator._queue.get_nowait()
+    mock_registry.get_container_client.return_value.upload_blob.side_effect = Exception
+
+    assert replicator.replicate("ab/cd/abcd.jpg") is False
+    # -- Still pending, but not queued again before the backoff passed --
+    assert replicator.reconcile() == 1
+    assert replicator._queue.empty()
+
+    mock_registry.get_container_client.return_value.upload_blob.side_effect = None
+    assert replicator.replicate_all() == (1, 0)
+
+
+@pytest.mark.parametrize("backend_name", ["local", "memory"])
+def test_storage_backend_roundtrip(backend_name, tmp_path):
+    """
+    Tests writing, reading and deleting images with the selected storage backend.
+    """
+    app = MagicMock()
+    app.config = {"STORAGE_BACKEND": backend_name, "UPLOAD_FOLDER": str(tmp_path)}
+    storage = ImageStorage()
+    storage.init_app(app)
+    backend = storage.get_backend()
+
+    backend.write("ab/cd/image.jpg", b"image", "image/jpeg")
+    # -- Stored images are immutable, writing the same key again keeps the first image --
+    backend.write("ab/cd/image.jpg", b"other", "image/jpeg")
+    assert backend.read("ab/cd/image.jpg") == b"image"
+
+    if backend_name == "local":
+        assert backend.get_local_path("ab/cd/image.jpg") == str(tmp_path / "ab/cd/image.jpg")
+    else:
+        assert backend.get_local_path("ab/cd/image.jpg") is None
+
+    backend.delete("ab/cd/image.jpg")
+    assert backend.get_local_path("ab/cd/image.jpg") is None
+    with pytest.raises(FileNotFoundError):
+        backend.read("ab/cd/image.jpg")
+
+
+def test_storage_unknown_backend():
+    """
+    Tests that unknown storage backends are rejected on startup.
+    """
+    app = MagicMock()
+    app.config = {"STORAGE_BACKEND": "ftp", "UPLOAD_FOLDER": "images"}
+    with pytest.raises(ValueError):
+        ImageStorage().init_app(app)
+
+
+def test_blob_backend_signed_url_cached():
+    """
+    Tests that signed URLs are read-only, scoped to a single blob and reused until close to expiry.
+    """
+    registry = BlobClientRegistry()
+    registry.init_app(_create_app_mock())
+    backend = BlobStorageBackend("images", signed_url_refresh=60)
+
+    with patch("src.memoryvault.services.storage_util.blob_client_registry", registry), \
+            patch("azure.storage.blob.generate_blob_sas",
+                  wraps=generate_blob_sas) as mock_sas:
+        signed_url = backend.get_signed_url("ab/cd/image.jpg", "image/jpeg", 3600)
+        query = parse_qs(urlparse(signed_url).query)
+        assert urlparse(signed_url).path == "/images/ab/cd/image.jpg"
+        assert query["sp"] == ["r"]
+        assert query["sr"] == ["b"]
+        assert query["rsct"] == ["image/jpeg"]
+
+        assert backend.get_signed_url("ab/cd/image.jpg", "image/jpeg", 3600) == signed_url
+        assert mock_sas.call_count == 1
+
+        # -- URLs expiring within the refresh window are regenerated --
+        backend.get_signed_url("ab/cd/other.jpg", "image/jpeg", 30)
+        backend.get_signed_url("ab/cd/other.jpg", "image/jpeg", 30)
+        assert mock_sas.call_count == 3
+
+        # -- URLs bounded by the end of a session are cached per bound --
+        expires_before = time.time() + 600
+        bounded_url = backend.get_signed_url("ab/cd/image.jpg", "image/jpeg", 3600, expires_before)
+        assert bounded_url != signed_url
+        max_age = parse_qs(urlparse(bounded_url).query)["rscc"][0].split("=")[1]
+        assert 590 < int(max_age) <= 600
+        assert backend.get_signed_url("ab/cd/image.jpg", "image/jpeg", 3600,
+                                      expires_before) == bounded_url
+        assert backend.get_signed_url("ab/cd/image.jpg", "image/jpeg", 3600) == signed_url
+        assert mock_sas.call_count == 4
+
+        # -- Expired sessions get no URL --
+        assert backend.get_signed_url("ab/cd/image.jpg", "image/jpeg", 3600, time.time()) is None
+
+
+@pytest.mark.skipif(AZURITE_CONNECTION_STRING is None,
+                    reason="Set AZURITE_CONNECTION_STRING to run against the Azurite emulator")
+def test_blob_backend_signed_url_azurite():
+    """
+    Tests fetching an image with a signed URL from the Azurite emulator.
+    """
+    registry = BlobClientRegistry()
+    registry.init_app(_create_app_mock(AZURITE_CONNECTION_STRING))
+    container_client = registry.get_container_client("memoryvault-test")
+    if not container_client.exists():
+        container_client.create_container()
+
+    with patch("src.memoryvault.services.storage_util.blob_client_registry", registry):
+        backend = BlobStorageBackend("memoryvault-test")
+        backend.write("ab/cd/signed.jpg", b"image", "image/jpeg")
+        signed_url = backend.get_signed_url("ab/cd/signed.jpg", "image/jpeg", 60)
+
+    res = requests.get(signed_url, timeout=5)
+    assert res.status_code == 200
+    assert res.content == b"image"
+    assert res.headers["Content-Type"] == "image/jpeg"
+
+    # -- URL does not grant access to other blobs --
+    res = requests.get(signed_url.replace("signed.jpg", "other.jpg"), timeout=5)
+    assert res.status_code == 403
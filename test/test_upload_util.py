@@ -0,0 +1,85 @@
+import io
+import os
+import time
+import pytest
+from unittest.mock import MagicMock
+
+from src.memoryvault.services.upload_util import ChunkedUploads, UploadException, \
+    UploadNotFoundException, UploadOffsetException
+
+
+def _create_uploads(tmp_path) -> ChunkedUploads:
+    app = MagicMock()
+    app.config = {
+        "CHUNKED_UPLOAD_FOLDER": str(tmp_path),
+        "CHUNKED_UPLOAD_MAX_SIZE": 100,
+        "CHUNKED_UPLOAD_CHUNK_SIZE": 4,
+        "CHUNKED_UPLOAD_EXPIRY": 60,
+        "CHUNKED_UPLOAD_GC_INTERVAL": 60
+    }
+    uploads = ChunkedUploads()
+    uploads.init_app(app)
+    return uploads
+
+
+def test_chunked_upload_resume(tmp_path):
+    """
+    Tests uploading a file in chunks including a resend after a lost response.
+    """
+    uploads = _create_uploads(tmp_path)
+    upload_id = uploads.create(user_id=1, size=10)["upload_id"]
+
+    assert uploads.append(upload_id, 1, 0, io.BytesIO(b"0123"))["offset"] == 4
+    # -- Client did not receive the response and resends the chunk --
+    with pytest.raises(UploadOffsetException) as e:
+        uploads.append(upload_id, 1, 0, io.BytesIO(b"0123"))
+    assert e.value.offset == 4
+    assert uploads.get(upload_id, 1)["offset"] == 4
+
+    with pytest.raises(UploadException):
+        uploads.open_completed(upload_id, 1)
+
+    uploads.append(upload_id, 1, 4, io.BytesIO(b"456789"))
+    with uploads.open_completed(upload_id, 1) as fp:
+        assert fp.read() == b"0123456789"
+
+    uploads.delete(upload_id)
+    with pytest.raises(UploadNotFoundException):
+        uploads.get(upload_id, 1)
+
+
+def test_chunked_upload_validation(tmp_path):
+    """
+    Tests that uploads are limited in size and only accessible by their owner.
+    """
+    uploads = _create_uploads(tmp_path)
+    with pytest.raises(UploadException):
+        uploads.create(user_id=1, size=101)
+    with pytest.raises(UploadException):
+        uploads.create(user_id=1, size=None)
+
+    upload_id = uploads.create(user_id=1, size=4)["upload_id"]
+    with pytest.raises(UploadNotFoundException):
+        uploads.get(upload_id, 2)
+    with pytest.raises(UploadNotFoundException):
+        uploads.get("../../etc/passwd", 1)
+
+    # -- Chunks exceeding the declared size are dropped completely --
+    with pytest.raises(UploadException):
+        uploads.append(upload_id, 1, 0, io.BytesIO(b"01234"))
+    assert uploads.get(upload_id, 1)["offset"] == 0
+
+
+def test_collect_expired_uploads(tmp_path):
+    """
+    Tests that only uploads without recent activity are removed.
+    """
+    uploads = _create_uploads(tmp_path)
+    expired_id = uploads.create(user_id=1, size=4)["upload_id"]
+    active_id = uploads.create(user_id=1, size=4)["upload_id"]
+    past = time.time() - 120
+    os.utime(tmp_path / f"{expired_id}.part", (past, past))
+
+    assert uploads.collect_expired() == 1
+    assert not (tmp_path / f"{expired_id}.json").exists()
+    assert uploads.get(active_id, 1)["offset"] == 0
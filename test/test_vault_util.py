@@ -83,3 +83,30 @@ def test_get_start_end_curr_period_no_shifts(mock_datetime):
 
     assert result["start_date"] == datetime(2025, 8, 1).date()
     assert result["end_date"] == datetime(2025, 8, 31).date()
+
+
+def test_number_of_memories_in_timespan_counted_by_database():
+    """
+    Tests counting the memories of a vault in a timespan including its first and last day.
+    """
+    from flask import Flask
+    from src.memoryvault.models import db, Memory, Vault
+
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        vault = Vault(period_duration=CollectionPeriodDurationEnum.MONTHLY,
+                      period_initial_start=datetime(2025, 8, 1).date(), user_id=1)
+        db.session.add(vault)
+        db.session.commit()
+        for memory_date in [datetime(2025, 8, 1), datetime(2025, 8, 15, 12),
+                            datetime(2025, 8, 31, 23, 59), datetime(2025, 9, 1)]:
+            db.session.add(Memory(description="Memory", date=memory_date, vault_id=vault.id))
+        db.session.add(Memory(description="Other vault", date=datetime(2025, 8, 5), vault_id=vault.id + 1))
+        db.session.commit()
+
+        assert vault.get_number_of_memories_in_timespan(timespan_begin=datetime(2025, 8, 1).date(),
+                                                        timespan_end=datetime(2025, 8, 31).date()) == 3
+        assert "ix_memory_vault_id_date" in {index.name for index in Memory.__table__.indexes}